@@ -1,46 +1,88 @@
-from flask import Flask
-from config import Config
+from flask import Flask, current_app, g, has_app_context
+from config import config, engine_options
 from flask_sqlalchemy import SQLAlchemy
+from flask_sqlalchemy.session import Session
 from flask_migrate import Migrate
 from flask_login import LoginManager
+from flask_wtf.csrf import CSRFProtect
 import logging
-from logging.handlers import SMTPHandler
-from logging.handlers import RotatingFileHandler
 import os
+import weakref
+import sqlalchemy as sa
+from app.logs import configure_logging
 
-app = Flask(__name__)
-app.config.from_object(Config)
-db = SQLAlchemy(app)
-migrate = Migrate(app, db)
-login = LoginManager(app)
-login.login_view = 'login'
-
-if not app.debug:
-    if app.config['MAIL_SERVER']:
-        auth = None
-        if app.config['MAIL_USERNAME'] or app.config['MAIL_PASSWORD']:
-            auth = (app.config['MAIL_USERNAME'], app.config['MAIL_PASSWORD'])
-        secure = None
-        if app.config['MAIL_USE_TLS']:
-            secure = ()
-        mail_handler = SMTPHandler(
-            mailhost=(app.config['MAIL_SERVER'], app.config['MAIL_PORT']),
-            fromaddr='MCStats <no-reply@pelican.org>',
-            toaddrs=app.config['ADMINS'], subject='MCStats Failure',
-            credentials=auth, secure=secure)
-        mail_handler.setLevel(logging.ERROR)
-        app.logger.addHandler(mail_handler)
-
-    if not os.path.exists('logs'):
-        os.mkdir('logs')
-    file_handler = RotatingFileHandler('logs/mcstats.log', maxBytes=10240,
-                                       backupCount=10)
-    file_handler.setFormatter(logging.Formatter(
-        '%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]'))
-    file_handler.setLevel(logging.INFO)
-    app.logger.addHandler(file_handler)
-
-    app.logger.setLevel(logging.INFO)
-    app.logger.info('MCStats startup')
-
-from app import routes, models, errors
+class RoutingSession(Session):
+    """
+    Session that sends reads to the replica engine while g.read_replica is
+    set (see app.replica.read_only).  Flushes and INSERT / UPDATE / DELETE
+    statements always go to the primary.
+    """
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if (bind is None and not self._flushing and not isinstance(clause, sa.UpdateBase)
+                and has_app_context() and g.get('read_replica')):
+            return current_app.extensions['replica']
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+db = SQLAlchemy(session_options={'class_': RoutingSession})
+migrate = Migrate()
+login = LoginManager()
+login.login_view = 'main.login'
+# Every POST needs a CSRF token: forms carry one, API clients send X-CSRFToken
+csrf = CSRFProtect()
+
+# Every app created in this process, so forked workers can reset their pools
+_apps = weakref.WeakSet()
+
+def create_app(config_name=None):
+    """
+    Build an MCStats app from one of the profiles in config.config,
+    defaulting to $MCSTATS_CONFIG and then 'default'
+    """
+    config_name = config_name or os.environ.get('MCSTATS_CONFIG') or 'default'
+    app = Flask(__name__)
+    app.config.from_object(config[config_name])
+    app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', engine_options(app.config))
+
+    db.init_app(app)
+    migrate.init_app(app, db)
+    login.init_app(app)
+    csrf.init_app(app)
+
+    from app import models, versions, metrics, reference, sqlite, replica, search
+    replica.init_app(app)
+    sqlite.init_app(app)
+    versions.init_app(app)
+    metrics.init_app(app)
+    reference.init_app(app)
+    search.init_app(app)
+
+    from app.routes import bp
+    from app import errors
+    app.register_blueprint(bp)
+
+    from app.cli import stats, results
+    app.cli.add_command(stats)
+    app.cli.add_command(results)
+
+    if not app.debug and not app.testing:
+        configure_logging(app)
+        app.logger.setLevel(logging.INFO)
+        app.logger.info('MCStats startup')
+
+    _apps.add(app)
+    return app
+
+def _dispose_engines_after_fork():
+    """
+    Drop pooled connections inherited from the parent process, without
+    closing them (the parent still owns the sockets)
+    """
+    for app in list(_apps):
+        with app.app_context():
+            for engine in db.engines.values():
+                engine.dispose(close=False)
+            if 'replica' in app.extensions:
+                app.extensions['replica'].dispose(close=False)
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_dispose_engines_after_fork)
@@ -0,0 +1,71 @@
+"""Small in-process caches"""
+from collections import OrderedDict
+import threading
+from flask import current_app
+
+class LRUCache:
+    """Bounded least-recently-used cache with hit / miss counters"""
+    def __init__(self, maxsize=128):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                self._data.move_to_end(key)
+            except KeyError:
+                self.misses += 1
+                return default
+            self.hits += 1
+            return self._data[key]
+
+    def set(self, key, value):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def evict(self, predicate):
+        """Drop every entry whose key matches predicate"""
+        with self._lock:
+            for key in [k for k in self._data if predicate(k)]:
+                del self._data[key]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.hits = self.misses = 0
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses,
+                'size': len(self._data), 'maxsize': self.maxsize}
+
+class AppLRUCache:
+    """
+    One LRUCache per Flask app, created on first use and sized from the
+    app's config.  Attribute access goes to the current app's cache.
+    """
+    def __init__(self, name, size_setting):
+        self.name = name
+        self.size_setting = size_setting
+
+    def _cache(self):
+        caches = current_app.extensions.setdefault('lru_caches', {})
+        if self.name not in caches:
+            caches[self.name] = LRUCache(current_app.config[self.size_setting])
+        return caches[self.name]
+
+    def __len__(self):
+        return len(self._cache())
+
+    def __getattr__(self, attr):
+        return getattr(self._cache(), attr)
@@ -0,0 +1,58 @@
+import click
+from flask.cli import AppGroup
+from app import db
+from app.models import refresh_summaries, refresh_rollups
+from app.versions import EPOCH, mark_changed
+from app.results import import_results, decode_lines, export_rows, export_csv, export_jsonl, \
+    FORMATS
+
+stats = AppGroup('stats', help='Statistics maintenance commands.')
+
+@stats.command('backfill-summaries')
+def backfill_summaries():
+    """Rebuild the hero vs villain summary table from all results."""
+    refresh_summaries(db.session.connection())
+    db.session.commit()
+    click.echo('Hero vs villain summaries rebuilt.')
+
+@stats.command('rebuild-rollups')
+def rebuild_rollups():
+    """Rebuild the daily and weekly result rollups from all results."""
+    refresh_rollups(db.session.connection())
+    db.session.commit()
+    click.echo('Result rollups rebuilt.')
+
+@stats.command('new-epoch')
+def new_epoch():
+    """Retire every ETag issued so far, e.g. after a deploy changes the pages."""
+    mark_changed(db.session, EPOCH)
+    db.session.commit()
+    click.echo('Data version epoch bumped.')
+
+results = AppGroup('results', help='Result import and export commands.')
+
+@results.command('import')
+@click.argument('file', type=click.File('rb'))
+@click.option('--format', 'fmt', type=click.Choice(FORMATS),
+              help='Input format; guessed from the file extension if omitted.')
+@click.option('--chunk-size', type=int,
+              help='Rows per commit (default RESULTS_IMPORT_CHUNK_SIZE).')
+def import_command(file, fmt, chunk_size):
+    """Import hero, villain, WIN/LOSS[, played_at, aspect, difficulty, player] results."""
+    if fmt is None:
+        fmt = 'jsonl' if file.name.endswith(('.jsonl', '.json', '.ndjson')) else 'csv'
+    report = import_results(decode_lines(file), fmt, chunk_size)
+    for line_no, error in report.errors:
+        click.echo(f'{file.name}:{line_no}: {error}', err=True)
+    click.echo(f'Imported {report.imported} results, {len(report.errors)} errors.')
+
+@results.command('export')
+@click.option('--format', 'fmt', type=click.Choice(FORMATS), default='csv',
+              help='Output format.')
+@click.option('--output', '-o', type=click.File('w', encoding='utf-8'), default='-',
+              help='File to write to (default stdout).')
+def export_command(fmt, output):
+    """Stream every result, with hero and villain names, as CSV or JSON lines."""
+    render = export_csv if fmt == 'csv' else export_jsonl
+    for chunk in render(export_rows()):
+        output.write(chunk)
@@ -0,0 +1,56 @@
+"""Conditional GET for read-only pages, validated by data versions"""
+import functools
+from flask import current_app, make_response, request, session
+from flask_login import COOKIE_NAME
+from app.versions import data_versions
+
+def _audience():
+    """
+    Whether the page will be rendered for a logged-in user ('user') or not
+    ('anon'), which changes base.html's navigation.  Decided from the
+    session and remember-me cookies, so the user isn't loaded just to
+    answer a revalidation.
+    """
+    remember = current_app.config.get('REMEMBER_COOKIE_NAME', COOKIE_NAME)
+    # Flask-Login keeps the logged-in user's id under '_user_id'
+    if '_user_id' in session or remember in request.cookies:
+        return 'user'
+    return 'anon'
+
+def conditional(*tables):
+    """
+    Tag the view's pages with an ETag built from the versions of the tables
+    they are rendered from, and answer a matching If-None-Match with a 304
+    before the view runs.
+
+    Responses must be revalidated on every use (no-cache), so a changed
+    table shows up at once.  Pages for anonymous visitors may be kept by
+    shared caches; they vary on Cookie, as logging in changes the page.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            if '_flashes' in session:
+                # A one-off message is about to be shown; this render mustn't be reused
+                response = make_response(view(*args, **kwargs))
+                response.cache_control.no_store = True
+                response.cache_control.private = True
+                return response
+            audience = _audience()
+            etag = f'{data_versions.etag(*tables)}-{audience}'
+            if request.if_none_match.contains(etag):
+                response = current_app.response_class(status=304)
+            else:
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            response.set_etag(etag)
+            response.cache_control.no_cache = True
+            if audience == 'user':
+                response.cache_control.private = True
+            else:
+                response.cache_control.public = True
+            response.vary.add('Cookie')
+            return response
+        return wrapper
+    return decorator
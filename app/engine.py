@@ -0,0 +1,175 @@
+"""
+Vectorised win-rate engine over hero x villain arrays
+
+Uses NumPy when it is installed; otherwise falls back to flat array.array
+storage and plain loops, which give the same answers more slowly.
+"""
+from array import array
+from collections import namedtuple
+import math
+import sqlalchemy as sa
+from app import db
+from app.models import Hero, Villain, HeroVillainSummary
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# 95% confidence
+WILSON_Z = 1.96
+
+Rate = namedtuple('Rate', 'id wins plays rate low high')
+
+def wilson_interval(wins, plays, z=WILSON_Z):
+    """
+    Wilson score interval for wins out of plays.  Takes and returns NumPy
+    arrays when NumPy is in use, otherwise sequences and lists.  Unplayed
+    entries get the uninformative interval (0, 1).
+    """
+    if np is not None:
+        wins = np.asarray(wins, dtype=float)
+        plays = np.asarray(plays, dtype=float)
+        n = np.where(plays > 0, plays, 1)
+        p = wins / n
+        denom = 1 + z * z / n
+        centre = (p + z * z / (2 * n)) / denom
+        margin = z * np.sqrt(p * (1 - p) / n + z * z / (4 * n * n)) / denom
+        played = plays > 0
+        return (np.where(played, centre - margin, 0.0),
+                np.where(played, centre + margin, 1.0))
+    low, high = [], []
+    for w, n in zip(wins, plays):
+        if n <= 0:
+            low.append(0.0)
+            high.append(1.0)
+            continue
+        p = w / n
+        denom = 1 + z * z / n
+        centre = (p + z * z / (2 * n)) / denom
+        margin = z * math.sqrt(p * (1 - p) / n + z * z / (4 * n * n)) / denom
+        low.append(centre - margin)
+        high.append(centre + margin)
+    return low, high
+
+class StatsEngine:
+    """
+    Win and play counts held as hero x villain arrays indexed by position.
+
+    Totals per hero, villain, aspect and phase are sums along an axis or
+    grouped sums, so nothing loops over ORM objects.  Aspects are the
+    hero's default aspect; phases are the villain's phase.
+    """
+    def __init__(self, hero_ids, hero_aspects, villain_ids, villain_phases, cells):
+        self.hero_ids = list(hero_ids)
+        self.hero_aspects = list(hero_aspects)
+        self.villain_ids = list(villain_ids)
+        self.villain_phases = list(villain_phases)
+        self.hero_index = {id: i for i, id in enumerate(self.hero_ids)}
+        self.villain_index = {id: i for i, id in enumerate(self.villain_ids)}
+        rows, cols, wins, losses = [], [], [], []
+        for hero_id, villain_id, w, l in cells:
+            if hero_id in self.hero_index and villain_id in self.villain_index:
+                rows.append(self.hero_index[hero_id])
+                cols.append(self.villain_index[villain_id])
+                wins.append(w)
+                losses.append(l)
+        shape = (len(self.hero_ids), len(self.villain_ids))
+        if np is not None:
+            self.wins = np.zeros(shape, dtype=np.int64)
+            self.plays = np.zeros(shape, dtype=np.int64)
+            rows = np.asarray(rows, dtype=np.intp)
+            cols = np.asarray(cols, dtype=np.intp)
+            wins = np.asarray(wins, dtype=np.int64)
+            self.wins[rows, cols] = wins
+            self.plays[rows, cols] = wins + np.asarray(losses, dtype=np.int64)
+        else:
+            # Row-major flat storage: cell (h, v) lives at h * width + v
+            self.wins = array('q', bytes(8 * shape[0] * shape[1]))
+            self.plays = array('q', bytes(8 * shape[0] * shape[1]))
+            for r, c, w, l in zip(rows, cols, wins, losses):
+                self.wins[r * shape[1] + c] = w
+                self.plays[r * shape[1] + c] = w + l
+        self.shape = shape
+
+    @classmethod
+    def load(cls):
+        """Build the engine from the roster and the hero vs villain summaries"""
+        heroes = db.session.execute(
+            sa.select(Hero.id, Hero.aspect_id).order_by(Hero.id)).all()
+        villains = db.session.execute(
+            sa.select(Villain.id, Villain.phase_id).order_by(Villain.id)).all()
+        cells = db.session.execute(
+            sa.select(HeroVillainSummary.hero_id, HeroVillainSummary.villain_id,
+                      HeroVillainSummary.wins, HeroVillainSummary.losses))
+        return cls([h[0] for h in heroes], [h[1] for h in heroes],
+                   [v[0] for v in villains], [v[1] for v in villains], cells)
+
+    def _axis_sums(self, counts, axis):
+        if np is not None:
+            return counts.sum(axis=axis)
+        height, width = self.shape
+        if axis == 1:
+            return [sum(counts[r * width:(r + 1) * width]) for r in range(height)]
+        return [sum(counts[c::width]) for c in range(width)]
+
+    def _grouped_sums(self, labels, values):
+        """Sum values by label; returns (distinct labels, sums) in label order"""
+        if np is not None:
+            keys, codes = np.unique(np.asarray(labels), return_inverse=True)
+            sums = np.bincount(codes, weights=values, minlength=len(keys))
+            return keys.tolist(), sums.astype(np.int64)
+        totals = {}
+        for label, value in zip(labels, values):
+            totals[label] = totals.get(label, 0) + value
+        keys = sorted(totals)
+        return keys, [totals[k] for k in keys]
+
+    def _rates(self, ids, wins, plays):
+        low, high = wilson_interval(wins, plays)
+        return [Rate(id, int(w), int(p), w / p if p else 0.0, float(lo), float(hi))
+                for id, w, p, lo, hi in zip(ids, wins, plays, low, high)]
+
+    def by_hero(self):
+        """Rate per hero, in hero id order; wins are the hero's wins"""
+        return self._rates(self.hero_ids, self._axis_sums(self.wins, 1),
+                           self._axis_sums(self.plays, 1))
+
+    def by_villain(self):
+        """Rate per villain, in villain id order; wins are heroes' wins against it"""
+        return self._rates(self.villain_ids, self._axis_sums(self.wins, 0),
+                           self._axis_sums(self.plays, 0))
+
+    def by_aspect(self):
+        """Rate per hero default aspect, in aspect id order"""
+        if not self.hero_ids:
+            return []
+        keys, wins = self._grouped_sums(self.hero_aspects, self._axis_sums(self.wins, 1))
+        _, plays = self._grouped_sums(self.hero_aspects, self._axis_sums(self.plays, 1))
+        return self._rates(keys, wins, plays)
+
+    def by_phase(self):
+        """Rate per villain phase, in phase id order"""
+        if not self.villain_ids:
+            return []
+        keys, wins = self._grouped_sums(self.villain_phases, self._axis_sums(self.wins, 0))
+        _, plays = self._grouped_sums(self.villain_phases, self._axis_sums(self.plays, 0))
+        return self._rates(keys, wins, plays)
+
+    def leaderboard(self, min_plays=1, limit=None):
+        """
+        Heroes with at least min_plays games, best first.  Ranked on the
+        lower Wilson bound so a 1-0 record doesn't top a 40-10 one.
+        """
+        rates = [r for r in self.by_hero() if r.plays >= min_plays]
+        rates.sort(key=lambda r: (-r.low, r.id))
+        return rates[:limit]
+
+    def hardest_villains(self, min_plays=1, limit=None):
+        """
+        Villains with at least min_plays games, hardest first - ranked on
+        the upper Wilson bound of the heroes' win rate against them.
+        """
+        rates = [r for r in self.by_villain() if r.plays >= min_plays]
+        rates.sort(key=lambda r: (r.high, r.id))
+        return rates[:limit]
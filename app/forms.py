@@ -1,6 +1,7 @@
 from flask_wtf import FlaskForm
 from wtforms import StringField, PasswordField, BooleanField, SubmitField, RadioField, SelectField
 from wtforms.validators import DataRequired
+from app.reference import reference
 
 class LoginForm(FlaskForm):
     username = StringField('Username', validators=[DataRequired()])
@@ -13,6 +14,12 @@ class VillainForm(FlaskForm):
     phase = RadioField('Phase', validators=[DataRequired()], coerce=int)
     submit = SubmitField('Submit')
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        #TODO: Need an actual error when no Phases are defined.
+        # Currently generates an unsubmittable form.
+        self.phase.choices = reference.phases.choices('phasename')
+
 class VillainDeleteForm(FlaskForm):
     submit = SubmitField('Confirm')
 
@@ -22,5 +29,13 @@ class HeroForm(FlaskForm):
     aspect = SelectField('Default Aspect', validators=[DataRequired()], coerce=int)
     submit = SubmitField('Submit')
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        #TODO: Need an actual error when no Phases are defined.
+        # Currently generates an unsubmittable form.
+        self.phase.choices = reference.phases.choices('phasename')
+        #TODO: Ditto for Aspects.
+        self.aspect.choices = reference.aspects.choices('name')
+
 class HeroDeleteForm(FlaskForm):
     submit = SubmitField('Confirm')
@@ -0,0 +1,139 @@
+"""Non-blocking logging: records are queued and written by a background thread"""
+import atexit
+import email.utils
+from email.message import EmailMessage
+import logging
+from logging.handlers import QueueHandler, QueueListener, SMTPHandler, RotatingFileHandler
+import os
+import queue
+import smtplib
+import threading
+import time
+
+class DroppingQueueHandler(QueueHandler):
+    """QueueHandler for a bounded queue that drops and counts records when it's full"""
+    def __init__(self, q):
+        super().__init__(q)
+        self.dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+class BatchingSMTPHandler(SMTPHandler):
+    """
+    SMTPHandler that sends at most one email per interval.  Records arriving
+    in between are batched into the next email, up to capacity; any beyond
+    that are dropped and counted.
+    """
+    def __init__(self, *args, interval=60, capacity=100, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.interval = interval
+        self.capacity = capacity
+        self.buffer = []
+        self.dropped = 0
+        self._last_sent = None
+        self._timer = None
+
+    def emit(self, record):
+        # Called with self.lock held
+        if len(self.buffer) >= self.capacity:
+            self.dropped += 1
+            return
+        self.buffer.append(record)
+        if self._timer is None:
+            delay = 0
+            if self._last_sent is not None:
+                delay = max(0, self._last_sent + self.interval - time.monotonic())
+            self._timer = threading.Timer(delay, self.flush)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def flush(self):
+        with self.lock:
+            records, self.buffer = self.buffer, []
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            if not records:
+                return
+            self._last_sent = time.monotonic()
+        subject = self.subject
+        if len(records) > 1:
+            subject = f'{subject} ({len(records)} errors)'
+        try:
+            self.send(subject, '\n\n'.join(self.format(r) for r in records))
+        except Exception:
+            self.handleError(records[-1])
+
+    def send(self, subject, body):
+        msg = EmailMessage()
+        msg['From'] = self.fromaddr
+        msg['To'] = ','.join(self.toaddrs)
+        msg['Subject'] = subject
+        msg['Date'] = email.utils.localtime()
+        msg.set_content(body)
+        smtp = smtplib.SMTP(self.mailhost, self.mailport or smtplib.SMTP_PORT,
+                            timeout=self.timeout)
+        if self.username:
+            if self.secure is not None:
+                smtp.ehlo()
+                smtp.starttls(*self.secure)
+                smtp.ehlo()
+            smtp.login(self.username, self.password)
+        smtp.send_message(msg)
+        smtp.quit()
+
+    def close(self):
+        self.flush()
+        super().close()
+
+def _shutdown(listener, handlers):
+    """Drain the queue into the handlers, then close them, sending any batched mail"""
+    listener.stop()
+    for handler in handlers:
+        handler.close()
+
+def configure_logging(app):
+    """
+    Send app.logger through a bounded queue to the mail and file handlers,
+    which run on a QueueListener thread instead of the request thread.
+    Returns the queue handler (whose dropped count is exported in /metrics).
+    """
+    handlers = []
+    if app.config['MAIL_SERVER']:
+        auth = None
+        if app.config['MAIL_USERNAME'] or app.config['MAIL_PASSWORD']:
+            auth = (app.config['MAIL_USERNAME'], app.config['MAIL_PASSWORD'])
+        secure = None
+        if app.config['MAIL_USE_TLS']:
+            secure = ()
+        mail_handler = BatchingSMTPHandler(
+            mailhost=(app.config['MAIL_SERVER'], app.config['MAIL_PORT']),
+            fromaddr='MCStats <no-reply@pelican.org>',
+            toaddrs=app.config['ADMINS'], subject='MCStats Failure',
+            credentials=auth, secure=secure,
+            interval=app.config['MAIL_BATCH_INTERVAL'],
+            capacity=app.config['MAIL_BATCH_SIZE'])
+        mail_handler.setLevel(logging.ERROR)
+        handlers.append(mail_handler)
+
+    if not os.path.exists('logs'):
+        os.mkdir('logs')
+    file_handler = RotatingFileHandler('logs/mcstats.log', maxBytes=10240,
+                                       backupCount=10)
+    file_handler.setFormatter(logging.Formatter(
+        '%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]'))
+    file_handler.setLevel(logging.INFO)
+    handlers.append(file_handler)
+
+    queue_handler = DroppingQueueHandler(queue.Queue(app.config['LOG_QUEUE_SIZE']))
+    listener = QueueListener(queue_handler.queue, *handlers, respect_handler_level=True)
+    listener.start()
+    atexit.register(_shutdown, listener, handlers)
+    app.logger.addHandler(queue_handler)
+    app.extensions['log_queue'] = queue_handler
+    app.extensions['log_handlers'] = handlers
+    return queue_handler
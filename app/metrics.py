@@ -0,0 +1,180 @@
+"""Per-request SQL, render and response instrumentation, exposed at /metrics"""
+from collections import deque
+import math
+import threading
+import time
+import sqlalchemy as sa
+from flask import current_app, g, has_request_context, request, request_started, \
+    before_render_template, template_rendered
+from werkzeug.local import LocalProxy
+
+# (name, help) of each per-request measurement, in /metrics order
+MEASUREMENTS = (
+    ('duration_seconds', 'Time to handle the request'),
+    ('queries', 'SQL statements executed'),
+    ('db_seconds', 'Time spent executing SQL'),
+    ('render_seconds', 'Time spent rendering templates'),
+    ('response_bytes', 'Size of the response body'),
+    ('stats_bytes', 'Approximate memory held by stats data loaded for the request'),
+)
+QUANTILES = (0.5, 0.95)
+
+def percentile(samples, q):
+    """Nearest-rank percentile of an already sorted list"""
+    if not samples:
+        return 0
+    return samples[max(0, math.ceil(q * len(samples)) - 1)]
+
+class EndpointMetrics:
+    """Running totals and a window of recent samples for one endpoint"""
+    def __init__(self, sample_size):
+        self.count = 0
+        self.sums = {name: 0 for name, _ in MEASUREMENTS}
+        self.maxima = {name: 0 for name, _ in MEASUREMENTS}
+        self.samples = {name: deque(maxlen=sample_size) for name, _ in MEASUREMENTS}
+
+    def record(self, values):
+        self.count += 1
+        for name, value in values.items():
+            self.sums[name] += value
+            self.maxima[name] = max(self.maxima[name], value)
+            self.samples[name].append(value)
+
+    def summary(self, name):
+        samples = sorted(self.samples[name])
+        return {'count': self.count, 'sum': self.sums[name], 'max': self.maxima[name],
+                **{q: percentile(samples, q) for q in QUANTILES}}
+
+class MetricsRegistry:
+    """Per-endpoint request metrics, rendered in Prometheus text format"""
+    def __init__(self, sample_size=1000):
+        self.sample_size = sample_size
+        self.endpoints = {}
+        self.counters = {}
+        self._lock = threading.Lock()
+
+    def add_counter(self, name, help, fn):
+        """Export the value returned by fn as a counter"""
+        self.counters[name] = (help, fn)
+
+    def record(self, endpoint, values):
+        with self._lock:
+            if endpoint not in self.endpoints:
+                self.endpoints[endpoint] = EndpointMetrics(self.sample_size)
+            self.endpoints[endpoint].record(values)
+
+    def summary(self, endpoint, name):
+        with self._lock:
+            return self.endpoints[endpoint].summary(name)
+
+    def clear(self):
+        with self._lock:
+            self.endpoints.clear()
+
+    def render(self):
+        with self._lock:
+            summaries = {e: {name: m.summary(name) for name, _ in MEASUREMENTS}
+                         for e, m in sorted(self.endpoints.items())}
+        lines = []
+        for name, help in MEASUREMENTS:
+            metric = f'mcstats_request_{name}'
+            lines.append(f'# HELP {metric} {help}, by endpoint')
+            lines.append(f'# TYPE {metric} summary')
+            for endpoint, s in summaries.items():
+                for q in QUANTILES:
+                    lines.append(f'{metric}{{endpoint="{endpoint}",quantile="{q}"}} {s[name][q]}')
+                lines.append(f'{metric}_sum{{endpoint="{endpoint}"}} {s[name]["sum"]}')
+                lines.append(f'{metric}_count{{endpoint="{endpoint}"}} {s[name]["count"]}')
+            lines.append(f'# HELP {metric}_max Largest {help[0].lower()}{help[1:]}, by endpoint')
+            lines.append(f'# TYPE {metric}_max gauge')
+            for endpoint, s in summaries.items():
+                lines.append(f'{metric}_max{{endpoint="{endpoint}"}} {s[name]["max"]}')
+        for metric, (help, fn) in self.counters.items():
+            lines.append(f'# HELP {metric} {help}')
+            lines.append(f'# TYPE {metric} counter')
+            lines.append(f'{metric} {fn()}')
+        return '\n'.join(lines) + '\n'
+
+# The current app's MetricsRegistry
+registry = LocalProxy(lambda: current_app.extensions['metrics'])
+
+def _log_records_dropped():
+    extensions = current_app.extensions
+    handlers = [extensions.get('log_queue'), *extensions.get('log_handlers', [])]
+    return sum(getattr(h, 'dropped', 0) for h in handlers if h is not None)
+
+def init_app(app):
+    metrics = MetricsRegistry(app.config['METRICS_SAMPLE_SIZE'])
+    metrics.add_counter('mcstats_log_records_dropped_total',
+                        'Log records dropped because the log queue or mail batch was full',
+                        _log_records_dropped)
+    app.extensions['metrics'] = metrics
+    request_started.connect(_start_request, app)
+    before_render_template.connect(_start_render, app)
+    template_rendered.connect(_finish_render, app)
+    app.after_request(_finish_request)
+
+def _current():
+    """Metrics being collected for the current request, if any"""
+    if has_request_context():
+        return g.get('_metrics')
+    return None
+
+def _start_request(sender, **extra):
+    g._metrics = {'start': time.perf_counter(), 'queries': 0, 'db_seconds': 0.0,
+                  'render_seconds': 0.0, 'render_starts': [], 'stats_bytes': 0}
+
+def observe(name, value):
+    """Add value to the current request's measurement of name, if collecting"""
+    metrics = _current()
+    if metrics is not None:
+        metrics[name] += value
+
+@sa.event.listens_for(sa.engine.Engine, 'before_cursor_execute')
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    # Kept on the statement's own context, so a statement that fails
+    # leaves nothing behind on the pooled connection
+    if _current() is not None and context is not None:
+        context._metrics_query_start = time.perf_counter()
+
+@sa.event.listens_for(sa.engine.Engine, 'after_cursor_execute')
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    metrics = _current()
+    start = getattr(context, '_metrics_query_start', None)
+    if metrics is not None and start is not None:
+        metrics['queries'] += 1
+        metrics['db_seconds'] += time.perf_counter() - start
+
+def _start_render(sender, template, context, **extra):
+    metrics = _current()
+    if metrics is not None:
+        metrics['render_starts'].append(time.perf_counter())
+
+def _finish_render(sender, template, context, **extra):
+    metrics = _current()
+    if metrics is not None and metrics['render_starts']:
+        start = metrics['render_starts'].pop()
+        # Only count the outermost template; included ones are inside it
+        if not metrics['render_starts']:
+            metrics['render_seconds'] += time.perf_counter() - start
+
+def _finish_request(response):
+    metrics = _current()
+    if metrics is None:
+        return response
+    values = {
+        'duration_seconds': time.perf_counter() - metrics['start'],
+        'queries': metrics['queries'],
+        'db_seconds': metrics['db_seconds'],
+        'render_seconds': metrics['render_seconds'],
+        # Streamed responses don't know their length up front
+        'response_bytes': 0 if response.is_streamed else response.calculate_content_length() or 0,
+        'stats_bytes': metrics['stats_bytes'],
+    }
+    response.headers['X-Query-Count'] = str(values['queries'])
+    response.headers['Server-Timing'] = ', '.join([
+        f'db;desc="{values["queries"]} queries";dur={values["db_seconds"] * 1000:.2f}',
+        f'render;dur={values["render_seconds"] * 1000:.2f}',
+        f'total;dur={values["duration_seconds"] * 1000:.2f}'])
+    registry.record(request.endpoint or 'unknown', values)
+    return response
@@ -1,14 +1,73 @@
 from typing import Optional
+from collections import namedtuple
+from datetime import date, datetime, timedelta
 import enum
+import time
 import sqlalchemy as sa
 import sqlalchemy.orm as so
 from werkzeug.security import generate_password_hash, check_password_hash
+from flask import current_app, session as login_session
 from flask_login import UserMixin
+from config import Config
 from app import db, login
+from app.cache import AppLRUCache
+from app.versions import data_versions, mark_changed, on_change, request_keys, upsert_add
+
+# Default loader strategy for relationships: 'select' (lazy), 'selectin',
+# 'joined', or 'raise' to flag any load a route didn't ask for up front.
+# Mappings are shared by every app in the process, so this comes from the
+# environment rather than a config profile.
+LAZY = Config.RELATIONSHIP_LOADING
+
+# Range of values the database can bind for an integer column (signed 64-bit)
+KEY_RANGE = range(-2 ** 63, 2 ** 63)
+
+def parse_key(text):
+    """Integer key from request text; raises ValueError if malformed or out of range"""
+    value = int(text)
+    if value not in KEY_RANGE:
+        raise ValueError(f'{text!r} is out of range')
+    return value
+
+# Recently loaded users, by id, as (expiry, user version, detached User snapshot)
+user_cache = AppLRUCache('user_cache', 'USER_CACHE_SIZE')
+
+def _user_key(user_id):
+    return f'user:{user_id}'
 
 @login.user_loader
 def load_user(user_id):
-    return db.session.get(User, int(user_id))
+    """
+    Load the logged-in user.  With USER_CACHE_TTL set, this returns a
+    transient snapshot of the User, reused until it expires or the user's
+    data version shows their row was written, by any process; don't add it
+    to a session, load the User to change it.
+    """
+    user_id = int(user_id)
+    ttl = current_app.config['USER_CACHE_TTL']
+    if not ttl:
+        return db.session.get(User, user_id)
+    version = data_versions.version(_user_key(user_id))
+    cached = user_cache.get(user_id)
+    if cached is not None and cached[0] > time.monotonic() and cached[1] == version:
+        return cached[2]
+    user = db.session.get(User, user_id)
+    if user is None:
+        return None
+    snapshot = User(**{c.key: getattr(user, c.key) for c in User.__table__.columns})
+    user_cache.set(user_id, (time.monotonic() + ttl, version, snapshot))
+    return snapshot
+
+@request_keys
+def _session_user_key():
+    # Checked with the page's own versions, so a cached user costs no query
+    if current_app.config['USER_CACHE_TTL'] and '_user_id' in login_session:
+        return [_user_key(login_session['_user_id'])]
+    return []
+
+def invalidate_user(user_id):
+    """Drop any cached snapshot of the given user"""
+    user_cache.evict(lambda key: key == user_id)
 
 class User(UserMixin, db.Model):
     """User of the application"""
@@ -27,6 +86,17 @@ class User(UserMixin, db.Model):
 
     def check_password(self, password):
         return check_password_hash(self.password_hash, password)
+
+@sa.event.listens_for(db.session, 'after_flush')
+def _track_user_changes(session, flush_context):
+    mark_changed(session, *(_user_key(obj.id) for obj in (*session.dirty, *session.deleted)
+                            if isinstance(obj, User)))
+
+@on_change
+def _evict_users(changed):
+    for key in changed:
+        if key.startswith('user:'):
+            invalidate_user(int(key[len('user:'):]))
     
 class Phase(db.Model):
     """Phases in which the game was released"""
@@ -34,8 +104,8 @@ class Phase(db.Model):
     phasename: so.Mapped[str] = so.mapped_column(sa.String(64), index=True,
                                                 unique=True)
 
-    villains: so.Mapped[list['Villain']] = so.relationship(back_populates='phase')
-    heroes: so.Mapped[list['Hero']] = so.relationship(back_populates='phase')
+    villains: so.Mapped[list['Villain']] = so.relationship(back_populates='phase', lazy=LAZY)
+    heroes: so.Mapped[list['Hero']] = so.relationship(back_populates='phase', lazy=LAZY)
 
     def __repr__(self):
         return f'<Phase {self.phasename}>'
@@ -51,7 +121,7 @@ class Villain(db.Model):
     phase_id: so.Mapped[int] = so.mapped_column(sa.ForeignKey(Phase.id),
                                                index=True)
 
-    phase: so.Mapped[Phase] = so.relationship(back_populates='villains')
+    phase: so.Mapped[Phase] = so.relationship(back_populates='villains', lazy=LAZY)
 
     def __repr__(self):
         return f'<Villain {self.name}>'
@@ -61,7 +131,8 @@ class Aspect(db.Model):
     id: so.Mapped[int] = so.mapped_column(primary_key=True)
     name: so.Mapped[str] = so.mapped_column(sa.String(64), index=True,
                                             unique=True)
-    heroes: so.Mapped[list['Hero']] = so.relationship(back_populates='default_aspect')
+    heroes: so.Mapped[list['Hero']] = so.relationship(back_populates='default_aspect',
+                                                      lazy=LAZY)
     fg_colour: so.Mapped[str] = so.mapped_column(sa.String(7), default='#000000')
     bg_colour: so.Mapped[str] = so.mapped_column(sa.String(7), default='#ffffff')
 
@@ -90,8 +161,8 @@ class Hero(db.Model):
                                                index=True)
     aspect_id: so.Mapped[int] = so.mapped_column(sa.ForeignKey(Aspect.id),
                                                index=True)
-    phase: so.Mapped[Phase] = so.relationship(back_populates='heroes')
-    default_aspect: so.Mapped[Aspect] = so.relationship(back_populates='heroes')
+    phase: so.Mapped[Phase] = so.relationship(back_populates='heroes', lazy=LAZY)
+    default_aspect: so.Mapped[Aspect] = so.relationship(back_populates='heroes', lazy=LAZY)
 
     def __repr__(self):
         return f'<Hero {self.name}>'
@@ -112,27 +183,333 @@ class ResultTypes(enum.Enum):
     WIN = 1
     LOSS = 2
 
+    def as_cell(self):
+        #TODO: this should return some kind of CSS selector
+        match self:
+            case ResultTypes.WIN:
+                return '<td bgcolor="#00ff00">W</td>'
+            case ResultTypes.LOSS:
+                return '<td bgcolor="#ff0000">L</td>'
+
+class Difficulty(enum.Enum):
+    """Scenario difficulty a game was played at"""
+    STANDARD = 1
+    EXPERT = 2
+    HEROIC = 3
+
 class Result(db.Model):
     """Pairing of Villain and Hero"""
     id: so.Mapped[int] = so.mapped_column(primary_key=True)
-    hero_id: so.Mapped[int] = so.mapped_column(sa.ForeignKey(Hero.id),
-                                               index=True)
+    # The summary and rollup hooks need the old values of the counted
+    # columns when they change, even on an expired instance, so they are
+    # loaded before a set
+    hero_id: so.Mapped[int] = so.mapped_column(sa.ForeignKey(Hero.id), active_history=True)
     villain_id: so.Mapped[int] = so.mapped_column(sa.ForeignKey(Villain.id),
-                                               index=True)
-    result: so.Mapped[ResultTypes]
+                                                  active_history=True)
+    result: so.Mapped[ResultTypes] = so.mapped_column(active_history=True)
+    # When the game was played, the aspect the hero was actually played
+    # with, the difficulty and who played; None where unknown
+    played_at: so.Mapped[Optional[datetime]] = so.mapped_column(active_history=True)
+    aspect_id: so.Mapped[Optional[int]] = so.mapped_column(sa.ForeignKey(Aspect.id),
+                                                           active_history=True)
+    difficulty: so.Mapped[Optional[Difficulty]]
+    player: so.Mapped[Optional[str]] = so.mapped_column(sa.String(64))
     hero: so.Mapped[Hero] = so.relationship()
     villain: so.Mapped[Villain] = so.relationship()
+    aspect: so.Mapped[Optional[Aspect]] = so.relationship(lazy=LAZY)
+
+    __table_args__ = (
+        # Cover the per-pairing win / loss counts without reading the table,
+        # in pairing order so they are grouped without a sort.  Unfiltered,
+        # or by date or difficulty, they come from scanning the first, whose
+        # leading villain_id also serves the villain foreign key; by aspect
+        # or player, from searching the others
+        sa.Index('ix_result_pairing', 'villain_id', 'hero_id', 'result', 'played_at',
+                 'difficulty'),
+        sa.Index('ix_result_aspect_pairing', 'aspect_id', 'villain_id', 'hero_id', 'result'),
+        sa.Index('ix_result_player_pairing', 'player', 'villain_id', 'hero_id', 'result'),
+        # A hero's games in date order, and the hero foreign key
+        sa.Index('ix_result_hero_played_at', 'hero_id', 'played_at'),
+    )
 
     def __repr__(self):
         return f'<Result {self.hero.name} vs {self.villain.name}: {self.result}>'
 
     def as_cell(self):
-        #TODO: this should return some kind of CSS selector
-        match self.result:
-            case ResultTypes.WIN:
-                return '<td bgcolor="#00ff00">W</td>'
-            case ResultTypes.LOSS:
-                return '<td bgcolor="#ff0000">L</td>'
-            case _:
-                return '<td></td>'
-            
\ No newline at end of file
+        if self.result is None:
+            return '<td></td>'
+        return self.result.as_cell()
+
+class HeroVillainSummary(db.Model):
+    """Rollup of Results for a Hero / Villain pairing"""
+    hero_id: so.Mapped[int] = so.mapped_column(sa.ForeignKey(Hero.id),
+                                               primary_key=True)
+    villain_id: so.Mapped[int] = so.mapped_column(sa.ForeignKey(Villain.id),
+                                                  primary_key=True, index=True)
+    wins: so.Mapped[int] = so.mapped_column(default=0)
+    losses: so.Mapped[int] = so.mapped_column(default=0)
+    last_result: so.Mapped[Optional[ResultTypes]]
+
+    def __repr__(self):
+        return f'<HeroVillainSummary {self.hero_id} vs {self.villain_id}: {self.wins}-{self.losses}>'
+
+# Maximum number of pairings per IN (...) clause when refreshing summaries
+SUMMARY_CHUNK_SIZE = 500
+
+def refresh_summaries(connection):
+    """
+    Recompute every HeroVillainSummary row from the raw result table, to
+    backfill them; writes keep them current with count_results().
+    Runs on the caller's connection, so it shares their transaction.
+    """
+    connection.execute(sa.delete(HeroVillainSummary))
+    wins = sa.func.sum(sa.case((Result.result == ResultTypes.WIN, 1), else_=0))
+    losses = sa.func.sum(sa.case((Result.result == ResultTypes.LOSS, 1), else_=0))
+    agg = sa.select(Result.hero_id, Result.villain_id, wins.label('wins'),
+                    losses.label('losses'), sa.func.max(Result.id).label('last_id')).\
+        group_by(Result.hero_id, Result.villain_id).subquery()
+    rows = connection.execute(
+        sa.select(agg.c.hero_id, agg.c.villain_id, agg.c.wins, agg.c.losses,
+                  Result.result).join(Result, Result.id == agg.c.last_id)).all()
+    if rows:
+        connection.execute(sa.insert(HeroVillainSummary), [
+            {'hero_id': h, 'villain_id': v, 'wins': w, 'losses': l, 'last_result': r}
+            for h, v, w, l, r in rows])
+
+class RollupPeriod(enum.Enum):
+    """Length of the time buckets in ResultRollup"""
+    DAY = 1
+    WEEK = 2
+
+    @property
+    def length(self):
+        return timedelta(days=7 if self is RollupPeriod.WEEK else 1)
+
+    def start(self, day):
+        """First day of the bucket holding day; weeks start on Monday"""
+        if self is RollupPeriod.WEEK:
+            return day - timedelta(days=day.weekday())
+        return day
+
+class ResultRollup(db.Model):
+    """
+    Wins and losses per hero, villain and aspect, by day and by week.
+    The aspect is the one played, or the hero's default where that's
+    unknown; Results with no played_at aren't rolled up.
+    """
+    period: so.Mapped[RollupPeriod] = so.mapped_column(primary_key=True)
+    period_start: so.Mapped[date] = so.mapped_column(primary_key=True)
+    hero_id: so.Mapped[int] = so.mapped_column(sa.ForeignKey(Hero.id), primary_key=True)
+    villain_id: so.Mapped[int] = so.mapped_column(sa.ForeignKey(Villain.id), primary_key=True)
+    aspect_id: so.Mapped[int] = so.mapped_column(sa.ForeignKey(Aspect.id), primary_key=True)
+    wins: so.Mapped[int] = so.mapped_column(default=0)
+    losses: so.Mapped[int] = so.mapped_column(default=0)
+
+    # One per trend subject, in the order trends read them
+    __table_args__ = (
+        sa.Index('ix_result_rollup_hero', 'hero_id', 'period', 'period_start'),
+        sa.Index('ix_result_rollup_villain', 'villain_id', 'period', 'period_start'),
+        sa.Index('ix_result_rollup_aspect', 'aspect_id', 'period', 'period_start'),
+    )
+
+    def __repr__(self):
+        return (f'<ResultRollup {self.period.name} {self.period_start} {self.hero_id} vs '
+                f'{self.villain_id} ({self.aspect_id}): {self.wins}-{self.losses}>')
+
+# Results read per round trip when rebuilding rollups
+ROLLUP_BATCH_SIZE = 1000
+
+def refresh_rollups(connection, games=None):
+    """
+    Recompute ResultRollup rows covering the given (hero_id, villain_id,
+    played_at date) games from the raw result table, or every row if games
+    is None.  Whole weeks are redone for each pairing, so the day and week
+    rows stay in step.  Used to rebuild them, and when a hero's default
+    aspect changes; writes keep them current with count_results().
+    Runs on the caller's connection, so it shares their transaction.
+    """
+    if games is None:
+        connection.execute(sa.delete(ResultRollup))
+        _refresh_rollup_chunk(connection, None, None)
+        return
+    # Span of whole weeks to redo for each pairing
+    spans = {}
+    for hero_id, villain_id, day in games:
+        if None in (hero_id, villain_id, day):
+            continue
+        start = RollupPeriod.WEEK.start(day)
+        end = start + RollupPeriod.WEEK.length
+        first, last = spans.get((hero_id, villain_id), (start, end))
+        spans[(hero_id, villain_id)] = (min(first, start), max(last, end))
+    pairs = list(spans)
+    for i in range(0, len(pairs), SUMMARY_CHUNK_SIZE):
+        chunk = pairs[i:i + SUMMARY_CHUNK_SIZE]
+        span = (min(spans[p][0] for p in chunk), max(spans[p][1] for p in chunk))
+        connection.execute(sa.delete(ResultRollup).where(
+            sa.tuple_(ResultRollup.hero_id, ResultRollup.villain_id).in_(chunk),
+            ResultRollup.period_start >= span[0], ResultRollup.period_start < span[1]))
+        _refresh_rollup_chunk(connection, chunk, span)
+
+def _refresh_rollup_chunk(connection, pairs, span):
+    aspect_id = sa.func.coalesce(Result.aspect_id, Hero.aspect_id)
+    query = sa.select(Result.hero_id, Result.villain_id, aspect_id, Result.played_at,
+                      Result.result).\
+        join(Hero, Result.hero_id == Hero.id).\
+        where(Result.played_at.is_not(None)).\
+        execution_options(yield_per=ROLLUP_BATCH_SIZE)
+    if pairs is not None:
+        query = query.where(
+            sa.tuple_(Result.hero_id, Result.villain_id).in_(pairs),
+            Result.played_at >= datetime.combine(span[0], datetime.min.time()),
+            Result.played_at < datetime.combine(span[1], datetime.min.time()))
+    counts = {}
+    for hero_id, villain_id, aspect_id, played_at, result in connection.execute(query):
+        day = played_at.date()
+        for period in RollupPeriod:
+            key = (period, period.start(day), hero_id, villain_id, aspect_id)
+            wins, losses = counts.get(key, (0, 0))
+            counts[key] = (wins + 1, losses) if result == ResultTypes.WIN else (wins, losses + 1)
+    if counts:
+        connection.execute(sa.insert(ResultRollup), [
+            {'period': p, 'period_start': s, 'hero_id': h, 'villain_id': v, 'aspect_id': a,
+             'wins': w, 'losses': l} for (p, s, h, v, a), (w, l) in counts.items()])
+
+def _played_on(value):
+    return value.date() if value is not None else None
+
+# A Result as the summaries and rollups count it
+Game = namedtuple('Game', 'hero_id villain_id result played_at aspect_id')
+
+def _add_counts(counts, key, sign, result):
+    wins, losses = counts.get(key, (0, 0))
+    if result == ResultTypes.WIN:
+        counts[key] = (wins + sign, losses)
+    else:
+        counts[key] = (wins, losses + sign)
+
+def _drop_empty(connection, model, columns, keys):
+    """Delete the rows for keys that have no wins or losses left"""
+    keys = list(keys)
+    for i in range(0, len(keys), SUMMARY_CHUNK_SIZE):
+        connection.execute(sa.delete(model).where(
+            sa.tuple_(*columns).in_(keys[i:i + SUMMARY_CHUNK_SIZE]),
+            model.wins == 0, model.losses == 0))
+
+def count_results(connection, inserted=(), deleted=(), updated=(), recounted=()):
+    """
+    Apply Games inserted into and deleted from the result table, and
+    (old, new) pairs of Games updated in it, to HeroVillainSummary and
+    ResultRollup as atomic additions to their counts.  A write costs the
+    same however long the pairing's history, and concurrent writers' counts
+    add up rather than replace each other.
+
+    inserted must be in id order, the last of each pairing's becoming its
+    last_result; pairings that lose a game look theirs up again.  Rollups
+    aren't touched for the heroes in recounted, which the caller rebuilds.
+    Runs on the caller's connection, so it shares their transaction.
+    """
+    changes = [(1, game) for game in inserted]
+    for old, new in updated:
+        changes += [(-1, old), (1, new)]
+    changes += [(-1, game) for game in deleted]
+    changes = [(sign, game) for sign, game in changes
+               if None not in (game.hero_id, game.villain_id, game.result)]
+    latest = {(g.hero_id, g.villain_id): g.result for g in inserted}
+    relast = {(g.hero_id, g.villain_id) for g in deleted}
+    relast.update((g.hero_id, g.villain_id) for old, new in updated for g in (old, new)
+                  if (old.hero_id, old.villain_id, old.result) !=
+                     (new.hero_id, new.villain_id, new.result))
+
+    # Games with no recorded aspect roll up under their hero's default
+    defaults = {game.hero_id for _, game in changes
+                if game.aspect_id is None and game.played_at is not None}
+    if defaults:
+        defaults = dict(connection.execute(
+            sa.select(Hero.id, Hero.aspect_id).where(Hero.id.in_(defaults))).all())
+    summaries, rollups, emptied = {}, {}, set()
+    for sign, game in changes:
+        pair = (game.hero_id, game.villain_id)
+        _add_counts(summaries, pair, sign, game.result)
+        if game.played_at is None or game.hero_id in recounted:
+            continue
+        aspect_id = game.aspect_id if game.aspect_id is not None else \
+            defaults.get(game.hero_id)
+        day = game.played_at.date()
+        for period in RollupPeriod:
+            key = (period, period.start(day), *pair, aspect_id)
+            _add_counts(rollups, key, sign, game.result)
+            if sign < 0:
+                emptied.add(key)
+
+    rows = [{'hero_id': h, 'villain_id': v, 'wins': w, 'losses': l,
+             'last_result': latest.get((h, v))}
+            for (h, v), (w, l) in summaries.items() if (w, l) != (0, 0) or (h, v) in latest]
+    table = HeroVillainSummary.__table__
+    upsert_add(connection, table, [r for r in rows if r['last_result'] is not None],
+               add=('wins', 'losses'), replace=('last_result',))
+    upsert_add(connection, table, [r for r in rows if r['last_result'] is None],
+               add=('wins', 'losses'))
+    pairs = (HeroVillainSummary.hero_id, HeroVillainSummary.villain_id)
+    if relast:
+        last = sa.select(Result.result).\
+            where(Result.hero_id == HeroVillainSummary.hero_id,
+                  Result.villain_id == HeroVillainSummary.villain_id).\
+            order_by(Result.id.desc()).limit(1).scalar_subquery()
+        keys = list(relast)
+        for i in range(0, len(keys), SUMMARY_CHUNK_SIZE):
+            connection.execute(sa.update(HeroVillainSummary).
+                               where(sa.tuple_(*pairs).in_(keys[i:i + SUMMARY_CHUNK_SIZE])).
+                               values(last_result=last))
+        _drop_empty(connection, HeroVillainSummary, pairs, relast)
+
+    upsert_add(connection, ResultRollup.__table__,
+               [{'period': p, 'period_start': s, 'hero_id': h, 'villain_id': v,
+                 'aspect_id': a, 'wins': w, 'losses': l}
+                for (p, s, h, v, a), (w, l) in rollups.items() if (w, l) != (0, 0)],
+               add=('wins', 'losses'))
+    _drop_empty(connection, ResultRollup,
+                (ResultRollup.period, ResultRollup.period_start, ResultRollup.hero_id,
+                 ResultRollup.villain_id, ResultRollup.aspect_id), emptied)
+
+def _game(obj, committed=False):
+    """obj as a Game, with its values from before this flush if committed"""
+    def value(key):
+        if committed:
+            history = so.attributes.get_history(obj, key)
+            if history.deleted:
+                return history.deleted[0]
+        return getattr(obj, key)
+    return Game(*(value(key) for key in Game._fields))
+
+@sa.event.listens_for(db.session, 'after_flush')
+def _count_results(session, flush_context):
+    """
+    Keep HeroVillainSummary and ResultRollup in step with Result inserts,
+    updates and deletes, and ResultRollup with changes to a Hero's default
+    aspect, which its games with no recorded aspect are counted under
+    """
+    inserted = [_game(obj) for obj in sorted(
+        (obj for obj in session.new if isinstance(obj, Result)), key=lambda obj: obj.id)]
+    deleted = [_game(obj, committed=True) for obj in session.deleted
+               if isinstance(obj, Result)]
+    updated = [(_game(obj, committed=True), _game(obj)) for obj in session.dirty
+               if isinstance(obj, Result) and session.is_modified(obj)]
+    updated = [(old, new) for old, new in updated if old != new]
+    # A new default aspect moves all the hero's games with no recorded one,
+    # so their rollups are rebuilt rather than adjusted
+    heroes = {obj.id for obj in session.dirty if isinstance(obj, Hero) and
+              so.attributes.get_history(obj, 'aspect_id').has_changes()}
+    if inserted or deleted or updated:
+        count_results(session.connection(), inserted, deleted, updated, recounted=heroes)
+    if heroes:
+        # Every week in which the hero played each villain, and any game
+        # this flush took away from them
+        games = {(g.hero_id, g.villain_id, _played_on(g.played_at))
+                 for g in (*deleted, *(old for old, _ in updated)) if g.hero_id in heroes}
+        first, last = sa.func.min(Result.played_at), sa.func.max(Result.played_at)
+        for hero_id, villain_id, *times in session.connection().execute(
+                sa.select(Result.hero_id, Result.villain_id, first, last).
+                where(Result.hero_id.in_(heroes)).
+                group_by(Result.hero_id, Result.villain_id)):
+            games.update((hero_id, villain_id, _played_on(t)) for t in times)
+        refresh_rollups(session.connection(), games)
@@ -0,0 +1,65 @@
+"""Keyset pagination: pages start after (or end before) a row's sort key, not at an OFFSET"""
+import operator
+import sqlalchemy as sa
+from app import db
+from app.models import parse_key
+
+class KeysetPage:
+    """
+    One page of rows in the order of some key columns, with cursors for the
+    pages either side.
+
+    A cursor is the key of the last row shown (for the next page) or the
+    first (for the previous one), so finding a page is an index seek however
+    deep it is, and rows added or removed elsewhere don't shift it.
+    """
+    def __init__(self, items, columns, has_prev, has_next):
+        self.items = items
+        self.columns = columns
+        self.prev_cursor = self.cursor(items[0]) if has_prev and items else None
+        self.next_cursor = self.cursor(items[-1]) if has_next and items else None
+
+    def cursor(self, item):
+        return '.'.join(str(getattr(item, column.key)) for column in self.columns)
+
+    @staticmethod
+    def parse_cursor(cursor, columns):
+        """Key values from a cursor; raises ValueError if it's malformed"""
+        values = tuple(parse_key(part) for part in cursor.split('.'))
+        if len(values) != len(columns):
+            raise ValueError(f'bad cursor {cursor!r}')
+        return values
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+def _seek(columns, values, compare):
+    """Rows whose key compares true against values, as index-friendly ORs"""
+    clauses = []
+    for i, column in enumerate(columns):
+        equal = [c == v for c, v in zip(columns[:i], values[:i])]
+        clauses.append(sa.and_(*equal, compare(column, values[i])))
+    return sa.or_(*clauses)
+
+def paginate(query, columns, per_page, after=None, before=None, descending=False):
+    """
+    Run a select of one entity for the page of per_page rows, ordered by
+    columns, that starts after the cursor after or ends before the cursor
+    before (the first page if neither).  Raises ValueError for a bad cursor.
+    """
+    forward = before is None
+    # Walking backwards from before means reading in the opposite order
+    ascending = forward != descending
+    if after is not None or before is not None:
+        values = KeysetPage.parse_cursor(after if forward else before, columns)
+        query = query.where(_seek(columns, values, operator.gt if ascending else operator.lt))
+    query = query.order_by(*(c if ascending else c.desc() for c in columns)).limit(per_page + 1)
+    items = db.session.scalars(query).all()
+    more = len(items) > per_page
+    items = items[:per_page]
+    if forward:
+        return KeysetPage(items, columns, has_prev=after is not None, has_next=more)
+    return KeysetPage(items[::-1], columns, has_prev=more, has_next=True)
@@ -0,0 +1,96 @@
+"""Cached reference data: the Phases and Aspects that forms and pages look up"""
+import threading
+import sqlalchemy as sa
+from flask import current_app, g
+from app import db
+from app.models import Phase, Aspect
+from app.versions import data_versions
+
+class ReferenceTable:
+    """
+    In-process snapshot of a small, rarely-changing table.
+
+    Rows are loaded on first use and again after any commit that wrote to
+    the table.  They're held as transient model instances built from plain
+    column values, so they are never attached to (or expired by) a session
+    and are safe to share between requests.
+    """
+    def __init__(self, model):
+        self.model = model
+        self.table = model.__table__.name
+        self._lock = threading.Lock()
+
+    def _store(self):
+        """Per-app (version, rows by id) for every reference table"""
+        return current_app.extensions['reference']
+
+    def clear(self):
+        with self._lock:
+            self._store().pop(self.table, None)
+
+    def _rows(self, reload=False):
+        store = self._store()
+        version, rows = store.get(self.table, (None, {}))
+        current = data_versions.version(self.table)
+        if version != current or reload:
+            with self._lock:
+                if not reload:
+                    version, rows = store.get(self.table, (None, {}))
+                if version != current or reload:
+                    query = sa.select(*self.model.__table__.columns).order_by(self.model.id)
+                    rows = {r.id: self.model(**r._mapping) for r in db.session.execute(query)}
+                    store[self.table] = (current, rows)
+        return rows
+
+    def all(self):
+        return list(self._rows().values())
+
+    def get(self, id):
+        """
+        The row with this id, or None.  The first miss in a request reloads
+        the table, in case the row was written without its version being
+        bumped; later ones don't, so a page of rows pointing at a missing id
+        costs one query, not one each.
+        """
+        if id is None:
+            return None
+        row = self._rows().get(id)
+        reloaded = g.setdefault('_reference_reloaded', set())
+        if row is None and self.table not in reloaded:
+            reloaded.add(self.table)
+            row = self._rows(reload=True).get(id)
+        return row
+
+    def choices(self, label):
+        """(id, label) pairs, in id order, for a SelectField / RadioField"""
+        return [(row.id, getattr(row, label)) for row in self._rows().values()]
+
+class ReferenceData:
+    """The cached reference tables, as exposed to forms and templates"""
+    def __init__(self):
+        self.phases = ReferenceTable(Phase)
+        self.aspects = ReferenceTable(Aspect)
+
+    def phase(self, id):
+        return self.phases.get(id)
+
+    def aspect(self, id):
+        return self.aspects.get(id)
+
+    def clear(self):
+        self.phases.clear()
+        self.aspects.clear()
+
+reference = ReferenceData()
+
+def inject_reference():
+    return {'reference': reference}
+
+def _forget_reloads():
+    # Test clients and CLI commands can share one app context across requests
+    g.pop('_reference_reloaded', None)
+
+def init_app(app):
+    app.extensions['reference'] = {}
+    app.context_processor(inject_reference)
+    app.before_request(_forget_reloads)
@@ -0,0 +1,46 @@
+"""Send safe reads to the read replica, keeping read-your-writes"""
+import functools
+import time
+import sqlalchemy as sa
+from flask import current_app, g, has_request_context, request, session
+from config import engine_options
+from app.versions import on_change
+
+def init_app(app):
+    """Create the replica engine, in app.extensions['replica'], if DATABASE_READ_URL is set"""
+    url = app.config['DATABASE_READ_URL']
+    if url:
+        options = engine_options({**app.config, 'SQLALCHEMY_DATABASE_URI': url})
+        app.extensions['replica'] = sa.create_engine(url, **options)
+
+def _recently_written():
+    """
+    Whether this visitor, or anyone in this process, committed a change
+    within the replica lag window; the replica might not have it yet
+    """
+    window = current_app.config['DATABASE_READ_LAG']
+    if time.time() - session.get('_last_write', 0) < window:
+        return True
+    return time.monotonic() - current_app.extensions.get('last_write', -window) < window
+
+def read_only(view):
+    """
+    Run the view's queries against the read replica, if one is configured.
+    Writes, flushes and non-GET requests still go to the primary.
+    """
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        g.read_replica = ('replica' in current_app.extensions
+                          and request.method in ('GET', 'HEAD')
+                          and not _recently_written())
+        return view(*args, **kwargs)
+    return wrapper
+
+@on_change
+def _record_write(keys):
+    if 'replica' not in current_app.extensions:
+        return
+    current_app.extensions['last_write'] = time.monotonic()
+    if has_request_context():
+        # Follows the visitor to whichever worker serves their next request
+        session['_last_write'] = time.time()
@@ -0,0 +1,194 @@
+"""Bulk import and export of Results as CSV or JSON lines"""
+import csv
+from datetime import datetime
+import io
+import json
+import sqlalchemy as sa
+from flask import current_app
+from app import db
+from app.models import Hero, Villain, Aspect, Result, ResultTypes, Difficulty, Game, \
+    count_results
+from app.reference import reference
+
+FORMATS = ('csv', 'jsonl')
+# Fields of an imported record; those after result are optional
+IMPORT_FIELDS = ('hero', 'villain', 'result', 'played_at', 'aspect', 'difficulty', 'player')
+REQUIRED_FIELDS = 3
+
+class ImportReport:
+    """Outcome of a bulk import: rows written, plus errors by line number"""
+    def __init__(self):
+        self.imported = 0
+        self.errors = []
+
+    def error(self, line_no, message):
+        self.errors.append((line_no, message))
+
+    def as_dict(self):
+        return {'imported': self.imported,
+                'errors': [{'line': n, 'error': e} for n, e in self.errors]}
+
+def _normalise(name):
+    return name.strip().casefold()
+
+def _parse_csv(lines):
+    """
+    Yield (line_no, fields) for each CSV row, fields being IMPORT_FIELDS in
+    order (missing optional ones as ''), or (line_no, error message) if the
+    row can't be read
+    """
+    reader = csv.reader(lines)
+    for row in reader:
+        if not row or not any(field.strip() for field in row):
+            continue
+        if reader.line_num == 1 and [f.strip().lower() for f in row] == \
+                list(IMPORT_FIELDS[:len(row)]):
+            continue
+        if not REQUIRED_FIELDS <= len(row) <= len(IMPORT_FIELDS):
+            yield reader.line_num, (f'expected {REQUIRED_FIELDS} to {len(IMPORT_FIELDS)} '
+                                    f'fields, got {len(row)}')
+            continue
+        yield reader.line_num, tuple(row) + ('',) * (len(IMPORT_FIELDS) - len(row))
+
+def _parse_jsonl(lines):
+    """As _parse_csv, for JSON objects keyed by IMPORT_FIELDS"""
+    for line_no, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+            yield line_no, (*(record[f] for f in IMPORT_FIELDS[:REQUIRED_FIELDS]),
+                            *(record.get(f) or '' for f in IMPORT_FIELDS[REQUIRED_FIELDS:]))
+        except (ValueError, TypeError) as e:
+            yield line_no, f'invalid JSON: {e}'
+        except KeyError as e:
+            yield line_no, f'missing field {e}'
+
+def decode_lines(lines):
+    """
+    Decode uploaded or imported lines of bytes as UTF-8, dropping a leading
+    byte order mark.  Bytes that aren't UTF-8 become U+FFFD, so import_results can
+    report the line rather than the whole upload failing part way through.
+    """
+    for i, line in enumerate(lines):
+        yield line.decode('utf-8-sig' if i == 0 else 'utf-8', errors='replace')
+
+def import_results(lines, fmt='csv', chunk_size=None):
+    """
+    Import (hero name, villain name, WIN/LOSS) records, optionally followed
+    by when they were played (ISO 8601), the aspect name, difficulty and
+    player, from an iterable of lines. Names are resolved against a map
+    loaded once up front, rows are written with executemany inserts and
+    committed every chunk_size rows.
+    Returns an ImportReport; bad lines are reported, not fatal.
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f'Unknown import format {fmt!r}')
+    chunk_size = chunk_size or current_app.config['RESULTS_IMPORT_CHUNK_SIZE']
+    heroes = {_normalise(name): id for name, id in
+              db.session.execute(sa.select(Hero.name, Hero.id))}
+    villains = {_normalise(name): id for name, id in
+                db.session.execute(sa.select(Villain.name, Villain.id))}
+    aspects = {_normalise(name): id for name, id in
+               db.session.execute(sa.select(Aspect.name, Aspect.id))}
+    parse = _parse_csv if fmt == 'csv' else _parse_jsonl
+    report = ImportReport()
+    batch = []
+    for line_no, record in parse(lines):
+        if isinstance(record, str):
+            report.error(line_no, record)
+            continue
+        if any('\ufffd' in str(field) for field in record):
+            report.error(line_no, 'not valid UTF-8')
+            continue
+        hero, villain, result, played_at, aspect, difficulty, player = \
+            (str(field).strip() for field in record)
+        hero_id = heroes.get(_normalise(hero))
+        villain_id = villains.get(_normalise(villain))
+        result = ResultTypes.__members__.get(result.upper())
+        aspect_id = aspects.get(_normalise(aspect)) if aspect else None
+        difficulty = Difficulty.__members__.get(difficulty.upper()) if difficulty else None
+        try:
+            played_at = datetime.fromisoformat(played_at) if played_at else None
+        except ValueError:
+            played_at = False
+        if hero_id is None:
+            report.error(line_no, f'unknown hero {hero!r}')
+        elif villain_id is None:
+            report.error(line_no, f'unknown villain {villain!r}')
+        elif result is None:
+            report.error(line_no, f'result must be WIN or LOSS, not {record[2]!r}')
+        elif played_at is False:
+            report.error(line_no, f'played_at must be an ISO 8601 date, not {record[3]!r}')
+        elif aspect and aspect_id is None:
+            report.error(line_no, f'unknown aspect {aspect!r}')
+        elif difficulty is None and record[5]:
+            report.error(line_no, f'unknown difficulty {record[5]!r}')
+        else:
+            batch.append({'hero_id': hero_id, 'villain_id': villain_id, 'result': result,
+                          'played_at': played_at, 'aspect_id': aspect_id,
+                          'difficulty': difficulty, 'player': player or None})
+            if len(batch) >= chunk_size:
+                _write_batch(batch, report)
+                batch = []
+    _write_batch(batch, report)
+    return report
+
+def _write_batch(batch, report):
+    if not batch:
+        return
+    db.session.execute(sa.insert(Result), batch)
+    # Bulk inserts skip the flush hooks, so count them into the summaries here
+    count_results(db.session.connection(),
+                  [Game(*(r[field] for field in Game._fields)) for r in batch])
+    db.session.commit()
+    report.imported += len(batch)
+
+EXPORT_FIELDS = ('id', *IMPORT_FIELDS)
+
+def export_rows(batch_size=None):
+    """
+    Yield a tuple of EXPORT_FIELDS for every Result, in id order, with
+    unknown optional fields as None.
+    Rows are fetched batch_size at a time through a server-side cursor where
+    the driver supports one, so the full history is never held in memory.
+    """
+    batch_size = batch_size or current_app.config['RESULTS_EXPORT_BATCH_SIZE']
+    query = sa.select(Result.id, Hero.name, Villain.name, Result.result, Result.played_at,
+                      Aspect.name, Result.difficulty, Result.player).\
+        join(Hero, Result.hero_id == Hero.id).\
+        join(Villain, Result.villain_id == Villain.id).\
+        outerjoin(Aspect, Result.aspect_id == Aspect.id).\
+        order_by(Result.id).\
+        execution_options(yield_per=batch_size)
+    for row in db.session.execute(query):
+        yield _export_row(*row)
+
+def _export_row(id, hero, villain, result, played_at, aspect, difficulty, player):
+    return (id, hero, villain, result.name,
+            played_at.isoformat() if played_at else None, aspect,
+            difficulty.name if difficulty else None, player)
+
+def export_dict(result):
+    """A Result, with its hero and villain loaded, as an object keyed by EXPORT_FIELDS"""
+    aspect = reference.aspect(result.aspect_id) if result.aspect_id is not None else None
+    return dict(zip(EXPORT_FIELDS, _export_row(
+        result.id, result.hero.name, result.villain.name, result.result, result.played_at,
+        aspect.name if aspect else None, result.difficulty, result.player)))
+
+def export_csv(rows):
+    """Render rows as CSV, one line at a time, header first"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_FIELDS)
+    for row in rows:
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerow(row)
+    yield buffer.getvalue()
+
+def export_jsonl(rows):
+    """Render rows as JSON lines, one object per Result"""
+    for row in rows:
+        yield json.dumps(dict(zip(EXPORT_FIELDS, row))) + '\n'
@@ -1,100 +1,262 @@
-from flask import render_template, flash, redirect, url_for, request
+from flask import Blueprint, render_template, flash, redirect, url_for, request, jsonify, \
+    Response, stream_with_context, abort, current_app
 from flask_login import current_user, login_user, logout_user, login_required
+from flask_wtf.csrf import generate_csrf
 import sqlalchemy as sa
-from app import app, db
+import sqlalchemy.orm as so
+from app import db
 from app.forms import LoginForm, VillainForm, VillainDeleteForm, HeroForm, HeroDeleteForm
-from app.models import Phase, Aspect, User, Result, Villain, Hero
+from app.models import Phase, Aspect, User, Result, Villain, Hero, Difficulty
+from app.stats import ResultMatrix, ResultFilter, StatsService, STATS_TABLES, matchups
+from app.versions import data_versions
+from app.metrics import registry
+from app.replica import read_only
+from app.conditional import conditional
+from app.trends import Trend, TREND_TABLES, trend_args
+from app.pagination import paginate
+from app.search import search_index, KINDS, DEFAULT_LIMIT, MAX_LIMIT
+from app.results import import_results, export_rows, export_csv, export_jsonl, export_dict, \
+    decode_lines, FORMATS
 from urllib.parse import urlsplit
 
 
-@app.route('/')
-@app.route('/index')
+bp = Blueprint('main', __name__)
+
+# Keyset order of each listing; (phase_id, id) is covered by the phase_id
+# index, whose entries also carry the primary key
+HERO_ORDER = (Hero.phase_id, Hero.id)
+VILLAIN_ORDER = (Villain.phase_id, Villain.id)
+RESULT_ORDER = (Result.id,)
+
+@bp.route('/')
+@bp.route('/index')
+@read_only
+@conditional('phase', 'aspect', 'hero', 'villain')
 def index():
-    phases = Phase.query.order_by('id').all()
+    phases = Phase.query.options(
+        so.selectinload(Phase.villains), so.selectinload(Phase.heroes)).\
+        order_by('id').all()
     return render_template('index.html', phases=phases)
 
-@app.route('/stats')
+def _result_filter():
+    """The ResultFilter given in the query string; 400 if it's malformed"""
+    try:
+        return ResultFilter.from_args(request.args)
+    except ValueError as e:
+        abort(400, description=str(e))
+
+@bp.route('/stats')
+@read_only
+@conditional(*STATS_TABLES)
 def stats():
-    phases = Phase.query.order_by('id').all()
-    #TODO: this could get inefficient with lots of results
-    results = Result.query.order_by('id').all()
-    return render_template('stats.html', phases=phases, results=results)
+    service = StatsService(_result_filter())
+    lazy = current_app.config['STATS_LAZY_TABS']
+    # In lazy mode only the active (first) tab is rendered up front; the
+    # others are fetched from stats_phase when they are first shown
+    tabs = service.tabs(service.phases[:1] if lazy else None)
+    return render_template('stats.html', phases=service.phases, tabs=tabs,
+                           result_filter=service.result_filter, difficulties=Difficulty)
+
+@bp.route('/stats/phase/<int:phase_id>')
+@read_only
+@conditional(*STATS_TABLES)
+def stats_phase(phase_id):
+    service = StatsService(_result_filter())
+    phase = service.phase(phase_id)
+    if phase is None:
+        abort(404)
+    return service.tabs([phase])[phase_id]
+
+def _page(query, columns, descending=False):
+    """
+    The page of query picked by the after / before cursors in the query
+    string; raises ValueError if a cursor is malformed
+    """
+    return paginate(query, columns, current_app.config['LIST_PAGE_SIZE'],
+                    after=request.args.get('after'), before=request.args.get('before'),
+                    descending=descending)
+
+def _html_page(query, columns, descending=False):
+    """As _page, but 400 if a cursor is malformed"""
+    try:
+        return _page(query, columns, descending)
+    except ValueError as e:
+        abort(400, description=str(e))
+
+def _json_page(query, columns, item, descending=False):
+    """As _page, rendered as JSON with item() turning each row into an object"""
+    try:
+        page = _page(query, columns, descending)
+    except ValueError as e:
+        return jsonify(error=str(e)), 400
+    return jsonify(items=[item(row) for row in page],
+                   prev_cursor=page.prev_cursor, next_cursor=page.next_cursor)
+
+def _columns(rows, names):
+    """Turn a list of row tuples into a dict of parallel lists"""
+    return {name: [row[i] for row in rows] for i, name in enumerate(names)}
+
+@bp.route('/api/stats')
+@bp.route('/api/stats/<int:phase_id>')
+@read_only
+def api_stats(phase_id=None):
+    # Answer revalidation from the data versions before loading anything
+    etag = data_versions.etag(*STATS_TABLES)
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        try:
+            result_filter = ResultFilter.from_args(request.args)
+        except ValueError as e:
+            return jsonify(error=str(e)), 400
+        if phase_id is not None and db.session.get(Phase, phase_id) is None:
+            return jsonify(error=f'Phase with id {phase_id} does not exist!'), 404
+        heroes = db.session.execute(
+            sa.select(Hero.id, Hero.name, Hero.phase_id).order_by(Hero.id)).all()
+        villain_query = sa.select(Villain.id, Villain.name, Villain.phase_id).order_by(Villain.id)
+        if phase_id is not None:
+            villain_query = villain_query.where(Villain.phase_id == phase_id)
+        villains = db.session.execute(villain_query).all()
+        response = jsonify(phase_id=phase_id,
+                           heroes=_columns(heroes, ('id', 'name', 'phase_id')),
+                           villains=_columns(villains, ('id', 'name', 'phase_id')),
+                           results=ResultMatrix.load(phase_id, result_filter).as_arrays())
+    response.set_etag(etag)
+    response.cache_control.no_cache = True
+    return response
+
+def _trend():
+    """The Trend and rolling window asked for in the query string; 400 if malformed"""
+    try:
+        kwargs, window = trend_args(request.args)
+    except ValueError as e:
+        abort(400, description=str(e))
+    return Trend.load(**kwargs), window
+
+@bp.route('/stats/trends')
+@read_only
+@conditional(*TREND_TABLES, 'villain', 'aspect')
+def trends():
+    trend, window = _trend()
+    heroes = db.session.execute(sa.select(Hero.id, Hero.name).order_by(Hero.name)).all()
+    villains = db.session.execute(sa.select(Villain.id, Villain.name).order_by(Villain.name)).all()
+    return render_template('trends.html', title='Trends', trend=trend, window=window,
+                           data=trend.as_arrays(window), heroes=heroes, villains=villains)
+
+@bp.route('/api/stats/trends')
+@read_only
+def api_trends():
+    etag = data_versions.etag(*TREND_TABLES)
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        try:
+            kwargs, window = trend_args(request.args)
+        except ValueError as e:
+            return jsonify(error=str(e)), 400
+        trend = Trend.load(**kwargs)
+        response = jsonify(period=trend.period.name.lower(), window=window,
+                           subject=kwargs.get('subject'), subject_id=kwargs.get('subject_id'),
+                           buckets=trend.as_arrays(window))
+    response.set_etag(etag)
+    response.cache_control.no_cache = True
+    return response
+
+@bp.route('/api/search')
+@read_only
+def api_search():
+    kind = request.args.get('type') or None
+    if kind is not None and kind not in KINDS:
+        return jsonify(error=f'unknown type {kind!r}'), 400
+    limit = request.args.get('limit', DEFAULT_LIMIT, type=int)
+    if not 1 <= limit <= MAX_LIMIT:
+        return jsonify(error=f'limit must be between 1 and {MAX_LIMIT}'), 400
+    matches = search_index.search(request.args.get('q', ''), limit, kind)
+    return jsonify(results=[
+        {'type': k, 'id': id, 'name': name,
+         'url': url_for(f'main.single_{k}', **{f'{k}_id': id})}
+        for k, id, name in matches])
 
-@app.route('/login', methods=['GET', 'POST'])
+@bp.route('/login', methods=['GET', 'POST'])
 def login():
     if current_user.is_authenticated:
-        return redirect(url_for('index'))
+        return redirect(url_for('main.index'))
     form = LoginForm()
     if form.validate_on_submit():
         user = db.session.scalar(
             sa.select(User).where(User.username == form.username.data))
         if user is None or not user.check_password(form.password.data):
             flash('Invalid username or password')
-            return redirect(url_for('login'))
+            return redirect(url_for('main.login'))
         login_user(user, remember=form.remember_me.data)
         next_page = request.args.get('next')
         if not next_page or urlsplit(next_page).netloc != '':
-            next_page = url_for('index')
+            next_page = url_for('main.index')
         return redirect(next_page)
     return render_template('login.html', title='Sign In', form=form)
 
-@app.route('/logout')
+@bp.route('/logout')
 def logout():
     logout_user()
-    return redirect(url_for('index'))
+    return redirect(url_for('main.index'))
 
-@app.route('/villain/create', methods=['GET', 'POST'])
+@bp.route('/villain/create', methods=['GET', 'POST'])
 @login_required
 def villain_create():
     form = VillainForm()
-    #TODO: Need an actual error when no Phases are defined.
-    # Currently generates an unsubmittable form.
-    form.phase.choices = [(p.id, p.phasename) for p in Phase.query.order_by('id')]
     if form.validate_on_submit():
         v = Villain(name=form.name.data, phase_id=form.phase.data)
         db.session.add(v)
         db.session.commit()
         flash('New villain {}, from phase {}, created'.format(
             form.name.data, form.phase.data))
-        return redirect(url_for('villain'))
+        return redirect(url_for('main.villain'))
     return render_template('villain.html', form=form)
 
-@app.route('/villain')
+@bp.route('/villain')
+@read_only
+@conditional('phase', 'villain')
 def villain():
-    villains=Villain.query.order_by('phase_id').all()
-    return render_template('villain_list.html',villains=villains)
+    villains = _html_page(sa.select(Villain), VILLAIN_ORDER)
+    return render_template('villain_list.html', villains=villains)
 
-@app.route('/villain/<int:villain_id>')
+@bp.route('/api/villain')
+@read_only
+def api_villain():
+    return _json_page(sa.select(Villain), VILLAIN_ORDER,
+                      lambda v: {'id': v.id, 'name': v.name, 'phase_id': v.phase_id})
+
+@bp.route('/villain/<int:villain_id>')
+@read_only
+@conditional('phase', 'hero', 'villain', 'result')
 def single_villain(villain_id):
     v = Villain.query.filter_by(id=villain_id).first()
     if v:
-        return render_template('single_villain.html', villain=v)
+        return render_template('single_villain.html', villain=v,
+                               record=matchups('villain', v.id))
     flash(f'Villain with id {villain_id} does not exist!')
-    return redirect(url_for('index'))
+    return redirect(url_for('main.index'))
 
-@app.route('/villain/<int:villain_id>/update', methods=['GET', 'POST'])
+@bp.route('/villain/<int:villain_id>/update', methods=['GET', 'POST'])
 @login_required
 def villain_update(villain_id):
     v = Villain.query.filter_by(id=villain_id).first()
     if v:
         form = VillainForm()
-        #TODO: Need an actual error when no Phases are defined.
-        # Currently generates an unsubmittable form.
-        form.phase.choices = [(p.id, p.phasename) for p in Phase.query.order_by('id')]
         if form.validate_on_submit():
             v.name = form.name.data
             v.phase_id = form.phase.data
             db.session.commit()
             flash(f'Updated details for Villain {v.name}')
-            return redirect(url_for('villain'))
+            return redirect(url_for('main.villain'))
         elif request.method == 'GET':
             form.name.data = v.name
             form.phase.data = v.phase_id
         return render_template('villain.html', title='Villain', form=form)
     flash(f'Villain with id {villain_id} does not exist!')
-    return redirect(url_for('index'))
+    return redirect(url_for('main.index'))
 
-@app.route('/villain/<int:villain_id>/delete', methods=['GET', 'POST'])
+@bp.route('/villain/<int:villain_id>/delete', methods=['GET', 'POST'])
 @login_required
 def villain_delete(villain_id):
     v = Villain.query.filter_by(id=villain_id).first()
@@ -104,72 +266,73 @@ def villain_delete(villain_id):
             db.session.delete(v)
             db.session.commit()
             flash(f'Deleted Villain {v.name}')
-            return redirect(url_for('villain'))
+            return redirect(url_for('main.villain'))
         elif request.method == 'GET':
             pass
             # No fields to populate in the form
         return render_template('villain_delete.html', title='Villain', form=form, villain=v)
     flash(f'Villain with id {villain_id} does not exist!')
-    return redirect(url_for('index'))
+    return redirect(url_for('main.index'))
 
-@app.route('/hero/create', methods=['GET', 'POST'])
+@bp.route('/hero/create', methods=['GET', 'POST'])
 @login_required
 def hero_create():
     form = HeroForm()
-    #TODO: Need an actual error when no Phases are defined.
-    # Currently generates an unsubmittable form.
-    form.phase.choices = [(p.id, p.phasename) for p in Phase.query.order_by('id')]
-    #TODO: Ditto for Aspects.
-    form.aspect.choices = [(a.id, a.name) for a in Aspect.query.order_by('id')]
     if form.validate_on_submit():
         h = Hero(name=form.name.data, phase_id=form.phase.data, aspect_id=form.aspect.data)
         db.session.add(h)
         db.session.commit()
         flash('New hero {}, from phase {} with default aspect {}'.format(
             form.name.data, form.phase.data, form.aspect.data))
-        return redirect(url_for('hero'))
+        return redirect(url_for('main.hero'))
     return render_template('hero.html', form=form)
 
-@app.route('/hero')
+@bp.route('/hero')
+@read_only
+@conditional('phase', 'aspect', 'hero')
 def hero():
-    heroes=Hero.query.order_by('phase_id').all()
-    return render_template('hero_list.html',heroes=heroes)
+    heroes = _html_page(sa.select(Hero), HERO_ORDER)
+    return render_template('hero_list.html', heroes=heroes)
+
+@bp.route('/api/hero')
+@read_only
+def api_hero():
+    return _json_page(sa.select(Hero), HERO_ORDER,
+                      lambda h: {'id': h.id, 'name': h.name, 'phase_id': h.phase_id,
+                                 'aspect_id': h.aspect_id})
 
-@app.route('/hero/<int:hero_id>')
+@bp.route('/hero/<int:hero_id>')
+@read_only
+@conditional('phase', 'aspect', 'hero', 'villain', 'result')
 def single_hero(hero_id):
     h = Hero.query.filter_by(id=hero_id).first()
     if h:
-        return render_template('single_hero.html', hero=h)
+        return render_template('single_hero.html', hero=h, record=matchups('hero', h.id))
     flash(f'Hero with id {hero_id} does not exist!')
-    return redirect(url_for('index'))
+    return redirect(url_for('main.index'))
 
-@app.route('/hero/<int:hero_id>/update', methods=['GET', 'POST'])
+@bp.route('/hero/<int:hero_id>/update', methods=['GET', 'POST'])
 @login_required
 def hero_update(hero_id):
     h = Hero.query.filter_by(id=hero_id).first()
     if h:
         form = HeroForm()
-        #TODO: Need an actual error when no Phases are defined.
-        # Currently generates an unsubmittable form.
-        form.phase.choices = [(p.id, p.phasename) for p in Phase.query.order_by('id')]
-        #TODO: Ditto for Aspects.
-        form.aspect.choices = [(a.id, a.name) for a in Aspect.query.order_by('id')]
         if form.validate_on_submit():
             h.name = form.name.data
             h.phase_id = form.phase.data
             h.aspect_id = form.aspect.data
             db.session.commit()
             flash(f'Updated details for Hero {h.name}')
-            return redirect(url_for('hero'))
+            return redirect(url_for('main.hero'))
         elif request.method == 'GET':
             form.name.data = h.name
             form.phase.data = h.phase_id
             form.aspect.data = h.aspect_id
         return render_template('hero.html', title='Hero', form=form)
     flash(f'Hero with id {hero_id} does not exist!')
-    return redirect(url_for('index'))
+    return redirect(url_for('main.index'))
 
-@app.route('/hero/<int:hero_id>/delete', methods=['GET', 'POST'])
+@bp.route('/hero/<int:hero_id>/delete', methods=['GET', 'POST'])
 @login_required
 def hero_delete(hero_id):
     h = Hero.query.filter_by(id=hero_id).first()
@@ -179,17 +342,85 @@ def hero_delete(hero_id):
             db.session.delete(h)
             db.session.commit()
             flash(f'Deleted Hero {h.name}')
-            return redirect(url_for('hero'))
+            return redirect(url_for('main.hero'))
         elif request.method == 'GET':
             pass
             # No fields to populate in the form
         return render_template('hero_delete.html', title='Hero', form=form, hero=h)
     flash(f'Hero with id {hero_id} does not exist!')
-    return redirect(url_for('index'))
+    return redirect(url_for('main.index'))
+
+def _results_query(result_filter):
+    """Results matching result_filter, with their hero and villain"""
+    return sa.select(Result).where(*result_filter.conditions()).\
+        options(so.joinedload(Result.hero), so.joinedload(Result.villain))
+
+@bp.route('/results')
+@read_only
+@conditional('aspect', 'hero', 'villain', 'result')
+def results():
+    result_filter = _result_filter()
+    page = _html_page(_results_query(result_filter), RESULT_ORDER, descending=True)
+    return render_template('results.html', title='Results', results=page,
+                           result_filter=result_filter, difficulties=Difficulty)
+
+@bp.route('/api/results')
+@read_only
+def api_results():
+    try:
+        result_filter = ResultFilter.from_args(request.args)
+    except ValueError as e:
+        return jsonify(error=str(e)), 400
+    return _json_page(_results_query(result_filter), RESULT_ORDER, export_dict,
+                      descending=True)
+
+@bp.route('/api/csrf-token')
+@login_required
+def api_csrf_token():
+    """Token for API clients to send as X-CSRFToken with their POSTs"""
+    response = jsonify(csrf_token=generate_csrf())
+    response.cache_control.no_store = True
+    response.cache_control.private = True
+    return response
+
+@bp.route('/results/bulk', methods=['POST'])
+@login_required
+def results_bulk():
+    fmt = request.args.get('format')
+    if fmt is None:
+        fmt = 'jsonl' if request.mimetype in ('application/json', 'application/jsonl',
+                                               'application/x-ndjson') else 'csv'
+    if fmt not in FORMATS:
+        return jsonify(error=f'Unknown format {fmt}'), 400
+    upload = request.files.get('file')
+    if upload:
+        lines = decode_lines(upload.stream)
+    else:
+        lines = decode_lines(request.get_data().splitlines(keepends=True))
+    report = import_results(lines, fmt)
+    return jsonify(report.as_dict())
+
+@bp.route('/results/export.csv')
+@read_only
+def results_export_csv():
+    return Response(stream_with_context(export_csv(export_rows())),
+                    mimetype='text/csv',
+                    headers={'Content-Disposition': 'attachment; filename=results.csv'})
+
+@bp.route('/results/export.jsonl')
+@read_only
+def results_export_jsonl():
+    return Response(stream_with_context(export_jsonl(export_rows())),
+                    mimetype='application/x-ndjson',
+                    headers={'Content-Disposition': 'attachment; filename=results.jsonl'})
+
+@bp.route('/metrics')
+def metrics():
+    return Response(registry.render(), mimetype='text/plain; version=0.0.4')
 
-@app.route('/forcederror', methods=['GET'])
+@bp.route('/forcederror', methods=['GET'])
 def forcederror():
     a = Aspect()
     db.session.add(a)
     db.session.commit()
-    return redirect(url_for('index'))
+    return redirect(url_for('main.index'))
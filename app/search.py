@@ -0,0 +1,151 @@
+"""Prefix search over hero and villain names, for autocomplete"""
+from bisect import bisect_left, insort
+import threading
+import sqlalchemy as sa
+from flask import current_app
+from werkzeug.local import LocalProxy
+from app import db
+from app.models import Hero, Villain
+from app.versions import data_versions
+
+# Model for each kind of name in the index
+KINDS = {'hero': Hero, 'villain': Villain}
+DEFAULT_LIMIT = 10
+MAX_LIMIT = 50
+
+def normalise(text):
+    return ' '.join(text.casefold().split())
+
+class SearchIndex:
+    """
+    Sorted list of (normalised text, kind, id) entries, searched by bisecting
+    to the first entry at or after a prefix.
+
+    Every word of a name starts an entry, so 'bob' finds 'Big Bad Bob' as
+    well as 'Bob's Revenge'.  The index is loaded from the database on first
+    use and then kept current from this process's commits' flushed changes,
+    without going back to the database.  It remembers the hero and villain
+    data versions it reflects, and loads afresh when they don't match, as
+    after a write by another process or a bulk statement.
+    """
+    def __init__(self):
+        self.entries = None
+        self.names = {}
+        self.versions = None
+        self._lock = threading.Lock()
+
+    def _entries(self, name):
+        words = normalise(name).split(' ')
+        return [' '.join(words[i:]) for i in range(len(words))]
+
+    def _add(self, kind, id, name):
+        self.names[kind, id] = name
+        for text in self._entries(name):
+            insort(self.entries, (text, kind, id))
+
+    def _remove(self, kind, id):
+        name = self.names.pop((kind, id), None)
+        if name is not None:
+            for text in self._entries(name):
+                i = bisect_left(self.entries, (text, kind, id))
+                if i < len(self.entries) and self.entries[i] == (text, kind, id):
+                    del self.entries[i]
+
+    def _load(self, versions):
+        self.entries = []
+        self.names = {}
+        self.versions = versions
+        for kind, model in KINDS.items():
+            for id, name in db.session.execute(sa.select(model.id, model.name)):
+                self.names[kind, id] = name
+                self.entries.extend((text, kind, id) for text in self._entries(name))
+        self.entries.sort()
+
+    def search(self, prefix, limit=DEFAULT_LIMIT, kind=None):
+        """
+        Up to limit (kind, id, name) matches for prefix, of the given kind if
+        any, those whose full name matches first and then in name order
+        """
+        prefix = normalise(prefix)
+        if not prefix:
+            return []
+        versions = data_versions.versions(*KINDS)
+        with self._lock:
+            if self.entries is None or self.versions != versions:
+                self._load(versions)
+            i = bisect_left(self.entries, (prefix,))
+            matches = {}
+            while i < len(self.entries) and self.entries[i][0].startswith(prefix):
+                _, k, id = self.entries[i]
+                if kind in (None, k):
+                    text = normalise(self.names[k, id])
+                    key = (not text.startswith(prefix), text, k, id)
+                    matches[k, id] = min(matches.get((k, id), key), key)
+                i += 1
+            found = sorted(matches.values())[:limit]
+            return [(k, id, self.names[k, id]) for _, _, k, id in found]
+
+    def apply(self, changes):
+        """Bring the index up to date with {(kind, id): name, or None if deleted}"""
+        with self._lock:
+            if self.entries is None:
+                return
+            for (kind, id), name in changes.items():
+                self._remove(kind, id)
+                if name is not None:
+                    self._add(kind, id, name)
+            # The commit bumped the version of each kind it changed once
+            for kind in {kind for kind, _ in changes}:
+                self.versions[kind] += 1
+
+    def clear(self):
+        with self._lock:
+            self.entries = None
+            self.names = {}
+            self.versions = None
+
+def init_app(app):
+    app.extensions['search'] = SearchIndex()
+
+# The current app's SearchIndex
+search_index = LocalProxy(lambda: current_app.extensions['search'])
+
+def _kind(obj):
+    for kind, model in KINDS.items():
+        if isinstance(obj, model):
+            return kind
+    return None
+
+@sa.event.listens_for(db.session, 'after_flush')
+def _track_names(session, flush_context):
+    changes = session.info.setdefault('search_changes', {})
+    for obj in (*session.new, *session.dirty):
+        kind = _kind(obj)
+        # Skipping unchanged objects, as the version tracking does
+        if kind is not None and (obj in session.new or session.is_modified(obj)):
+            changes[kind, obj.id] = obj.name
+    for obj in session.deleted:
+        kind = _kind(obj)
+        if kind is not None:
+            changes[kind, obj.id] = None
+
+@sa.event.listens_for(db.session, 'do_orm_execute')
+def _track_bulk(orm_execute_state):
+    mapper = orm_execute_state.bind_mapper
+    if mapper is not None and mapper.class_ in KINDS.values() and \
+            (orm_execute_state.is_insert or orm_execute_state.is_update or
+             orm_execute_state.is_delete):
+        orm_execute_state.session.info['search_stale'] = True
+
+@sa.event.listens_for(db.session, 'after_commit')
+def _update_index(session):
+    changes = session.info.pop('search_changes', None)
+    if session.info.pop('search_stale', False):
+        search_index.clear()
+    elif changes:
+        search_index.apply(changes)
+
+@sa.event.listens_for(db.session, 'after_rollback')
+def _forget_changes(session):
+    session.info.pop('search_changes', None)
+    session.info.pop('search_stale', None)
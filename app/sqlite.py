@@ -0,0 +1,45 @@
+"""Per-connection pragmas for running on a SQLite file database"""
+import sqlalchemy as sa
+from app import db
+
+def pragmas(settings):
+    """The (pragma, value) pairs applied to each new connection"""
+    return [
+        # Readers no longer block the writer, nor it them
+        ('journal_mode', 'WAL'),
+        # Safe with WAL; only the last commits can be lost on power failure
+        ('synchronous', 'NORMAL'),
+        ('busy_timeout', settings['SQLITE_BUSY_TIMEOUT_MS']),
+        # Negative sizes are in KiB rather than pages
+        ('cache_size', -settings['SQLITE_CACHE_SIZE_KB']),
+        ('mmap_size', settings['SQLITE_MMAP_SIZE']),
+        ('temp_store', 'MEMORY'),
+    ]
+
+def init_app(app):
+    """
+    Apply the tuning pragmas to every new connection to a SQLite database,
+    when SQLITE_TUNING is on.  The setting is read as each connection is
+    opened, so it can be switched on an existing engine with dispose().
+    """
+    settings = app.config
+
+    def set_pragmas(dbapi_connection, connection_record):
+        if not settings['SQLITE_TUNING']:
+            return
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas(settings):
+            cursor.execute(f'PRAGMA {name}={value}')
+        cursor.close()
+
+    with app.app_context():
+        engines = list(db.engines.values())
+    if 'replica' in app.extensions:
+        engines.append(app.extensions['replica'])
+    for engine in engines:
+        if engine.dialect.name == 'sqlite':
+            sa.event.listen(engine, 'connect', set_pragmas)
+
+def journal_mode():
+    """The journal mode of the current app's database"""
+    return db.session.execute(sa.text('PRAGMA journal_mode')).scalar()
@@ -0,0 +1,396 @@
+"""Aggregated statistics over recorded Results"""
+from collections import namedtuple
+from datetime import date, datetime, time, timedelta
+import sys
+import sqlalchemy as sa
+import sqlalchemy.orm as so
+from flask import render_template
+from app import db
+from app.cache import AppLRUCache
+from app.models import HeroVillainSummary, Phase, Hero, Result, ResultTypes, Villain, \
+    Difficulty, parse_key
+from app.metrics import observe
+from app.engine import wilson_interval
+from app.versions import data_versions, mark_changed, on_change
+
+# Tables whose changes invalidate anything derived from the results matrix
+STATS_TABLES = ('phase', 'aspect', 'hero', 'villain', 'result')
+# Changes to these show up in every phase's stats tab.  'phase:*' is marked
+# when results or villains change in a way we can't pin to one phase.
+SHARED_PHASE_KEYS = ('phase', 'aspect', 'hero', 'phase:*')
+
+class ResultFilter:
+    """
+    Which Results count towards the stats: played between since and until
+    (dates, inclusive), at a difficulty, with an aspect, or by a player.
+    Unset fields don't restrict anything; an empty filter matches all.
+    """
+    # Query string argument for each field
+    ARGS = {'since': 'since', 'until': 'until', 'difficulty': 'difficulty',
+            'aspect_id': 'aspect', 'player': 'player'}
+
+    def __init__(self, since=None, until=None, difficulty=None, aspect_id=None, player=None):
+        self.since = since
+        self.until = until
+        self.difficulty = difficulty
+        self.aspect_id = aspect_id
+        self.player = player
+
+    @classmethod
+    def from_args(cls, args):
+        """Build from request.args; raises ValueError for a malformed value"""
+        values = {field: args.get(arg, '').strip() or None for field, arg in cls.ARGS.items()}
+        for field in ('since', 'until'):
+            if values[field] is not None:
+                values[field] = date.fromisoformat(values[field])
+        if values['difficulty'] is not None:
+            name = values['difficulty'].upper()
+            if name not in Difficulty.__members__:
+                raise ValueError(f'unknown difficulty {values["difficulty"]!r}')
+            values['difficulty'] = Difficulty[name]
+        if values['aspect_id'] is not None:
+            values['aspect_id'] = parse_key(values['aspect_id'])
+        return cls(**values)
+
+    def __bool__(self):
+        return any(v is not None for v in self.key())
+
+    def key(self):
+        """Hashable form, for cache keys"""
+        return tuple(getattr(self, field) for field in self.ARGS)
+
+    def args(self):
+        """Query string arguments that reproduce this filter"""
+        args = {}
+        for field, arg in self.ARGS.items():
+            value = getattr(self, field)
+            if value is not None:
+                args[arg] = value.name if isinstance(value, Difficulty) else str(value)
+        return args
+
+    def conditions(self):
+        """WHERE clauses on Result"""
+        clauses = []
+        if self.since is not None:
+            clauses.append(Result.played_at >= datetime.combine(self.since, time.min))
+        if self.until is not None:
+            clauses.append(Result.played_at < datetime.combine(self.until + timedelta(days=1),
+                                                               time.min))
+        if self.difficulty is not None:
+            clauses.append(Result.difficulty == self.difficulty)
+        if self.aspect_id is not None:
+            clauses.append(Result.aspect_id == self.aspect_id)
+        if self.player is not None:
+            clauses.append(Result.player == self.player)
+        return clauses
+
+class ResultMatrix:
+    """
+    Hero x Villain results, loaded with a single query
+
+    Cells are keyed by (hero_id, villain_id) and hold (wins, losses) counts,
+    so rendering a stats table never goes back to the ORM per cell.
+    """
+    def __init__(self, cells=None):
+        self.cells = cells or {}
+
+    @classmethod
+    def load(cls, phase_id=None, result_filter=None):
+        """
+        Load every (hero_id, villain_id) pairing from the summary table.
+        If phase_id is given, only villains from that phase are included.
+        A non-empty ResultFilter counts the matching Results instead.
+        """
+        if result_filter:
+            return cls._load_filtered(phase_id, result_filter)
+        query = sa.select(HeroVillainSummary.hero_id, HeroVillainSummary.villain_id,
+                          HeroVillainSummary.wins, HeroVillainSummary.losses)
+        if phase_id is not None:
+            query = query.join(Villain, HeroVillainSummary.villain_id == Villain.id).\
+                where(Villain.phase_id == phase_id)
+        return cls({(h, v): (w, l) for h, v, w, l in db.session.execute(query)})
+
+    @classmethod
+    def _load_filtered(cls, phase_id, result_filter):
+        # Grouped in pairing order, so a date or difficulty filter's counts
+        # come off scanning ix_result_pairing in one pass, and an aspect or
+        # player filter's off searching ix_result_aspect_pairing or
+        # ix_result_player_pairing; both together read the table for the second
+        query = sa.select(Result.villain_id, Result.hero_id, Result.result, sa.func.count()).\
+            where(*result_filter.conditions()).\
+            group_by(Result.villain_id, Result.hero_id, Result.result)
+        if phase_id is not None:
+            query = query.where(Result.villain_id.in_(
+                sa.select(Villain.id).where(Villain.phase_id == phase_id)))
+        cells = {}
+        for villain_id, hero_id, result, count in db.session.execute(query):
+            wins, losses = cells.get((hero_id, villain_id), (0, 0))
+            if result == ResultTypes.WIN:
+                wins += count
+            else:
+                losses += count
+            cells[(hero_id, villain_id)] = (wins, losses)
+        return cls(cells)
+
+    def __len__(self):
+        return len(self.cells)
+
+    def nbytes(self):
+        """Approximate memory held by the cells: the dict, keys and counts"""
+        return sys.getsizeof(self.cells) + sum(
+            sys.getsizeof(k) + sys.getsizeof(v) for k, v in self.cells.items())
+
+    def counts(self, hero_id, villain_id):
+        """(wins, losses) for the pairing, (0, 0) if never played"""
+        return self.cells.get((hero_id, villain_id), (0, 0))
+
+    def result(self, hero_id, villain_id):
+        """
+        Headline result for the pairing: a WIN if the hero has ever beaten
+        the villain, a LOSS if they've only lost, None if never played
+        """
+        wins, losses = self.counts(hero_id, villain_id)
+        if wins:
+            return ResultTypes.WIN
+        if losses:
+            return ResultTypes.LOSS
+        return None
+
+    def as_arrays(self):
+        """Played pairings as parallel lists, ordered by (hero_id, villain_id)"""
+        keys = sorted(self.cells)
+        return {'hero_id': [h for h, v in keys],
+                'villain_id': [v for h, v in keys],
+                'wins': [self.cells[k][0] for k in keys],
+                'losses': [self.cells[k][1] for k in keys]}
+
+    def as_cell(self, hero_id, villain_id):
+        r = self.result(hero_id, villain_id)
+        if r is None:
+            return "<td></td>"
+        return r.as_cell()
+
+
+def phase_key(phase_id):
+    """Version key covering the villains and results of one phase"""
+    return f'phase:{phase_id}'
+
+def phase_version(phase_id):
+    return data_versions.version(*SHARED_PHASE_KEYS, phase_key(phase_id))
+
+@sa.event.listens_for(db.session, 'after_flush')
+def _track_phase_changes(session, flush_context):
+    phase_ids = set()
+    villain_ids = set()
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(obj, Villain):
+            phase_ids.add(obj.phase_id)
+            phase_ids.update(so.attributes.get_history(obj, 'phase_id').deleted)
+        elif isinstance(obj, Result):
+            villain_ids.add(obj.villain_id)
+            villain_ids.update(so.attributes.get_history(obj, 'villain_id').deleted)
+    villain_ids.discard(None)
+    if villain_ids:
+        phase_ids.update(session.connection().execute(
+            sa.select(Villain.phase_id).where(Villain.id.in_(villain_ids))).scalars())
+    phase_ids.discard(None)
+    mark_changed(session, *(phase_key(p) for p in phase_ids))
+
+@sa.event.listens_for(db.session, 'do_orm_execute')
+def _track_bulk_phase_changes(orm_execute_state):
+    mapper = orm_execute_state.bind_mapper
+    if mapper is not None and mapper.class_ in (Result, Villain) and \
+            (orm_execute_state.is_insert or orm_execute_state.is_update or
+             orm_execute_state.is_delete):
+        mark_changed(orm_execute_state.session, 'phase:*')
+
+# Rendered HTML of each phase's stats tab, keyed by
+# (phase_id, phase_version, result filter key)
+phase_fragments = AppLRUCache('phase_fragments', 'STATS_FRAGMENT_CACHE_SIZE')
+
+@on_change
+def _evict_phase_fragments(changed):
+    if changed.intersection(SHARED_PHASE_KEYS):
+        phase_fragments.evict(lambda key: True)
+    else:
+        stale = {key for key in changed if key.startswith('phase:')}
+        phase_fragments.evict(lambda key: phase_key(key[0]) in stale)
+
+def _load_rosters(phases):
+    """
+    Fill in the villains and heroes of already-loaded phases, in two
+    queries, for the tab template to walk
+    """
+    ids = [p.id for p in phases]
+    villains = db.session.scalars(sa.select(Villain).where(Villain.phase_id.in_(ids))).all()
+    heroes = db.session.scalars(sa.select(Hero).where(Hero.phase_id.in_(ids))).all()
+    by_phase = {id: ([], []) for id in ids}
+    for v in villains:
+        by_phase[v.phase_id][0].append(v)
+    for h in heroes:
+        by_phase[h.phase_id][1].append(h)
+    for phase in phases:
+        so.attributes.set_committed_value(phase, 'villains', by_phase[phase.id][0])
+        so.attributes.set_committed_value(phase, 'heroes', by_phase[phase.id][1])
+
+class StatsService:
+    """
+    What the stats pages show for one scope: the phases, and hero x villain
+    counts for the Results matching result_filter.  Only aggregated counts
+    are loaded, never Result rows, and only when a tab has to be rendered;
+    a single tab loads just its own phase's counts.  The approximate size
+    of what was loaded is reported to the request metrics as stats_bytes.
+    """
+    def __init__(self, result_filter=None):
+        self.result_filter = result_filter or ResultFilter()
+        self._phases = None
+        self.matrix = None
+
+    @property
+    def phases(self):
+        """Every phase, in id order"""
+        if self._phases is None:
+            self._phases = db.session.scalars(sa.select(Phase).order_by(Phase.id)).all()
+        return self._phases
+
+    def phase(self, phase_id):
+        return next((p for p in self.phases if p.id == phase_id), None)
+
+    def _load(self, tab_phases):
+        phase_id = tab_phases[0].id if len(tab_phases) == 1 else None
+        self.matrix = ResultMatrix.load(phase_id, self.result_filter)
+        _load_rosters(self.phases)
+        observe('stats_bytes', self.nbytes())
+
+    def nbytes(self):
+        """Approximate memory held by the loaded counts"""
+        return 0 if self.matrix is None else self.matrix.nbytes()
+
+    def tabs(self, tab_phases=None):
+        """
+        Rendered stats tab for each of tab_phases (default all phases), by
+        phase id.  Tabs are served from phase_fragments while current.
+        """
+        tab_phases = self.phases if tab_phases is None else tab_phases
+        tabs = {}
+        # Look up every tab's version in one go; phase_version then reuses them
+        data_versions.versions(*SHARED_PHASE_KEYS, *(phase_key(p.id) for p in tab_phases))
+        for phase in tab_phases:
+            key = (phase.id, phase_version(phase.id), self.result_filter.key())
+            html = phase_fragments.get(key)
+            if html is None:
+                if self.matrix is None:
+                    self._load(tab_phases)
+                html = render_template('phase_stats.html', phase=phase,
+                                       phases=self.phases, matrix=self.matrix)
+                phase_fragments.set(key, html)
+            tabs[phase.id] = html
+        return tabs
+
+
+# Record against one opponent, from the hero's or villain's own point of view
+Matchup = namedtuple('Matchup', 'id name wins losses low high')
+
+def matchup_key(kind, id):
+    """Version key covering the results of one hero or villain"""
+    return f'{kind}:{id}'
+
+@sa.event.listens_for(db.session, 'after_flush')
+def _track_matchup_changes(session, flush_context):
+    keys = set()
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(obj, Result):
+            for kind in ('hero', 'villain'):
+                ids = {getattr(obj, f'{kind}_id'),
+                       *so.attributes.get_history(obj, f'{kind}_id').deleted}
+                keys.update(matchup_key(kind, id) for id in ids if id is not None)
+    mark_changed(session, *keys)
+
+@sa.event.listens_for(db.session, 'do_orm_execute')
+def _track_bulk_matchup_changes(orm_execute_state):
+    mapper = orm_execute_state.bind_mapper
+    if mapper is not None and mapper.class_ is Result and \
+            (orm_execute_state.is_insert or orm_execute_state.is_update or
+             orm_execute_state.is_delete):
+        mark_changed(orm_execute_state.session, 'matchups:*')
+
+# Changes to these can show up on any hero's or villain's matchups
+SHARED_MATCHUP_KEYS = ('hero', 'villain', 'matchups:*')
+
+class MatchupRecord:
+    """
+    A hero's or villain's wins and losses against each opponent it has
+    played, read from the hero vs villain summaries in one query
+    """
+    def __init__(self, matchups):
+        self.matchups = list(matchups)
+        self.wins = sum(m.wins for m in self.matchups)
+        self.losses = sum(m.losses for m in self.matchups)
+
+    @classmethod
+    def _from_rows(cls, rows):
+        rows = list(rows)
+        wins = [r[2] for r in rows]
+        plays = [r[2] + r[3] for r in rows]
+        low, high = wilson_interval(wins, plays)
+        return cls(Matchup(*row, float(lo), float(hi)) for row, lo, hi in zip(rows, low, high))
+
+    @classmethod
+    def for_hero(cls, hero_id):
+        rows = db.session.execute(
+            sa.select(Villain.id, Villain.name, HeroVillainSummary.wins,
+                      HeroVillainSummary.losses).
+            join(Villain, HeroVillainSummary.villain_id == Villain.id).
+            where(HeroVillainSummary.hero_id == hero_id).
+            order_by(Villain.name))
+        return cls._from_rows(rows)
+
+    @classmethod
+    def for_villain(cls, villain_id):
+        # A hero's loss is the villain's win
+        rows = db.session.execute(
+            sa.select(Hero.id, Hero.name, HeroVillainSummary.losses,
+                      HeroVillainSummary.wins).
+            join(Hero, HeroVillainSummary.hero_id == Hero.id).
+            where(HeroVillainSummary.villain_id == villain_id).
+            order_by(Hero.name))
+        return cls._from_rows(rows)
+
+    @property
+    def plays(self):
+        return self.wins + self.losses
+
+    @property
+    def rate(self):
+        return self.wins / self.plays if self.plays else None
+
+    def best(self):
+        """
+        Strongest matchup, ranked on the lower Wilson bound so a single win
+        doesn't beat a long winning record
+        """
+        return max(self.matchups, key=lambda m: (m.low, -m.id), default=None)
+
+    def worst(self):
+        """Weakest matchup, ranked on the upper Wilson bound"""
+        return min(self.matchups, key=lambda m: (m.high, m.id), default=None)
+
+# MatchupRecords, keyed by (kind, id, version)
+matchup_records = AppLRUCache('matchup_records', 'MATCHUP_CACHE_SIZE')
+
+def matchups(kind, id):
+    """Cached MatchupRecord for a 'hero' or 'villain', current as of the last commit"""
+    key = (kind, id, data_versions.version(*SHARED_MATCHUP_KEYS, matchup_key(kind, id)))
+    record = matchup_records.get(key)
+    if record is None:
+        load = MatchupRecord.for_hero if kind == 'hero' else MatchupRecord.for_villain
+        record = load(id)
+        matchup_records.set(key, record)
+    return record
+
+@on_change
+def _evict_matchup_records(changed):
+    if changed.intersection(SHARED_MATCHUP_KEYS):
+        matchup_records.evict(lambda key: True)
+    else:
+        matchup_records.evict(lambda key: matchup_key(key[0], key[1]) in changed)
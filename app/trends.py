@@ -0,0 +1,109 @@
+"""Win rates over time, read from the day and week result rollups"""
+from datetime import date
+import sqlalchemy as sa
+from app import db
+from app.models import ResultRollup, RollupPeriod, parse_key
+
+# Rollup column for each thing a trend can follow, by query string argument
+SUBJECTS = {'hero': ResultRollup.hero_id, 'villain': ResultRollup.villain_id,
+            'aspect': ResultRollup.aspect_id}
+DEFAULT_WINDOW = 4
+MAX_WINDOW = 52
+# Tables whose changes can change a trend: rollups are rebuilt from results,
+# falling back to the hero's default aspect
+TREND_TABLES = ('result', 'hero')
+
+class Trend:
+    """
+    Wins and losses per bucket, from the first bucket with games to the
+    last.  Buckets with no games are filled in, so a rolling window always
+    spans the same length of time.
+    """
+    def __init__(self, period, buckets):
+        self.period = period
+        self.starts = []
+        self.wins = []
+        self.losses = []
+        for start, wins, losses in buckets:
+            while self.starts and self.starts[-1] + period.length < start:
+                self._append(self.starts[-1] + period.length, 0, 0)
+            self._append(start, wins, losses)
+
+    def _append(self, start, wins, losses):
+        self.starts.append(start)
+        self.wins.append(wins)
+        self.losses.append(losses)
+
+    @classmethod
+    def load(cls, period=RollupPeriod.WEEK, subject=None, subject_id=None,
+             since=None, until=None):
+        """
+        Sum the rollups per bucket, for one hero, villain or aspect if
+        subject (a key of SUBJECTS) and subject_id are given, and for
+        buckets starting between since and until (inclusive) if given
+        """
+        query = sa.select(ResultRollup.period_start, sa.func.sum(ResultRollup.wins),
+                          sa.func.sum(ResultRollup.losses)).\
+            where(ResultRollup.period == period).\
+            group_by(ResultRollup.period_start).\
+            order_by(ResultRollup.period_start)
+        if subject is not None:
+            query = query.where(SUBJECTS[subject] == subject_id)
+        if since is not None:
+            query = query.where(ResultRollup.period_start >= period.start(since))
+        if until is not None:
+            query = query.where(ResultRollup.period_start <= until)
+        return cls(period, db.session.execute(query))
+
+    def __len__(self):
+        return len(self.starts)
+
+    def rates(self):
+        """Win rate in each bucket, None where nothing was played"""
+        return [w / (w + l) if w + l else None for w, l in zip(self.wins, self.losses)]
+
+    def rolling_rates(self, window):
+        """
+        Win rate over each bucket and the window - 1 before it, None where
+        nothing was played in that span
+        """
+        rates = []
+        wins = plays = 0
+        for i, (w, l) in enumerate(zip(self.wins, self.losses)):
+            wins += w
+            plays += w + l
+            if i >= window:
+                wins -= self.wins[i - window]
+                plays -= self.wins[i - window] + self.losses[i - window]
+            rates.append(wins / plays if plays else None)
+        return rates
+
+    def as_arrays(self, window):
+        """Buckets as parallel lists, oldest first"""
+        return {'start': [s.isoformat() for s in self.starts],
+                'wins': self.wins, 'losses': self.losses,
+                'rate': self.rates(), 'rolling_rate': self.rolling_rates(window)}
+
+def trend_args(args):
+    """
+    Trend.load() keyword arguments and the rolling window, from request.args:
+    period (day or week), one of hero / villain / aspect, since, until and
+    window.  Raises ValueError for a malformed or out of range value.
+    """
+    period = args.get('period', 'week').upper()
+    if period not in RollupPeriod.__members__:
+        raise ValueError(f'period must be day or week, not {args["period"]!r}')
+    kwargs = {'period': RollupPeriod[period]}
+    given = [s for s in SUBJECTS if args.get(s)]
+    if len(given) > 1:
+        raise ValueError(f'give at most one of {", ".join(SUBJECTS)}')
+    if given:
+        kwargs['subject'] = given[0]
+        kwargs['subject_id'] = parse_key(args[given[0]])
+    for name in ('since', 'until'):
+        if args.get(name):
+            kwargs[name] = date.fromisoformat(args[name])
+    window = int(args.get('window') or DEFAULT_WINDOW)
+    if not 1 <= window <= MAX_WINDOW:
+        raise ValueError(f'window must be between 1 and {MAX_WINDOW}')
+    return kwargs, window
@@ -0,0 +1,193 @@
+"""Data version counters, kept in the database and bumped whenever a table is written"""
+import sqlalchemy as sa
+from sqlalchemy.dialects import mysql, postgresql, sqlite
+import sqlalchemy.orm as so
+from flask import current_app, g, has_request_context
+from werkzeug.local import LocalProxy
+from app import db
+
+class DataVersion(db.Model):
+    """How many commits have changed the data behind a version key"""
+    __tablename__ = 'data_version'
+    name: so.Mapped[str] = so.mapped_column(sa.String(64), primary_key=True)
+    version: so.Mapped[int] = so.mapped_column(sa.BigInteger, default=0)
+
+    def __repr__(self):
+        return f'<DataVersion {self.name} {self.version}>'
+
+# Version key bumped to invalidate every ETag issued so far
+EPOCH = 'epoch'
+
+# Dialects whose INSERT supports an upsert, by name
+_UPSERTS = {'mysql': mysql.insert, 'mariadb': mysql.insert,
+            'postgresql': postgresql.insert, 'sqlite': sqlite.insert}
+
+class DataVersions:
+    """
+    Per-table change counters.
+
+    A table's counter goes up on every commit that inserted, updated or
+    deleted rows in it.  Finer-grained keys (e.g. 'phase:3') can be added to
+    a session's changes with mark_changed().  The counters live in the
+    data_version table and are bumped in the same transaction as the write,
+    so every worker and CLI command sees the same values, and callers can
+    tell whether data they derived earlier is still current with one
+    primary key lookup.  Versions read during a request are remembered for
+    the rest of it.  ETags are built from the versions alone, so every
+    worker issues the same one for the same data; the EPOCH key is bumped
+    ('flask stats new-epoch') to retire them all, e.g. after a deploy
+    changes the pages.
+    """
+    def __init__(self, listeners=None, request_keys=None):
+        self._listeners = [] if listeners is None else listeners
+        self._request_keys = [] if request_keys is None else request_keys
+
+    def versions(self, *names):
+        """Version of each of names, by name; 0 for a key never changed"""
+        in_request = has_request_context()
+        known = g.setdefault('_data_versions', {}) if in_request else {}
+        missing = [name for name in names if name not in known]
+        if missing:
+            table = DataVersion.__table__
+            where = table.c.name.in_(missing)
+            if not known:
+                # Most pages look at several tables, and at the keys the
+                # request_keys functions expect; read them all at once
+                if in_request:
+                    missing += [name for fn in self._request_keys for name in fn()
+                                if name not in missing]
+                where = sa.or_(table.c.name.in_(missing), table.c.name.not_like('%:%'),
+                               table.c.name.like('%:*'))
+            known.update(dict.fromkeys(missing, 0))
+            known.update(db.session.execute(sa.select(table.c.name, table.c.version).
+                                            where(where)).all())
+        return {name: known[name] for name in names}
+
+    def version(self, *names):
+        """Combined version of the given keys; changes when any of them does"""
+        return sum(self.versions(*names).values())
+
+    def etag(self, *names):
+        versions = self.versions(EPOCH, *names)
+        return f'{versions.pop(EPOCH)}-{sum(versions.values())}'
+
+    def forget(self):
+        """Drop the versions remembered for this request"""
+        if has_request_context():
+            g.pop('_data_versions', None)
+
+    def notify(self, names):
+        """Tell the on_change listeners this process committed changes to names"""
+        self.forget()
+        for fn in self._listeners:
+            fn(names)
+
+def upsert_add(connection, table, rows, add, replace=()):
+    """
+    Insert rows into table, or where a row's primary key is already there,
+    add its add columns to the existing row's and overwrite its replace
+    columns, as one atomic statement where the dialect has an upsert.
+    Rows must share their keys, and hold one entry per primary key.
+    """
+    if not rows:
+        return
+    key = [column.name for column in table.primary_key]
+    # In a fixed order, so concurrent writers take the row locks in the same order
+    rows = sorted(rows, key=lambda row: tuple(str(row[k]) for k in key))
+    insert = _UPSERTS.get(connection.dialect.name)
+    if insert is None:
+        for row in rows:
+            values = {c: table.c[c] + row[c] for c in add}
+            values.update((c, row[c]) for c in replace)
+            where = [table.c[k] == row[k] for k in key]
+            if not connection.execute(table.update().where(*where).values(values)).rowcount:
+                connection.execute(table.insert().values(row))
+        return
+    stmt = insert(table).values(rows)
+    if connection.dialect.name in ('mysql', 'mariadb'):
+        values = {c: table.c[c] + stmt.inserted[c] for c in add}
+        values.update((c, stmt.inserted[c]) for c in replace)
+        stmt = stmt.on_duplicate_key_update(values)
+    else:
+        values = {c: table.c[c] + stmt.excluded[c] for c in add}
+        values.update((c, stmt.excluded[c]) for c in replace)
+        stmt = stmt.on_conflict_do_update(index_elements=key, set_=values)
+    connection.execute(stmt)
+
+def bump_versions(connection, names):
+    """Add one to the version of each of names, in connection's transaction"""
+    upsert_add(connection, DataVersion.__table__,
+               [{'name': name, 'version': 1} for name in names], add=('version',))
+
+# Called, inside the app context, with the changed keys after every commit
+_listeners = []
+
+def on_change(fn):
+    """Register fn to be called with the set of changed keys after each commit"""
+    _listeners.append(fn)
+    return fn
+
+# Called, inside a request, for extra keys to read with its first versions
+_request_keys = []
+
+def request_keys(fn):
+    """Register fn to name keys the current request will probably look up"""
+    _request_keys.append(fn)
+    return fn
+
+def init_app(app):
+    app.extensions['data_versions'] = DataVersions(_listeners, _request_keys)
+    app.before_request(_forget_versions)
+
+# The current app's DataVersions
+data_versions = LocalProxy(lambda: current_app.extensions['data_versions'])
+
+def _forget_versions():
+    # Test clients and CLI commands can share one app context across requests
+    data_versions.forget()
+
+def _changed_tables(session):
+    return session.info.setdefault('changed_tables', set())
+
+def mark_changed(session, *keys):
+    """Record extra version keys to bump when session next commits"""
+    _changed_tables(session).update(keys)
+
+@sa.event.listens_for(db.session, 'after_flush')
+def _track_flush(session, flush_context):
+    changed = _changed_tables(session)
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if obj in session.dirty and not session.is_modified(obj):
+            continue
+        changed.add(sa.inspect(obj).mapper.local_table.name)
+
+@sa.event.listens_for(db.session, 'do_orm_execute')
+def _track_bulk(orm_execute_state):
+    # Bulk INSERT / UPDATE / DELETE statements bypass the flush
+    mapper = orm_execute_state.bind_mapper
+    if mapper is not None and (orm_execute_state.is_insert or
+                               orm_execute_state.is_update or
+                               orm_execute_state.is_delete):
+        _changed_tables(orm_execute_state.session).add(mapper.local_table.name)
+
+@sa.event.listens_for(db.session, 'before_commit')
+def _write_versions(session):
+    if session.in_nested_transaction():
+        return
+    # Flush now, rather than as part of the commit, so its changes are counted
+    session.flush()
+    changed = session.info.get('changed_tables')
+    if changed:
+        # Passing the write keeps a read_only view's commit on the primary
+        bump = DataVersion.__table__.update()
+        bump_versions(session.connection(bind_arguments={'clause': bump}), changed)
+
+@sa.event.listens_for(db.session, 'after_commit')
+def _notify_changes(session):
+    changed = session.info.pop('changed_tables', None)
+    if changed:
+        data_versions.notify(changed)
+
+@sa.event.listens_for(db.session, 'after_rollback')
+def _forget_changes(session):
+    session.info.pop('changed_tables', None)
@@ -0,0 +1,16 @@
+"""
+Synthetic data and timing benchmarks for the hot MCStats routes
+
+    flask bench seed --heroes 60 --villains 50 --results 100000
+    flask bench run
+
+or, against a throwaway SQLite database:
+
+    python -m benchmarks --heroes 60 --villains 50 --results 100000
+
+Concurrent readers and writers, e.g. to compare SQLite with and without
+SQLITE_TUNING:
+
+    flask bench concurrency --readers 4 --writers 2 --seconds 5
+    python -m benchmarks --concurrency 5
+"""
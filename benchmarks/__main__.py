@@ -0,0 +1,45 @@
+"""Seed a throwaway SQLite database and benchmark it in one go"""
+import argparse
+import json
+import os
+import tempfile
+
+def main():
+    parser = argparse.ArgumentParser(prog='python -m benchmarks', description=__doc__)
+    parser.add_argument('--heroes', type=int, default=60)
+    parser.add_argument('--villains', type=int, default=50)
+    parser.add_argument('--results', type=int, default=10000)
+    parser.add_argument('--phases', type=int, default=4)
+    parser.add_argument('--requests', type=int, default=20)
+    parser.add_argument('--concurrency', type=float, default=0, metavar='SECONDS',
+                        help='also run concurrent readers and writers, without and '
+                             'then with SQLite tuning')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # The config reads its database URL at import time
+        os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tmp, 'bench.db')
+        from app import create_app, db
+        from benchmarks.seed import seed
+        from benchmarks.runner import run
+        from benchmarks.concurrency import run_concurrency
+        app = create_app('benchmark')
+        with app.app_context():
+            db.create_all()
+            counts = seed(args.heroes, args.villains, args.results, args.phases)
+            report = {'seed': counts, 'routes': run(app, requests=args.requests)}
+            if args.concurrency:
+                report['concurrency'] = {}
+                # Tuning is applied as connections open, so start each run with a fresh pool
+                for tuned in (False, True):
+                    app.config['SQLITE_TUNING'] = tuned
+                    db.session.remove()
+                    db.engine.dispose()
+                    report['concurrency']['tuned' if tuned else 'default'] = \
+                        run_concurrency(app, seconds=args.concurrency)
+            db.session.remove()
+            db.engine.dispose()
+    print(json.dumps(report, indent=2))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,39 @@
+import json
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from benchmarks.seed import seed as seed_data
+from benchmarks.runner import run as run_benchmarks
+from benchmarks.concurrency import run_concurrency
+
+bench = AppGroup('bench', help='Benchmark data and timing commands.')
+
+@bench.command('seed')
+@click.option('--heroes', default=60, help='Heroes to add.')
+@click.option('--villains', default=50, help='Villains to add.')
+@click.option('--results', default=10000, help='Results to add.')
+@click.option('--phases', default=4, help='Phases to add.')
+@click.option('--seed', 'random_seed', default=0, help='Random seed.')
+def seed_command(heroes, villains, results, phases, random_seed):
+    """Bulk-insert a synthetic roster and play history."""
+    counts = seed_data(heroes, villains, results, phases, random_seed)
+    click.echo(json.dumps(counts))
+
+@bench.command('run')
+@click.option('--requests', default=20, help='Timed requests per route.')
+@click.option('--path', 'paths', multiple=True, help='Route to time (default: the hot routes).')
+def run_command(requests, paths):
+    """Time the hot routes and print a JSON report."""
+    click.echo(json.dumps(run_benchmarks(current_app, list(paths), requests), indent=2))
+
+@bench.command('concurrency')
+@click.option('--readers', default=4, help='Reader threads.')
+@click.option('--writers', default=2, help='Writer threads.')
+@click.option('--seconds', default=5.0, help='How long to run for.')
+def concurrency_command(readers, writers, seconds):
+    """Run concurrent readers and writers (adds results) and print a JSON report."""
+    try:
+        report = run_concurrency(current_app._get_current_object(), readers, writers, seconds)
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    click.echo(json.dumps(report, indent=2))
@@ -0,0 +1,78 @@
+"""Concurrent readers and writers against the same database"""
+import random
+import threading
+import time
+import sqlalchemy as sa
+from app import db
+from app.models import Hero, Villain, Result, ResultTypes
+from app.metrics import percentile
+from app.sqlite import journal_mode
+from app.stats import ResultMatrix
+
+def _ms(seconds):
+    return round(seconds * 1000, 3)
+
+def _worker(app, work, deadline, latencies, errors):
+    with app.app_context():
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            try:
+                work()
+            except sa.exc.OperationalError as e:
+                db.session.rollback()
+                errors.append(str(e.orig))
+                continue
+            finally:
+                db.session.close()
+            latencies.append(time.perf_counter() - start)
+
+def run_concurrency(app, readers=4, writers=2, seconds=2.0, random_seed=0):
+    """
+    Run reader threads loading the stats matrix and writer threads
+    committing one result at a time, side by side for the given number of
+    seconds.  Writes go to the app's database.  Reports throughput, latency
+    percentiles (ms) and 'database is locked' errors for each side.
+    """
+    with app.app_context():
+        hero_ids = db.session.scalars(sa.select(Hero.id)).all()
+        villain_ids = db.session.scalars(sa.select(Villain.id)).all()
+        mode = journal_mode()
+    if not hero_ids or not villain_ids:
+        raise ValueError('seed some heroes and villains first')
+    rng = random.Random(random_seed)
+    rng_lock = threading.Lock()
+
+    def read():
+        ResultMatrix.load()
+
+    def write():
+        with rng_lock:
+            hero_id, villain_id = rng.choice(hero_ids), rng.choice(villain_ids)
+            result = rng.choice((ResultTypes.WIN, ResultTypes.LOSS))
+        db.session.add(Result(hero_id=hero_id, villain_id=villain_id, result=result))
+        db.session.commit()
+
+    deadline = time.perf_counter() + seconds
+    sides = {'read': ([], []), 'write': ([], [])}
+    threads = [threading.Thread(target=_worker, args=(app, work, deadline, *sides[side]))
+               for side, work, n in (('read', read, readers), ('write', write, writers))
+               for _ in range(n)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    report = {'journal_mode': mode, 'readers': readers, 'writers': writers,
+              'seconds': seconds}
+    for side, (latencies, errors) in sides.items():
+        latencies.sort()
+        report[side] = {
+            'completed': len(latencies),
+            'per_second': round(len(latencies) / seconds, 1),
+            'p50_ms': _ms(percentile(latencies, 0.5)),
+            'p95_ms': _ms(percentile(latencies, 0.95)),
+            'max_ms': _ms(latencies[-1]) if latencies else 0,
+            'locked_errors': sum('locked' in e for e in errors),
+            'errors': len(errors),
+        }
+    return report
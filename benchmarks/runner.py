@@ -0,0 +1,56 @@
+"""Time the hot routes through the Flask test client"""
+import time
+import tracemalloc
+import sqlalchemy as sa
+from app import db
+from app.models import Hero, Villain
+from app.metrics import percentile
+
+def default_paths():
+    """The read-heavy pages, with the first hero and villain as detail pages"""
+    paths = ['/', '/stats', '/hero', '/villain']
+    hero_id = db.session.scalar(sa.select(sa.func.min(Hero.id)))
+    villain_id = db.session.scalar(sa.select(sa.func.min(Villain.id)))
+    if hero_id is not None:
+        paths.append(f'/hero/{hero_id}')
+    if villain_id is not None:
+        paths.append(f'/villain/{villain_id}')
+    return paths
+
+def run(app, paths=None, requests=20):
+    """
+    Request each path once cold, then requests more times, and report
+    latency percentiles (ms), query counts and peak traced memory per path.
+    """
+    paths = paths or default_paths()
+    client = app.test_client()
+    report = {}
+    for path in paths:
+        tracemalloc.start()
+        try:
+            start = time.perf_counter()
+            response = client.get(path)
+            cold = time.perf_counter() - start
+            latencies = []
+            queries = []
+            for _ in range(requests):
+                start = time.perf_counter()
+                response = client.get(path)
+                latencies.append(time.perf_counter() - start)
+                queries.append(int(response.headers.get('X-Query-Count', 0)))
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        latencies.sort()
+        report[path] = {
+            'status': response.status_code,
+            'requests': requests,
+            'cold_ms': round(cold * 1000, 3),
+            'p50_ms': round(percentile(latencies, 0.5) * 1000, 3),
+            'p95_ms': round(percentile(latencies, 0.95) * 1000, 3),
+            'max_ms': round(latencies[-1] * 1000, 3) if latencies else 0,
+            'queries': max(queries, default=0),
+            'peak_memory_bytes': peak,
+            'response_bytes': len(response.data),
+        }
+    return report
@@ -0,0 +1,63 @@
+"""Bulk-insert a large, realistic roster and play history"""
+from datetime import datetime, timedelta
+import random
+import sqlalchemy as sa
+from flask import current_app
+from app import db
+from app.models import Phase, Aspect, Hero, Villain, Result, ResultTypes, Difficulty, \
+    refresh_summaries, refresh_rollups
+
+ASPECTS = (('Aggression', '#ffffff', '#d11f1f'), ('Justice', '#000000', '#f5d90a'),
+           ('Leadership', '#ffffff', '#1b78c2'), ('Protection', '#ffffff', '#2a9d3c'),
+           ('Basic', '#000000', '#cccccc'))
+# Roughly the hero win rate across the real game
+WIN_RATE = 0.55
+# Results are spread over this many days up to the seeding date
+HISTORY_DAYS = 365
+PLAYERS = ('Alice', 'Bob', 'Carol', 'Dave')
+
+def _insert(model, rows):
+    if rows:
+        db.session.execute(sa.insert(model), rows)
+
+def seed(heroes, villains, results, phases=4, random_seed=0):
+    """
+    Add phases, aspects, heroes, villains and results with bulk inserts.
+    Names carry a 'Bench' prefix and a sequence number so repeated seeding
+    of the same database adds to the roster instead of colliding.
+    Returns the number of rows added per table.
+    """
+    rng = random.Random(random_seed)
+    start = db.session.scalar(sa.select(sa.func.count()).select_from(Phase)) + 1
+    _insert(Phase, [{'phasename': f'Bench Phase {start + i}'} for i in range(phases)])
+    phase_ids = db.session.scalars(sa.select(Phase.id).order_by(Phase.id.desc()).
+                                   limit(phases)).all()
+
+    aspect_names = set(db.session.scalars(sa.select(Aspect.name)))
+    _insert(Aspect, [{'name': name, 'fg_colour': fg, 'bg_colour': bg}
+                     for name, fg, bg in ASPECTS if name not in aspect_names])
+    aspect_ids = db.session.scalars(sa.select(Aspect.id)).all()
+
+    start = db.session.scalar(sa.select(sa.func.max(Hero.id))) or 0
+    _insert(Hero, [{'name': f'Bench Hero {start + i + 1}', 'phase_id': rng.choice(phase_ids),
+                    'aspect_id': rng.choice(aspect_ids)} for i in range(heroes)])
+    start = db.session.scalar(sa.select(sa.func.max(Villain.id))) or 0
+    _insert(Villain, [{'name': f'Bench Villain {start + i + 1}',
+                       'phase_id': rng.choice(phase_ids)} for i in range(villains)])
+    hero_ids = db.session.scalars(sa.select(Hero.id)).all()
+    villain_ids = db.session.scalars(sa.select(Villain.id)).all()
+
+    chunk_size = current_app.config['RESULTS_IMPORT_CHUNK_SIZE']
+    now = datetime.now().replace(microsecond=0)
+    for i in range(0, results, chunk_size):
+        _insert(Result, [{'hero_id': rng.choice(hero_ids), 'villain_id': rng.choice(villain_ids),
+                          'result': ResultTypes.WIN if rng.random() < WIN_RATE else ResultTypes.LOSS,
+                          'played_at': now - timedelta(seconds=rng.randrange(HISTORY_DAYS * 86400)),
+                          'aspect_id': rng.choice(aspect_ids),
+                          'difficulty': rng.choice(list(Difficulty)),
+                          'player': rng.choice(PLAYERS)}
+                         for _ in range(min(chunk_size, results - i))])
+    refresh_summaries(db.session.connection())
+    refresh_rollups(db.session.connection())
+    db.session.commit()
+    return {'phases': phases, 'heroes': heroes, 'villains': villains, 'results': results}
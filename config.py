@@ -10,4 +10,87 @@ class Config:
     MAIL_USE_TLS = os.environ.get('MAIL_USE_TLS') is not None
     MAIL_USERNAME = os.environ.get('MAIL_USERNAME')
     MAIL_PASSWORD = os.environ.get('MAIL_PASSWORD')
-    ADMINS = ['tim@pelican.org']
\ No newline at end of file
+    ADMINS = ['tim@pelican.org']
+    MAIL_BATCH_INTERVAL = int(os.environ.get('MAIL_BATCH_INTERVAL') or 60)
+    MAIL_BATCH_SIZE = int(os.environ.get('MAIL_BATCH_SIZE') or 100)
+    LOG_QUEUE_SIZE = int(os.environ.get('LOG_QUEUE_SIZE') or 10000)
+    RESULTS_IMPORT_CHUNK_SIZE = int(os.environ.get('RESULTS_IMPORT_CHUNK_SIZE') or 1000)
+    RESULTS_EXPORT_BATCH_SIZE = int(os.environ.get('RESULTS_EXPORT_BATCH_SIZE') or 1000)
+    STATS_FRAGMENT_CACHE_SIZE = int(os.environ.get('STATS_FRAGMENT_CACHE_SIZE') or 64)
+    STATS_LAZY_TABS = os.environ.get('STATS_LAZY_TABS') is not None
+    MATCHUP_CACHE_SIZE = int(os.environ.get('MATCHUP_CACHE_SIZE') or 256)
+    # Rows per page of the hero, villain and results listings
+    LIST_PAGE_SIZE = int(os.environ.get('LIST_PAGE_SIZE') or 50)
+    RELATIONSHIP_LOADING = os.environ.get('RELATIONSHIP_LOADING') or 'select'
+    METRICS_SAMPLE_SIZE = int(os.environ.get('METRICS_SAMPLE_SIZE') or 1000)
+    # Seconds a logged-in user's snapshot may be reused (0 turns the cache off);
+    # a write to the user by any process ends it early, via its data version
+    USER_CACHE_TTL = int(os.environ.get('USER_CACHE_TTL') or 0)
+    USER_CACHE_SIZE = int(os.environ.get('USER_CACHE_SIZE') or 1024)
+    # Connection pool tuning; only applied to server databases (MySQL)
+    DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE') or 5)
+    DB_MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW') or 10)
+    DB_POOL_RECYCLE = int(os.environ.get('DB_POOL_RECYCLE') or 1800)
+    DB_POOL_TIMEOUT = int(os.environ.get('DB_POOL_TIMEOUT') or 30)
+    DB_POOL_PRE_PING = os.environ.get('DB_POOL_NO_PRE_PING') is None
+    DB_STATEMENT_TIMEOUT_MS = int(os.environ.get('DB_STATEMENT_TIMEOUT_MS') or 0)
+    # Optional read replica for read_only views, and how long after a write
+    # reads stay on the primary (how far the replica may lag)
+    DATABASE_READ_URL = os.environ.get('DATABASE_READ_URL')
+    DATABASE_READ_LAG = float(os.environ.get('DATABASE_READ_LAG') or 5)
+    # WAL and connection pragmas; only applied to SQLite databases
+    SQLITE_TUNING = os.environ.get('SQLITE_TUNING') is not None
+    SQLITE_BUSY_TIMEOUT_MS = int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS') or 5000)
+    SQLITE_CACHE_SIZE_KB = int(os.environ.get('SQLITE_CACHE_SIZE_KB') or 20000)
+    SQLITE_MMAP_SIZE = int(os.environ.get('SQLITE_MMAP_SIZE') or 256 * 1024 * 1024)
+
+class DevelopmentConfig(Config):
+    DEBUG = True
+    DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE') or 2)
+    DB_MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW') or 2)
+
+class TestingConfig(Config):
+    TESTING = True
+    SQLALCHEMY_DATABASE_URI = os.environ.get('TEST_DATABASE_URL') or 'sqlite://'
+    WTF_CSRF_ENABLED = False
+
+class BenchmarkConfig(Config):
+    # Skips the log file and mail handlers, whose thread and files would
+    # outlive a throwaway benchmark run; requests and errors behave as in tests
+    TESTING = True
+
+class ProductionConfig(Config):
+    DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE') or 10)
+    DB_MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW') or 20)
+    DB_STATEMENT_TIMEOUT_MS = int(os.environ.get('DB_STATEMENT_TIMEOUT_MS') or 30000)
+    SQLITE_TUNING = os.environ.get('SQLITE_NO_TUNING') is None
+
+config = {
+    'development': DevelopmentConfig,
+    'testing': TestingConfig,
+    'benchmark': BenchmarkConfig,
+    'production': ProductionConfig,
+    'default': Config,
+}
+
+def engine_options(settings):
+    """
+    SQLALCHEMY_ENGINE_OPTIONS for the configured database.  Pool settings
+    only mean anything for server databases; SQLite gets SQLAlchemy's
+    defaults.
+    """
+    uri = settings['SQLALCHEMY_DATABASE_URI']
+    if not uri.startswith('mysql'):
+        return {}
+    options = {
+        'pool_size': settings['DB_POOL_SIZE'],
+        'max_overflow': settings['DB_MAX_OVERFLOW'],
+        'pool_recycle': settings['DB_POOL_RECYCLE'],
+        'pool_timeout': settings['DB_POOL_TIMEOUT'],
+        'pool_pre_ping': settings['DB_POOL_PRE_PING'],
+    }
+    if settings['DB_STATEMENT_TIMEOUT_MS']:
+        # Applies to SELECTs; mysqlclient runs init_command on each new connection
+        options['connect_args'] = {
+            'init_command': f"SET SESSION max_execution_time={settings['DB_STATEMENT_TIMEOUT_MS']}"}
+    return options
@@ -1,9 +1,14 @@
 import sqlalchemy as sa
 import sqlalchemy.orm as so
-from app import app, db
-from app.models import User, Phase, Villain, Aspect, Hero
+from app import create_app, db
+from app.models import User, Phase, Villain, Aspect, Hero, Result, HeroVillainSummary
+from benchmarks.cli import bench
+
+app = create_app()
+app.cli.add_command(bench)
 
 @app.shell_context_processor
 def make_shell_context():
     return {'sa': sa, 'so': so, 'db': db, 'User': User, 'Phase': Phase, 'Villain': Villain,
-            'Aspect': Aspect, 'Hero': Hero}
+            'Aspect': Aspect, 'Hero': Hero, 'Result': Result,
+            'HeroVillainSummary': HeroVillainSummary}
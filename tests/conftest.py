@@ -1,13 +1,36 @@
 """
 Fixtures for tests
 """
-import os
-os.environ['DATABASE_URL'] = 'sqlite://'
+from datetime import datetime
 import pytest
 import sqlalchemy as sa
 from flask_login import login_user, logout_user
-from app import app, db
-from app.models import User, Phase, Villain, Aspect, Hero
+from app import create_app, db
+from config import TestingConfig
+from app.models import User, Phase, Villain, Aspect, Hero, Result, ResultTypes, Difficulty
+
+class QueryCounter():
+    """
+    Context manager counting the SQL statements sent to the database
+    """
+    def __init__(self, engine):
+        self.engine = engine
+        self.statements = []
+
+    def _record(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+
+    def __enter__(self):
+        self.statements.clear()
+        sa.event.listen(self.engine, 'before_cursor_execute', self._record)
+        return self
+
+    def __exit__(self, *exc):
+        sa.event.remove(self.engine, 'before_cursor_execute', self._record)
+
+    @property
+    def count(self):
+        return len(self.statements)
 
 class AuthActions():
     """
@@ -51,13 +74,9 @@ class AuthActions():
 @pytest.fixture()
 def test_app():
     """
-    App fixture - overrides to in-memory DB and creates all tables
+    App fixture - a fresh app on the testing profile, with all tables created
     """
-    app.config.update({
-        'TESTING': True,
-        'SQLALCHEMY_DATABASE_URI': 'sqlite://',
-        'WTF_CSRF_ENABLED': False,
-    })
+    app = create_app('testing')
     app_context = app.app_context()
     app_context.push()
     db.create_all()
@@ -67,6 +86,50 @@ def test_app():
     db.drop_all()
     app_context.pop()
 
+@pytest.fixture()
+def file_app(tmp_path, monkeypatch):
+    """
+    App fixture on a SQLite file database with SQLITE_TUNING on, for tests
+    that need more than one connection
+    """
+    monkeypatch.setattr(TestingConfig, 'SQLALCHEMY_DATABASE_URI',
+                        'sqlite:///' + str(tmp_path / 'test.db'))
+    monkeypatch.setattr(TestingConfig, 'SQLITE_TUNING', True)
+    app = create_app('testing')
+    app_context = app.app_context()
+    app_context.push()
+    db.create_all()
+    yield app
+
+    db.session.remove()
+    db.engine.dispose()
+    app_context.pop()
+
+@pytest.fixture()
+def other_worker(file_app):
+    """
+    Second app on file_app's database, standing in for another worker
+    process or a CLI command writing to it
+    """
+    app = create_app('testing')
+    yield app
+    with app.app_context():
+        db.engine.dispose()
+
+@pytest.fixture()
+def file_result(file_app):
+    """
+    The rows of test_result, on file_app's database
+    """
+    db.session.add_all([Phase(id=1, phasename='Test Phase 1'), Aspect(id=1, name='Testing'),
+                        Villain(id=1, phase_id=1, name='Big Bad Bob'),
+                        Hero(id=1, aspect_id=1, phase_id=1, name='Safety Queen')])
+    db.session.commit()
+    db.session.add(Result(id=1, hero_id=1, villain_id=1, result=ResultTypes.WIN,
+                          played_at=datetime(2026, 1, 2, 20, 30), aspect_id=1,
+                          difficulty=Difficulty.STANDARD, player='TestUser'))
+    db.session.commit()
+
 @pytest.fixture()
 def test_client(test_app):
     """
@@ -81,6 +144,13 @@ def test_auth(test_client):
     """
     return AuthActions(test_client)
 
+@pytest.fixture
+def query_counter(test_app):
+    """
+    Counter for the SQL statements issued inside a 'with' block
+    """
+    return QueryCounter(db.engine)
+
 @pytest.fixture
 def test_phase(test_app):
     """
@@ -120,3 +190,15 @@ def test_hero(test_app):
         h = Hero(id=1, aspect_id=1, phase_id=1, name='Safety Queen')
         db.session.add(h)
         db.session.commit()
+
+@pytest.fixture
+def test_result(test_app, test_villain, test_aspect, test_hero):
+    """
+    Dummy Result - Safety Queen beats Big Bad Bob on Standard, as Testing
+    """
+    with test_app.app_context():
+        r = Result(id=1, hero_id=1, villain_id=1, result=ResultTypes.WIN,
+                   played_at=datetime(2026, 1, 2, 20, 30), aspect_id=1,
+                   difficulty=Difficulty.STANDARD, player='TestUser')
+        db.session.add(r)
+        db.session.commit()
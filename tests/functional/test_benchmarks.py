@@ -0,0 +1,84 @@
+"""
+Functional tests for the benchmark seeding and runner commands
+"""
+
+import json
+from app import db
+from app.models import Hero, Villain, Result, HeroVillainSummary
+from benchmarks.cli import bench
+
+def test_bench_seed(test_app):
+    """
+    GIVEN an empty database
+    WHEN 'flask bench seed' is run twice
+    THEN check the roster and results are added without name clashes
+    """
+    runner = test_app.test_cli_runner()
+    args = ['seed', '--heroes', '5', '--villains', '4', '--results', '50', '--phases', '2']
+    result = runner.invoke(bench, args)
+    assert json.loads(result.output) == {'phases': 2, 'heroes': 5, 'villains': 4, 'results': 50}
+    runner.invoke(bench, args)
+    assert db.session.query(Hero).count() == 10
+    assert db.session.query(Villain).count() == 8
+    assert db.session.query(Result).count() == 100
+    assert sum(s.wins + s.losses for s in db.session.query(HeroVillainSummary)) == 100
+
+def test_bench_run(test_app):
+    """
+    GIVEN a seeded database
+    WHEN 'flask bench run' is run
+    THEN check a JSON report covers each hot route
+    """
+    runner = test_app.test_cli_runner()
+    runner.invoke(bench, ['seed', '--heroes', '3', '--villains', '3', '--results', '10'])
+    result = runner.invoke(bench, ['run', '--requests', '2'])
+    report = json.loads(result.output)
+    assert set(report) == {'/', '/stats', '/hero', '/villain', '/hero/1', '/villain/1'}
+    for route in report.values():
+        assert route['status'] == 200
+        assert route['queries'] >= 1
+        assert route['p50_ms'] <= route['max_ms']
+        assert route['peak_memory_bytes'] > 0
+
+def test_sqlite_tuning(file_app):
+    """
+    GIVEN an app on a SQLite file database with SQLITE_TUNING on
+    WHEN a connection is opened
+    THEN check the tuning pragmas are applied to it
+    """
+    pragma = lambda name: db.session.execute(db.text(f'PRAGMA {name}')).scalar()
+    assert pragma('journal_mode') == 'wal'
+    assert pragma('synchronous') == 1
+    assert pragma('busy_timeout') == file_app.config['SQLITE_BUSY_TIMEOUT_MS']
+    assert pragma('cache_size') == -file_app.config['SQLITE_CACHE_SIZE_KB']
+    assert pragma('temp_store') == 2
+
+def test_bench_concurrency(file_app):
+    """
+    GIVEN a seeded SQLite file database in WAL mode
+    WHEN 'flask bench concurrency' is run
+    THEN check readers and writers both make progress without lock errors
+    """
+    runner = file_app.test_cli_runner()
+    runner.invoke(bench, ['seed', '--heroes', '3', '--villains', '3', '--results', '10'])
+    result = runner.invoke(bench, ['concurrency', '--readers', '2', '--writers', '2',
+                                   '--seconds', '0.5'])
+    report = json.loads(result.output)
+    assert report['journal_mode'] == 'wal'
+    for side in ('read', 'write'):
+        assert report[side]['completed'] > 0
+        assert report[side]['locked_errors'] == 0
+    db.session.remove()
+    assert db.session.query(Result).count() == 10 + report['write']['completed']
+    assert sum(s.wins + s.losses for s in db.session.query(HeroVillainSummary)) == \
+        10 + report['write']['completed']
+
+def test_bench_concurrency_empty(test_app):
+    """
+    GIVEN an empty database
+    WHEN 'flask bench concurrency' is run
+    THEN check it refuses to run
+    """
+    result = test_app.test_cli_runner().invoke(bench, ['concurrency', '--seconds', '0.1'])
+    assert result.exit_code != 0
+    assert 'seed some heroes and villains first' in result.output
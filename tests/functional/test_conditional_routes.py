@@ -0,0 +1,102 @@
+"""
+Functional tests for ETag revalidation and caching headers on read-only pages
+"""
+
+import pytest
+from app import db
+from app.models import Hero, Result, ResultTypes
+
+PAGES = ['/', '/hero', '/villain', '/hero/1', '/villain/1', '/stats', '/stats/phase/1',
+         '/stats/trends', '/results']
+
+@pytest.mark.parametrize('page', PAGES)
+def test_page_revalidates(test_client, test_result, query_counter, page):
+    """
+    GIVEN a read-only page fetched once
+    WHEN it is requested again (GET) with its ETag in If-None-Match
+    THEN check a 304 is answered after only the version lookup
+    """
+    response = test_client.get(page)
+    assert response.status_code == 200
+    assert {'public', 'no-cache'} <= set(response.headers['Cache-Control'].split(', '))
+    assert 'Cookie' in response.headers['Vary']
+    with query_counter:
+        response = test_client.get(page, headers={'If-None-Match': response.headers['ETag']})
+    assert response.status_code == 304
+    assert response.data == b''
+    assert query_counter.count == 1
+
+def test_etag_follows_tables(test_client, test_result):
+    """
+    GIVEN the ETags of the hero and villain lists
+    WHEN a hero is renamed, and then a result is recorded
+    THEN check only the pages built from the changed table are re-rendered
+    """
+    hero_etag = test_client.get('/hero').headers['ETag']
+    villain_etag = test_client.get('/villain').headers['ETag']
+    db.session.get(Hero, 1).name = 'Danger Lad'
+    db.session.commit()
+    response = test_client.get('/hero', headers={'If-None-Match': hero_etag})
+    assert response.status_code == 200
+    assert b'Danger Lad' in response.data
+    db.session.add(Result(hero_id=1, villain_id=1, result=ResultTypes.LOSS))
+    db.session.commit()
+    response = test_client.get('/villain', headers={'If-None-Match': villain_etag})
+    assert response.status_code == 304
+
+def test_etag_follows_outside_write(file_app, file_result, other_worker):
+    """
+    GIVEN the ETag of the hero list
+    WHEN another worker renames the hero and the page is revalidated
+    THEN check the page is re-rendered with the new name
+    """
+    client = file_app.test_client()
+    etag = client.get('/hero').headers['ETag']
+    with other_worker.app_context():
+        db.session.get(Hero, 1).name = 'Danger Lad'
+        db.session.commit()
+    response = client.get('/hero', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert b'Danger Lad' in response.data
+
+def test_etag_shared_by_workers(file_app, file_result, other_worker):
+    """
+    GIVEN the ETag of the hero list from one worker
+    WHEN another worker revalidates it, before and after 'flask stats new-epoch'
+    THEN check it answers 304 until the epoch is bumped
+    """
+    etag = file_app.test_client().get('/hero').headers['ETag']
+    client = other_worker.test_client()
+    assert client.get('/hero', headers={'If-None-Match': etag}).status_code == 304
+    result = other_worker.test_cli_runner().invoke(args=['stats', 'new-epoch'])
+    assert 'Data version epoch bumped.' in result.output
+    assert client.get('/hero', headers={'If-None-Match': etag}).status_code == 200
+
+def test_etag_varies_on_login(test_client, test_auth, test_result):
+    """
+    GIVEN the ETag of a page as seen anonymously
+    WHEN the visitor logs in and revalidates it
+    THEN check the page is re-rendered for them, and kept out of shared caches
+    """
+    etag = test_client.get('/hero').headers['ETag']
+    test_auth.create()
+    test_client.post('/login', data={'username': 'TestUser', 'password': 'TestPass'})
+    response = test_client.get('/hero', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert b'Logout' in response.data
+    assert response.headers['ETag'] != etag
+    assert 'private' in response.headers['Cache-Control']
+
+def test_flashed_page_not_cached(test_client, test_result):
+    """
+    GIVEN a redirect that flashes a message
+    WHEN the page it leads to is requested (GET)
+    THEN check the page is neither tagged nor stored
+    """
+    response = test_client.get('/hero/99')
+    assert response.status_code == 302
+    response = test_client.get('/')
+    assert b'does not exist' in response.data
+    assert 'ETag' not in response.headers
+    assert 'no-store' in response.headers['Cache-Control']
+    assert 'ETag' in test_client.get('/').headers
@@ -5,6 +5,9 @@ Functional tests for hero routes
 from flask import url_for
 from flask_login import current_user
 import pprint
+import sqlalchemy as sa
+from app import db
+from app.models import Aspect, Hero, Phase
 
 def test_hero_create_noauth(test_client):
     """
@@ -15,7 +18,7 @@ def test_hero_create_noauth(test_client):
     with test_client.application.test_request_context():
         response = test_client.get('/hero/create')
         assert response.status_code == 302
-        assert url_for('login') in response.headers['Location'] 
+        assert url_for('main.login') in response.headers['Location'] 
 
 def test_hero_create_auth(test_client, test_auth):
     """
@@ -41,7 +44,7 @@ def test_hero_create_post_noauth(test_client):
     with test_client.application.test_request_context():
         response = test_client.post('/hero/create', data={'name': 'Bob', 'phase_id': 1, 'aspect_id': 1})
         assert response.status_code == 302
-        assert url_for('login') in response.headers['Location'] 
+        assert url_for('main.login') in response.headers['Location'] 
 
 def test_hero_create_post_auth(test_client, test_auth, test_phase, test_aspect):
     """
@@ -56,7 +59,7 @@ def test_hero_create_post_auth(test_client, test_auth, test_phase, test_aspect):
         assert current_user.is_authenticated is True
         response = test_client.post('/hero/create', data={'name': 'Safety Queen', 'phase': 1, 'aspect': 1, 'submit': 'submit'})
         assert response.status_code == 302
-        assert url_for('hero') in response.headers['Location']
+        assert url_for('main.hero') in response.headers['Location']
 
         # Confirm that new hero has been created
 
@@ -75,6 +78,18 @@ def test_hero_list(test_client):
         assert response.status_code == 200
         assert b'Heroes' in response.data
 
+def test_api_hero(test_client, test_aspect, test_hero):
+    """
+    GIVEN a hero
+    WHEN the '/api/hero' page is requested (GET)
+    THEN check the hero is listed, with no further pages
+    """
+    response = test_client.get('/api/hero')
+    assert response.status_code == 200
+    assert response.json == {'items': [{'id': 1, 'name': 'Safety Queen', 'phase_id': 1,
+                                        'aspect_id': 1}],
+                             'prev_cursor': None, 'next_cursor': None}
+
 def test_hero_show(test_client, test_aspect, test_hero):
     """
     GIVEN a Flask application configured for testing
@@ -95,7 +110,7 @@ def test_hero_update_noauth(test_client):
     with test_client.application.test_request_context():
         response = test_client.get('/hero/1/update')
         assert response.status_code == 302
-        assert url_for('login') in response.headers['Location'] 
+        assert url_for('main.login') in response.headers['Location'] 
 
 def test_hero_update_auth(test_client, test_auth, test_aspect, test_hero):
     """
@@ -128,7 +143,7 @@ def test_hero_update_auth_bad_id(test_client, test_auth, test_aspect, test_hero)
         assert current_user.is_authenticated is True
         response = test_client.get('/hero/2/update')
         assert response.status_code == 302
-        assert url_for('index') in response.headers['Location']
+        assert url_for('main.index') in response.headers['Location']
         with test_client.session_transaction() as session:
             assert session['_flashes'] is not None 
 
@@ -143,7 +158,7 @@ def test_hero_update_post_noauth(test_client, test_aspect, test_hero):
                                     data={'name': 'Dairy Queen',
                                           'phase_id': 1})
         assert response.status_code == 302
-        assert url_for('login') in response.headers['Location'] 
+        assert url_for('main.login') in response.headers['Location'] 
 
 def test_hero_update_post_auth(test_client, test_auth, test_phase, test_aspect, test_hero):
     """
@@ -163,7 +178,7 @@ def test_hero_update_post_auth(test_client, test_auth, test_phase, test_aspect,
                                             'aspect': 1,
                                           'submit': 'submit'})
         assert response.status_code == 302
-        assert url_for('hero') in response.headers['Location']
+        assert url_for('main.hero') in response.headers['Location']
 
         # Confirm that hero has been updated
 
@@ -190,7 +205,7 @@ def test_hero_update_post_auth_bad_id(test_client, test_auth, test_phase, test_a
                                           'aspect': 1,
                                           'submit': 'submit'})
         assert response.status_code == 302
-        assert url_for('index') in response.headers['Location']
+        assert url_for('main.index') in response.headers['Location']
         with test_client.session_transaction() as session:
             assert session['_flashes'] is not None 
 
@@ -203,7 +218,7 @@ def test_hero_delete_noauth(test_client):
     with test_client.application.test_request_context():
         response = test_client.get('/hero/1/delete')
         assert response.status_code == 302
-        assert url_for('login') in response.headers['Location'] 
+        assert url_for('main.login') in response.headers['Location'] 
 
 def test_hero_delete_auth(test_client, test_auth, test_hero):
     """
@@ -236,7 +251,7 @@ def test_hero_delete_auth_bad_id(test_client, test_auth, test_hero):
         assert current_user.is_authenticated is True
         response = test_client.get('/hero/2/delete')
         assert response.status_code == 302
-        assert url_for('index') in response.headers['Location']
+        assert url_for('main.index') in response.headers['Location']
         with test_client.session_transaction() as session:
             assert session['_flashes'] is not None
 
@@ -250,7 +265,7 @@ def test_hero_delete_post_noauth(test_client, test_hero):
         response = test_client.post('/hero/1/delete',
                                     data={'submit': 'submit'})
         assert response.status_code == 302
-        assert url_for('login') in response.headers['Location'] 
+        assert url_for('main.login') in response.headers['Location'] 
 
 def test_hero_delete_post_auth(test_client, test_auth, test_phase, test_hero):
     """
@@ -267,13 +282,13 @@ def test_hero_delete_post_auth(test_client, test_auth, test_phase, test_hero):
         response = test_client.post('/hero/1/delete',
                                     data={'submit': 'submit'})
         assert response.status_code == 302
-        assert url_for('hero') in response.headers['Location']
+        assert url_for('main.hero') in response.headers['Location']
 
         # Confirm that hero has been deleted
 
         response = test_client.get('/hero/1')
         assert response.status_code == 302
-        assert url_for('index') in response.headers['Location']
+        assert url_for('main.index') in response.headers['Location']
         with test_client.session_transaction() as session:
             assert session['_flashes'] is not None
 
@@ -293,6 +308,79 @@ def test_hero_delete_post_auth_bad_id(test_client, test_auth, test_phase, test_h
         response = test_client.post('/hero/2/delete',
                                     data={'submit': 'submit'})
         assert response.status_code == 302
-        assert url_for('index') in response.headers['Location']
+        assert url_for('main.index') in response.headers['Location']
         with test_client.session_transaction() as session:
             assert session['_flashes'] is not None 
+
+def test_hero_form_reference_cache(test_client, test_auth, test_phase, test_aspect, query_counter):
+    """
+    GIVEN a logged-in user
+    WHEN the '/hero/create' form is requested twice, with a new Aspect in between
+    THEN check the choices come from the reference cache and pick up the change
+    """
+    with test_client.application.test_request_context():
+        test_auth.create()
+        test_auth.login()
+        assert current_user.is_authenticated is True
+        test_client.get('/hero/create')
+        with query_counter:
+            response = test_client.get('/hero/create')
+        assert b'Test Phase 1' in response.data
+        assert not any('FROM phase' in s or 'FROM aspect' in s for s in query_counter.statements)
+
+        db.session.add(Aspect(id=2, name='Shiny New Aspect'))
+        db.session.commit()
+        response = test_client.get('/hero/create')
+        assert b'Shiny New Aspect' in response.data
+
+def test_hero_pages_aspect_written_elsewhere(file_app):
+    """
+    GIVEN a loaded reference cache
+    WHEN an aspect and a hero using it are inserted through another
+        connection, without bumping any data version
+    THEN check the hero pages reload the aspect instead of failing
+    """
+    db.session.add(Phase(id=1, phasename='Test Phase 1'))
+    db.session.commit()
+    client = file_app.test_client()
+    # The stats filter form lists the (so far no) aspects
+    assert client.get('/stats').status_code == 200
+    with db.engine.begin() as connection:
+        connection.execute(sa.insert(Aspect.__table__).values(
+            id=1, name='Testing', fg_colour='#000000', bg_colour='#ffffff'))
+        connection.execute(sa.insert(Hero.__table__).values(
+            id=1, name='Safety Queen', phase_id=1, aspect_id=1))
+    for page in ('/', '/hero', '/hero/1'):
+        response = client.get(page)
+        assert response.status_code == 200
+        assert b'Testing' in response.data
+
+def test_hero_pages_missing_aspect(test_client, test_phase):
+    """
+    GIVEN a hero whose default aspect no longer exists
+    WHEN the hero pages are requested (GET)
+    THEN check they render, leaving the aspect blank
+    """
+    db.session.add(Hero(id=1, name='Safety Queen', phase_id=1, aspect_id=9))
+    db.session.commit()
+    for page in ('/', '/hero', '/hero/1', '/stats'):
+        assert test_client.get(page).status_code == 200
+
+def test_hero_list_missing_aspects_reload_once(test_client, test_phase, query_counter):
+    """
+    GIVEN many heroes whose default aspects don't exist
+    WHEN the '/hero' page is requested (GET)
+    THEN check the aspects are reloaded once, not once per hero
+    """
+    db.session.add(Hero(id=1, name='Hero 1', phase_id=1, aspect_id=9))
+    db.session.commit()
+    test_client.get('/hero')
+    with query_counter:
+        test_client.get('/hero')
+    one = query_counter.count
+    db.session.add_all(Hero(id=i, name=f'Hero {i}', phase_id=1, aspect_id=8 + i % 3)
+                       for i in range(2, 31))
+    db.session.commit()
+    with query_counter:
+        assert test_client.get('/hero').status_code == 200
+    assert query_counter.count == one
@@ -2,8 +2,12 @@
 Top-level functional tests for the MCStats application
 """
 
-from flask import url_for
+from flask import session, url_for
 from flask_login import current_user
+from app import create_app, db
+from app.models import Hero, Villain, User, load_user, user_cache
+from app.reference import reference
+from app.versions import data_versions
 
 def test_config(test_app):
     """
@@ -14,6 +18,24 @@ def test_config(test_app):
     assert test_app.config['TESTING'] is True
     assert test_app.config['SQLALCHEMY_DATABASE_URI'] == 'sqlite://'
 
+def test_apps_are_independent(test_app):
+    """
+    GIVEN two applications built by the factory
+    WHEN one of them has rows and cached data
+    THEN check the other has its own database and caches
+    """
+    db.session.add(Hero(name='Only In One', aspect_id=1, phase_id=1))
+    db.session.commit()
+    reference.phases.all()
+    other = create_app('testing')
+    with other.app_context():
+        db.create_all()
+        assert db.session.scalar(db.select(db.func.count(Hero.id))) == 0
+        assert other.extensions['reference'] is not test_app.extensions['reference']
+        assert other.extensions['data_versions'].version('hero') == 0
+        db.drop_all()
+    assert test_app.extensions['data_versions'].version('hero') == 1
+
 def test_home_page(test_client):
     """
     GIVEN a Flask application configured for testing
@@ -82,7 +104,7 @@ def test_login_user(test_client, test_auth):
         assert current_user.is_authenticated is True
         response = test_client.get('/login')
         assert response.status_code == 302
-        assert response.headers['Location'] == url_for('index')
+        assert response.headers['Location'] == url_for('main.index')
 
 def test_login_form_pass(test_client, test_auth):
     """
@@ -97,7 +119,7 @@ def test_login_form_pass(test_client, test_auth):
         response = test_client.post('/login', data={'username': test_auth.username, 'password': test_auth.password})
         assert current_user.is_authenticated is True
         assert response.status_code == 302
-        assert response.headers['Location'] == url_for('index')
+        assert response.headers['Location'] == url_for('main.index')
 
 def test_login_form_fail(test_client, test_auth):
     """
@@ -112,7 +134,7 @@ def test_login_form_fail(test_client, test_auth):
         response = test_client.post('/login', data={'username': test_auth.username, 'password': 'BADPASSWORD'})
         assert current_user.is_authenticated is False
         assert response.status_code == 302
-        assert response.headers['Location'] == url_for('login')
+        assert response.headers['Location'] == url_for('main.login')
 
 def test_logout(test_client, test_auth):
     """
@@ -127,4 +149,101 @@ def test_logout(test_client, test_auth):
         response = test_client.get('/logout')
         assert response.status_code == 302
         assert current_user.is_authenticated is False
-        assert response.headers['Location'] == url_for('index')
+        assert response.headers['Location'] == url_for('main.index')
+
+def test_home_page_queries(test_client, test_phase, test_aspect, query_counter):
+    """
+    GIVEN a growing roster of heroes and villains
+    WHEN the '/' page is requested (GET)
+    THEN check the number of queries doesn't grow with the roster
+    """
+    reference.aspects.all()
+    counts = []
+    for i in range(3):
+        db.session.add(Hero(phase_id=1, aspect_id=1, name=f'Hero {i}'))
+        db.session.add(Villain(phase_id=1, name=f'Villain {i}'))
+        db.session.commit()
+        with query_counter:
+            assert test_client.get('/').status_code == 200
+        counts.append(query_counter.count)
+    assert counts[0] == counts[-1]
+
+def test_load_user_cache(test_app, test_auth, query_counter):
+    """
+    GIVEN the user cache is enabled
+    WHEN a user is loaded twice in a request, then changes their password
+    THEN check the second load needs no query and the change drops the snapshot
+    """
+    test_auth.create()
+    test_app.config['USER_CACHE_TTL'] = 60
+    try:
+        with test_app.test_request_context():
+            user = load_user('1')
+            assert user.username == test_auth.username
+            with query_counter:
+                assert load_user('1') is user
+            assert query_counter.count == 0
+
+            u = db.session.get(User, 1)
+            u.set_password('NewPass')
+            db.session.commit()
+            reloaded = load_user('1')
+            assert reloaded is not user
+            assert reloaded.check_password('NewPass')
+    finally:
+        test_app.config['USER_CACHE_TTL'] = 0
+        user_cache.clear()
+
+def test_load_user_cache_written_elsewhere(file_app, other_worker):
+    """
+    GIVEN the user cache is enabled, holding a user
+    WHEN another worker changes the user's password, then deletes them
+    THEN check the next request loads the new password, and then no user
+    """
+    # Each request here shares the test's app context and session, as a test
+    # client's do, so the session is dropped and before_request run by hand
+    file_app.config['USER_CACHE_TTL'] = 60
+    user = User(username='TestUser', email='test@example.com')
+    user.set_password('TestPass')
+    db.session.add(user)
+    db.session.commit()
+    with file_app.test_request_context():
+        db.session.remove()
+        file_app.preprocess_request()
+        assert load_user('1').check_password('TestPass')
+    with other_worker.app_context():
+        db.session.get(User, 1).set_password('NewPass')
+        db.session.commit()
+    with file_app.test_request_context():
+        db.session.remove()
+        file_app.preprocess_request()
+        assert load_user('1').check_password('NewPass')
+    with other_worker.app_context():
+        db.session.delete(db.session.get(User, 1))
+        db.session.commit()
+    with file_app.test_request_context():
+        db.session.remove()
+        file_app.preprocess_request()
+        assert load_user('1') is None
+
+def test_cached_user_version_with_page(test_app, test_auth, query_counter):
+    """
+    GIVEN the user cache is enabled, holding the logged-in user
+    WHEN a later request looks up its page's data versions and then loads the user
+    THEN check the user's version came with the page's, so the load needs no query
+    """
+    test_auth.create()
+    test_app.config['USER_CACHE_TTL'] = 60
+    try:
+        with test_app.test_request_context():
+            user = load_user('1')
+        with test_app.test_request_context():
+            session['_user_id'] = '1'
+            test_app.preprocess_request()
+            data_versions.etag('hero')
+            with query_counter:
+                assert load_user('1') is user
+            assert query_counter.count == 0
+    finally:
+        test_app.config['USER_CACHE_TTL'] = 0
+        user_cache.clear()
@@ -0,0 +1,57 @@
+"""
+Functional tests for request instrumentation
+"""
+
+import pytest
+import sqlalchemy as sa
+from flask import g
+from app import db
+from app.metrics import registry, _start_request
+
+def test_query_count_header(test_client, test_aspect, test_hero):
+    """
+    GIVEN a Flask application configured for testing
+    WHEN a page backed by the database is requested (GET)
+    THEN check the query count and timings are sent as headers
+    """
+    response = test_client.get('/hero')
+    assert response.status_code == 200
+    assert int(response.headers['X-Query-Count']) >= 1
+    assert 'db;desc=' in response.headers['Server-Timing']
+    assert 'render;dur=' in response.headers['Server-Timing']
+
+def test_metrics(test_client):
+    """
+    GIVEN some requests have been served
+    WHEN '/metrics' is requested (GET)
+    THEN check per-endpoint summaries are returned in Prometheus text format
+    """
+    registry.clear()
+    for _ in range(3):
+        test_client.get('/')
+    summary = registry.summary('main.index', 'response_bytes')
+    assert summary['count'] == 3
+    assert summary[0.5] == summary['max'] > 0
+
+    response = test_client.get('/metrics')
+    assert response.status_code == 200
+    assert response.mimetype == 'text/plain'
+    text = response.get_data(as_text=True)
+    assert '# TYPE mcstats_request_duration_seconds summary' in text
+    assert 'mcstats_request_queries_count{endpoint="main.index"} 3' in text
+    assert 'mcstats_request_queries{endpoint="main.index",quantile="0.95"}' in text
+
+def test_failed_query_timing(test_app):
+    """
+    GIVEN a request whose first statement fails
+    WHEN a later statement succeeds on the same connection
+    THEN check only that one is counted and nothing is left on the connection
+    """
+    with test_app.test_request_context():
+        _start_request(test_app)
+        with pytest.raises(sa.exc.OperationalError):
+            db.session.execute(sa.text('SELECT * FROM no_such_table'))
+        db.session.rollback()
+        db.session.execute(sa.text('SELECT 1'))
+        assert g._metrics['queries'] == 1
+        assert not any(key.startswith('_metrics') for key in db.session.connection().info)
@@ -0,0 +1,66 @@
+"""
+Query budgets for the read-only routes
+
+Each route declares the most SQL statements it may issue for one anonymous
+request with a cold fragment cache, including the data version lookups
+that tell cached data is current.  Reference data is loaded once per
+process, so it is warmed before counting.  The roster is parametrised so that anything which
+issues a query per hero, villain or result (an N+1) blows its budget.
+"""
+
+import pytest
+from app import db
+from app.models import Hero, Villain, Phase, Result
+from app.stats import phase_fragments
+from app.reference import reference
+from benchmarks.seed import seed
+
+ROUTE_BUDGETS = {
+    '/': 4,
+    '/stats': 6,
+    '/stats/phase/{phase_id}': 6,
+    '/hero': 2,
+    '/hero/{hero_id}': 4,
+    '/villain': 2,
+    '/results': 2,
+    '/results?after={result_id}': 2,
+    '/api/hero': 1,
+    '/api/villain': 1,
+    '/api/results': 2,
+    '/api/search?q=bench': 3,
+    '/villain/{villain_id}': 4,
+    '/api/stats': 4,
+    '/api/stats/{phase_id}': 5,
+    '/stats/trends': 4,
+    '/stats/trends?hero={hero_id}&period=day': 4,
+    '/api/stats/trends': 2,
+    '/api/stats/trends?villain={villain_id}': 2,
+}
+
+@pytest.fixture(params=[1, 10, 40], ids=lambda n: f'roster{n}')
+def roster(request, test_app):
+    """
+    Synthetic roster of n heroes and n villains, with 5n results
+    """
+    n = request.param
+    seed(heroes=n, villains=n, results=5 * n, phases=2)
+    reference.phases.all()
+    reference.aspects.all()
+    return {'hero_id': db.session.scalar(db.select(db.func.min(Hero.id))),
+            'villain_id': db.session.scalar(db.select(db.func.min(Villain.id))),
+            'phase_id': db.session.scalar(db.select(db.func.min(Phase.id))),
+            'result_id': db.session.scalar(db.select(db.func.max(Result.id)))}
+
+@pytest.mark.parametrize('route', ROUTE_BUDGETS)
+def test_query_budget(test_client, roster, query_counter, route):
+    """
+    GIVEN a roster of a given size
+    WHEN a read-only route is requested (GET) with cold caches
+    THEN check it stays within its query budget
+    """
+    phase_fragments.clear()
+    db.session.expunge_all()
+    with query_counter:
+        response = test_client.get(route.format(**roster))
+    assert response.status_code == 200
+    assert query_counter.count <= ROUTE_BUDGETS[route], '\n'.join(query_counter.statements)
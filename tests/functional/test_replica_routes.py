@@ -0,0 +1,77 @@
+"""
+Functional tests for sending read-only views to the read replica
+"""
+
+import pytest
+from flask_login import current_user
+from app import create_app, db
+from app.models import Phase, Aspect, Hero
+from config import TestingConfig
+from tests.conftest import QueryCounter, AuthActions
+
+@pytest.fixture()
+def replica_app(tmp_path, monkeypatch):
+    """
+    App whose 'replica' is a second engine on the same SQLite file, so
+    both see the same rows but their queries can be told apart
+    """
+    url = 'sqlite:///' + str(tmp_path / 'test.db')
+    monkeypatch.setattr(TestingConfig, 'SQLALCHEMY_DATABASE_URI', url)
+    monkeypatch.setattr(TestingConfig, 'DATABASE_READ_URL', url)
+    app = create_app('testing')
+    app_context = app.app_context()
+    app_context.push()
+    db.create_all()
+    yield app
+
+    db.session.remove()
+    db.engine.dispose()
+    app.extensions['replica'].dispose()
+    app_context.pop()
+
+def test_read_only_views_use_replica(replica_app):
+    """
+    GIVEN an app with a read replica and no recent writes
+    WHEN a read-only page is requested (GET)
+    THEN check its queries run on the replica, not the primary
+    """
+    client = replica_app.test_client()
+    primary, replica = QueryCounter(db.engine), QueryCounter(replica_app.extensions['replica'])
+    with primary, replica:
+        response = client.get('/hero')
+    assert response.status_code == 200
+    assert replica.count > 0
+    assert primary.count == 0
+
+def test_read_your_writes(replica_app, monkeypatch):
+    """
+    GIVEN an app with a read replica
+    WHEN a hero is created (POST) and the hero list requested straight after
+    THEN check the list is read from the primary until the lag window passes
+    """
+    db.session.add_all([Phase(id=1, phasename='Test Phase 1'), Aspect(id=1, name='Testing')])
+    db.session.commit()
+    client = replica_app.test_client()
+    auth = AuthActions(client)
+    primary, replica = QueryCounter(db.engine), QueryCounter(replica_app.extensions['replica'])
+    with replica_app.test_request_context():
+        auth.create()
+        auth.login()
+        assert current_user.is_authenticated is True
+        response = client.post('/hero/create', data={
+            'name': 'Fresh Hero', 'aspect': 1, 'phase': 1, 'submit': 'submit'})
+        assert response.status_code == 302
+        assert db.session.query(Hero).filter_by(name='Fresh Hero').count() == 1
+        # Leave only the visitor's cookie to say they just wrote
+        del replica_app.extensions['last_write']
+        with primary, replica:
+            response = client.get('/hero')
+        assert b'Fresh Hero' in response.data
+        assert primary.count > 0
+        assert replica.count == 0
+
+        monkeypatch.setitem(replica_app.config, 'DATABASE_READ_LAG', 0)
+        with primary, replica:
+            client.get('/hero')
+        assert primary.count == 0
+        assert replica.count > 0
@@ -0,0 +1,240 @@
+"""
+Functional tests for result routes and commands
+"""
+
+import io
+import json
+from datetime import datetime
+from flask import url_for
+from flask_login import current_user
+from app import db
+from app.models import Result, ResultTypes, Difficulty
+from app.stats import ResultMatrix
+
+def test_results_bulk_noauth(test_client):
+    """
+    GIVEN a Flask application configured for testing
+    WHEN results are posted to '/results/bulk' without logging in
+    THEN check user is redirected to login
+    """
+    with test_client.application.test_request_context():
+        response = test_client.post('/results/bulk', data='Safety Queen,Big Bad Bob,WIN')
+        assert response.status_code == 302
+        assert url_for('main.login') in response.headers['Location']
+
+def test_results_bulk_csv(test_client, test_auth, test_villain, test_aspect, test_hero):
+    """
+    GIVEN a logged-in user
+    WHEN CSV results are posted to '/results/bulk'
+    THEN check good lines are imported and bad lines reported by number
+    """
+    with test_client.application.test_request_context():
+        test_auth.create()
+        test_auth.login()
+        assert current_user.is_authenticated is True
+        data = ('hero,villain,result\n'
+                'Safety Queen,Big Bad Bob,WIN\n'
+                'safety queen, big bad bob ,loss\n'
+                'Nobody,Big Bad Bob,WIN\n'
+                'Safety Queen,Big Bad Bob,DRAW\n'
+                'Safety Queen,Big Bad Bob\n')
+        response = test_client.post('/results/bulk', data=data, content_type='text/csv')
+        assert response.status_code == 200
+        assert response.json['imported'] == 2
+        assert [e['line'] for e in response.json['errors']] == [4, 5, 6]
+        assert db.session.query(Result).count() == 2
+        assert ResultMatrix.load().counts(1, 1) == (1, 1)
+
+def test_results_bulk_jsonl(test_client, test_auth, test_villain, test_aspect, test_hero):
+    """
+    GIVEN a logged-in user
+    WHEN JSON lines results are posted to '/results/bulk'
+    THEN check the results are imported
+    """
+    with test_client.application.test_request_context():
+        test_auth.create()
+        test_auth.login()
+        assert current_user.is_authenticated is True
+        data = '\n'.join([json.dumps({'hero': 'Safety Queen', 'villain': 'Big Bad Bob', 'result': 'WIN'}),
+                          '{not json',
+                          json.dumps({'hero': 'Safety Queen'})])
+        response = test_client.post('/results/bulk', data=data, content_type='application/x-ndjson')
+        assert response.status_code == 200
+        assert response.json['imported'] == 1
+        assert [e['line'] for e in response.json['errors']] == [2, 3]
+
+def test_results_bulk_upload_encoding(test_client, test_auth, test_villain, test_aspect,
+                                     test_hero):
+    """
+    GIVEN a logged-in user
+    WHEN a CSV file with a byte order mark and a line that isn't UTF-8 is uploaded
+    THEN check the good lines are imported and the bad one reported
+    """
+    with test_client.application.test_request_context():
+        test_auth.create()
+        test_auth.login()
+        assert current_user.is_authenticated is True
+        data = (b'\xef\xbb\xbfSafety Queen,Big Bad Bob,WIN\n'
+                b'Safety Qu\xe9en,Big Bad Bob,WIN\n'
+                b'Safety Queen,Big Bad Bob,LOSS\n')
+        response = test_client.post('/results/bulk', data={'file': (io.BytesIO(data), 'r.csv')},
+                                    content_type='multipart/form-data')
+        assert response.status_code == 200
+        assert response.json['imported'] == 2
+        assert response.json['errors'] == [{'line': 2, 'error': 'not valid UTF-8'}]
+
+def test_results_bulk_csrf(test_client, test_auth, test_villain, test_aspect, test_hero):
+    """
+    GIVEN a logged-in user, with CSRF protection on
+    WHEN results are posted to '/results/bulk' without and then with a CSRF token
+    THEN check the first is refused, as from a cross-site form, and the second imported
+    """
+    test_client.application.config['WTF_CSRF_ENABLED'] = True
+    with test_client.application.test_request_context():
+        test_auth.create()
+        test_auth.login()
+        assert current_user.is_authenticated is True
+        data = json.dumps({'hero': 'Safety Queen', 'villain': 'Big Bad Bob', 'result': 'WIN',
+                           'x': '='})
+        response = test_client.post('/results/bulk?format=jsonl', data=data,
+                                    content_type='text/plain')
+        assert response.status_code == 400
+        assert db.session.query(Result).count() == 0
+        response = test_client.get('/api/csrf-token')
+        assert 'no-store' in response.headers['Cache-Control']
+        response = test_client.post('/results/bulk?format=jsonl', data=data,
+                                    content_type='text/plain',
+                                    headers={'X-CSRFToken': response.json['csrf_token']})
+        assert response.status_code == 200
+        assert response.json['imported'] == 1
+
+def test_results_bulk_csv_metadata(test_client, test_auth, test_villain, test_aspect, test_hero):
+    """
+    GIVEN a logged-in user
+    WHEN CSV results with when / aspect / difficulty / player fields are posted
+    THEN check the fields are stored, and bad ones reported by line number
+    """
+    with test_client.application.test_request_context():
+        test_auth.create()
+        test_auth.login()
+        assert current_user.is_authenticated is True
+        data = ('hero,villain,result,played_at,aspect,difficulty,player\n'
+                'Safety Queen,Big Bad Bob,WIN,2026-03-04T19:00,testing,expert,Tim\n'
+                'Safety Queen,Big Bad Bob,LOSS,,,,\n'
+                'Safety Queen,Big Bad Bob,WIN,yesterday\n'
+                'Safety Queen,Big Bad Bob,WIN,,Nonsense\n'
+                'Safety Queen,Big Bad Bob,WIN,,,Impossible\n')
+        response = test_client.post('/results/bulk', data=data, content_type='text/csv')
+        assert response.json['imported'] == 2
+        assert [e['line'] for e in response.json['errors']] == [4, 5, 6]
+        first, second = db.session.query(Result).order_by(Result.id)
+        assert first.played_at == datetime(2026, 3, 4, 19, 0)
+        assert (first.aspect_id, first.difficulty, first.player) == (1, Difficulty.EXPERT, 'Tim')
+        assert (second.played_at, second.aspect_id, second.difficulty, second.player) == \
+            (None, None, None, None)
+
+def test_results_import_command(test_app, test_villain, test_aspect, test_hero, tmp_path):
+    """
+    GIVEN a CSV file of results
+    WHEN 'flask results import' is run with a small chunk size
+    THEN check every row is imported and summarised
+    """
+    path = tmp_path / 'results.csv'
+    path.write_text('Safety Queen,Big Bad Bob,WIN\n' * 5)
+    result = test_app.test_cli_runner().invoke(
+        args=['results', 'import', str(path), '--chunk-size', '2'])
+    assert 'Imported 5 results, 0 errors.' in result.output
+    assert db.session.query(Result).filter_by(result=ResultTypes.WIN).count() == 5
+    assert ResultMatrix.load().counts(1, 1) == (5, 0)
+
+def test_results_import_command_encoding(test_app, test_villain, test_aspect, test_hero,
+                                         tmp_path):
+    """
+    GIVEN a CSV file with a byte order mark before its header, and a line that isn't UTF-8
+    WHEN 'flask results import' is run
+    THEN check the header is skipped, the good lines imported and the bad one reported
+    """
+    path = tmp_path / 'results.csv'
+    path.write_bytes(b'\xef\xbb\xbfhero,villain,result\n'
+                     b'Safety Queen,Big Bad Bob,WIN\n'
+                     b'Safety Qu\xe9en,Big Bad Bob,WIN\n'
+                     b'Safety Queen,Big Bad Bob,LOSS\n')
+    result = test_app.test_cli_runner().invoke(args=['results', 'import', str(path)])
+    assert f'{path}:3: not valid UTF-8' in result.output
+    assert 'Imported 2 results, 1 errors.' in result.output
+    assert ResultMatrix.load().counts(1, 1) == (1, 1)
+
+def test_results_export_csv(test_client, test_result):
+    """
+    GIVEN a recorded result
+    WHEN '/results/export.csv' is requested (GET)
+    THEN check a header and the result are streamed as CSV
+    """
+    response = test_client.get('/results/export.csv')
+    assert response.status_code == 200
+    assert response.is_streamed
+    assert response.mimetype == 'text/csv'
+    assert response.get_data(as_text=True).splitlines() == [
+        'id,hero,villain,result,played_at,aspect,difficulty,player',
+        '1,Safety Queen,Big Bad Bob,WIN,2026-01-02T20:30:00,Testing,STANDARD,TestUser']
+
+def test_results_export_jsonl(test_client, test_result):
+    """
+    GIVEN a recorded result
+    WHEN '/results/export.jsonl' is requested (GET)
+    THEN check the result is streamed as a JSON line
+    """
+    response = test_client.get('/results/export.jsonl')
+    assert response.status_code == 200
+    lines = response.get_data(as_text=True).splitlines()
+    assert [json.loads(l) for l in lines] == [
+        {'id': 1, 'hero': 'Safety Queen', 'villain': 'Big Bad Bob', 'result': 'WIN',
+         'played_at': '2026-01-02T20:30:00', 'aspect': 'Testing', 'difficulty': 'STANDARD',
+         'player': 'TestUser'}]
+
+def test_results_export_command(test_app, test_result):
+    """
+    GIVEN a recorded result
+    WHEN 'flask results export' is run
+    THEN check the CSV is written to stdout
+    """
+    result = test_app.test_cli_runner().invoke(args=['results', 'export'])
+    assert result.output.splitlines() == [
+        'id,hero,villain,result,played_at,aspect,difficulty,player',
+        '1,Safety Queen,Big Bad Bob,WIN,2026-01-02T20:30:00,Testing,STANDARD,TestUser']
+
+def test_results_log(test_client, test_result):
+    """
+    GIVEN two recorded results, one by another player
+    WHEN '/results' is requested (GET) a page at a time, and filtered
+    THEN check the newest is shown first with a cursor to the next page
+    """
+    db.session.add(Result(hero_id=1, villain_id=1, result=ResultTypes.LOSS, player='Tim'))
+    db.session.commit()
+    test_client.application.config['LIST_PAGE_SIZE'] = 1
+    response = test_client.get('/results')
+    assert response.status_code == 200
+    assert b'Tim' in response.data and b'TestUser' not in response.data
+    assert b'after=2' in response.data
+    response = test_client.get('/results?after=2')
+    assert b'TestUser' in response.data and b'before=1' in response.data
+    response = test_client.get('/results?player=TestUser')
+    assert b'TestUser' in response.data and b'after=' not in response.data
+    assert test_client.get('/results?after=nonsense').status_code == 400
+    assert test_client.get('/results?after=99999999999999999999999').status_code == 400
+
+def test_api_results(test_client, test_result):
+    """
+    GIVEN a recorded result
+    WHEN '/api/results' is requested (GET)
+    THEN check the page is returned as JSON, in the export format
+    """
+    response = test_client.get('/api/results')
+    assert response.json == {
+        'items': [{'id': 1, 'hero': 'Safety Queen', 'villain': 'Big Bad Bob', 'result': 'WIN',
+                   'played_at': '2026-01-02T20:30:00', 'aspect': 'Testing',
+                   'difficulty': 'STANDARD', 'player': 'TestUser'}],
+        'prev_cursor': None, 'next_cursor': None}
+    response = test_client.get('/api/results?before=1.2')
+    assert response.status_code == 400
+    assert 'cursor' in response.json['error']
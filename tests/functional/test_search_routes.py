@@ -0,0 +1,39 @@
+"""
+Functional tests for the name search route
+"""
+
+from app import db
+from app.models import Hero
+
+def test_api_search(test_client, test_villain, test_aspect, test_hero, query_counter):
+    """
+    GIVEN a hero and a villain
+    WHEN '/api/search' is requested (GET) as a name is typed
+    THEN check matches link to their pages, and later keystrokes only look up
+        the data versions
+    """
+    response = test_client.get('/api/search?q=saf')
+    assert response.status_code == 200
+    assert response.json == {'results': [{'type': 'hero', 'id': 1, 'name': 'Safety Queen',
+                                          'url': '/hero/1'}]}
+    with query_counter:
+        response = test_client.get('/api/search?q=b&type=villain')
+    assert query_counter.count == 1
+    assert [r['url'] for r in response.json['results']] == ['/villain/1']
+    assert test_client.get('/api/search?q=').json == {'results': []}
+    assert test_client.get('/api/search?q=b&type=aspect').status_code == 400
+    assert test_client.get('/api/search?q=b&limit=500').status_code == 400
+
+def test_api_search_outside_write(file_app, other_worker):
+    """
+    GIVEN a loaded search index
+    WHEN another worker adds a hero
+    THEN check the next search finds it
+    """
+    client = file_app.test_client()
+    assert client.get('/api/search?q=danger').json == {'results': []}
+    with other_worker.app_context():
+        db.session.add(Hero(id=1, aspect_id=1, phase_id=1, name='Danger Lad'))
+        db.session.commit()
+    assert [r['name'] for r in client.get('/api/search?q=danger').json['results']] == \
+        ['Danger Lad']
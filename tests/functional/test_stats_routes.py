@@ -0,0 +1,382 @@
+"""
+Functional tests for stats routes
+"""
+
+from datetime import datetime
+import pytest
+import sqlalchemy as sa
+from app import db
+from app.models import Phase, Villain, Hero, Result, ResultTypes, HeroVillainSummary, Difficulty
+from app.stats import ResultMatrix, ResultFilter, StatsService, MatchupRecord, \
+    phase_fragments, matchup_records
+from app.metrics import registry
+from app.engine import StatsEngine
+
+def test_stats_empty(test_client):
+    """
+    GIVEN a Flask application configured for testing
+    WHEN the '/stats' page is requested (GET) with no data
+    THEN check the page is returned
+    """
+    response = test_client.get('/stats')
+    assert response.status_code == 200
+    assert b'Statistics' in response.data
+
+def test_stats_result(test_client, test_result):
+    """
+    GIVEN a hero who has beaten a villain
+    WHEN the '/stats' page is requested (GET)
+    THEN check the win is shown in the matrix
+    """
+    response = test_client.get('/stats')
+    assert response.status_code == 200
+    assert b'Big Bad Bob' in response.data
+    assert b'Safety Queen' in response.data
+    assert b'<td bgcolor="#00ff00">W</td>' in response.data
+
+def test_result_matrix(test_app, test_result):
+    """
+    GIVEN a mix of results for several pairings
+    WHEN a ResultMatrix is loaded
+    THEN check the counts and headline result for each pairing
+    """
+    db.session.add(Hero(id=2, aspect_id=1, phase_id=1, name='Danger Lad'))
+    db.session.add(Result(hero_id=1, villain_id=1, result=ResultTypes.LOSS))
+    db.session.add(Result(hero_id=2, villain_id=1, result=ResultTypes.LOSS))
+    db.session.commit()
+    matrix = ResultMatrix.load(phase_id=1)
+    assert len(matrix) == 2
+    assert matrix.counts(1, 1) == (1, 1)
+    assert matrix.result(1, 1) == ResultTypes.WIN
+    assert matrix.result(2, 1) == ResultTypes.LOSS
+    assert matrix.result(2, 2) is None
+    assert matrix.as_cell(2, 2) == '<td></td>'
+    assert len(ResultMatrix.load(phase_id=2)) == 0
+
+def test_result_matrix_filtered(test_app, test_result):
+    """
+    GIVEN results at different times and difficulties
+    WHEN a ResultMatrix is loaded through a ResultFilter
+    THEN check only the matching results are counted
+    """
+    db.session.add(Result(hero_id=1, villain_id=1, result=ResultTypes.LOSS,
+                          played_at=datetime(2026, 2, 1, 12, 0), difficulty=Difficulty.EXPERT))
+    db.session.commit()
+    def counts(**args):
+        return ResultMatrix.load(result_filter=ResultFilter.from_args(args)).counts(1, 1)
+    assert counts() == (1, 1)
+    assert counts(since='2026-01-03') == (0, 1)
+    assert counts(until='2026-01-02') == (1, 0)
+    assert counts(difficulty='expert') == (0, 1)
+    assert counts(aspect='1', player='TestUser') == (1, 0)
+    assert counts(player='Nobody') == (0, 0)
+    assert ResultMatrix.load(2, ResultFilter(player='TestUser')).counts(1, 1) == (0, 0)
+    with pytest.raises(ValueError):
+        ResultFilter.from_args({'difficulty': 'impossible'})
+
+@pytest.mark.parametrize('args', [{'since': '2026-01-03'}, {'until': '2026-01-02'},
+                                  {'difficulty': 'expert'}, {'aspect': '1'},
+                                  {'player': 'TestUser'}])
+@pytest.mark.parametrize('phase_id', [None, 1])
+def test_result_counts_covering_index(test_app, query_counter, args, phase_id):
+    """
+    GIVEN the result table's covering indexes
+    WHEN filtered per-pairing win / loss counts are loaded
+    THEN check SQLite plans the query the app sends from an index alone, without a sort
+    """
+    with query_counter:
+        ResultMatrix.load(phase_id, ResultFilter.from_args(args))
+    sql, = query_counter.statements
+    # The plan doesn't depend on the values bound
+    rows = db.session.connection().exec_driver_sql('EXPLAIN QUERY PLAN ' + sql,
+                                                   (None,) * sql.count('?'))
+    plan = ' | '.join(row[-1] for row in rows)
+    assert 'USING COVERING INDEX ix_result_' in plan.split(' | ')[0]
+    assert 'TEMP B-TREE' not in plan
+
+def test_stats_filtered(test_client, test_result):
+    """
+    GIVEN a hero who beat a villain on Standard
+    WHEN the '/stats' page is requested (GET) filtered to other games
+    THEN check the win is left out, and a malformed filter is rejected
+    """
+    response = test_client.get('/stats?difficulty=STANDARD')
+    assert b'<td bgcolor="#00ff00">W</td>' in response.data
+    response = test_client.get('/stats?difficulty=EXPERT')
+    assert response.status_code == 200
+    assert b'<td bgcolor="#00ff00">W</td>' not in response.data
+    assert test_client.get('/stats?since=last-week').status_code == 400
+    response = test_client.get('/api/stats?since=2026-01-03')
+    assert response.json['results']['wins'] == []
+    assert test_client.get('/api/stats?aspect=x').status_code == 400
+    assert test_client.get('/api/stats?aspect=99999999999999999999999').status_code == 400
+
+def test_summary_maintained(test_app, test_result):
+    """
+    GIVEN a hero who has beaten a villain
+    WHEN results are added, changed and deleted
+    THEN check the HeroVillainSummary rollup follows in the same transaction
+    """
+    s = db.session.get(HeroVillainSummary, (1, 1))
+    assert (s.wins, s.losses, s.last_result) == (1, 0, ResultTypes.WIN)
+
+    r = Result(hero_id=1, villain_id=1, result=ResultTypes.LOSS)
+    db.session.add(r)
+    db.session.commit()
+    s = db.session.get(HeroVillainSummary, (1, 1))
+    assert (s.wins, s.losses, s.last_result) == (1, 1, ResultTypes.LOSS)
+
+    r.result = ResultTypes.WIN
+    db.session.commit()
+    s = db.session.get(HeroVillainSummary, (1, 1))
+    assert (s.wins, s.losses, s.last_result) == (2, 0, ResultTypes.WIN)
+
+    db.session.delete(r)
+    db.session.delete(db.session.get(Result, 1))
+    db.session.commit()
+    assert db.session.get(HeroVillainSummary, (1, 1)) is None
+
+def test_summary_counts_added(test_app, test_result, query_counter):
+    """
+    GIVEN a summary row counting wins the result table doesn't show, as a
+          concurrent writer's would be
+    WHEN results are added and deleted
+    THEN check their counts are added to the row's, without re-reading the pairing's results
+    """
+    db.session.execute(sa.update(HeroVillainSummary).values(wins=5))
+    db.session.commit()
+    with query_counter:
+        db.session.add(Result(hero_id=1, villain_id=1, result=ResultTypes.WIN))
+        db.session.commit()
+    assert not any('GROUP BY' in s for s in query_counter.statements)
+    s = db.session.get(HeroVillainSummary, (1, 1))
+    assert (s.wins, s.losses, s.last_result) == (6, 0, ResultTypes.WIN)
+    loss = Result(hero_id=1, villain_id=1, result=ResultTypes.LOSS)
+    db.session.add(loss)
+    db.session.commit()
+    db.session.delete(loss)
+    db.session.commit()
+    s = db.session.get(HeroVillainSummary, (1, 1))
+    assert (s.wins, s.losses, s.last_result) == (6, 0, ResultTypes.WIN)
+
+def test_backfill_summaries(test_app, test_result):
+    """
+    GIVEN results with no matching summary rows
+    WHEN 'flask stats backfill-summaries' is run
+    THEN check the summary table is rebuilt
+    """
+    db.session.execute(sa.delete(HeroVillainSummary))
+    db.session.commit()
+    assert len(ResultMatrix.load()) == 0
+    result = test_app.test_cli_runner().invoke(args=['stats', 'backfill-summaries'])
+    assert 'rebuilt' in result.output
+    assert ResultMatrix.load().counts(1, 1) == (1, 0)
+
+def test_api_stats(test_client, test_result):
+    """
+    GIVEN a hero who has beaten a villain
+    WHEN '/api/stats' is requested (GET)
+    THEN check the matrix is returned as parallel arrays with an ETag
+    """
+    response = test_client.get('/api/stats')
+    assert response.status_code == 200
+    assert response.headers['ETag']
+    assert response.json['heroes'] == {'id': [1], 'name': ['Safety Queen'], 'phase_id': [1]}
+    assert response.json['villains'] == {'id': [1], 'name': ['Big Bad Bob'], 'phase_id': [1]}
+    assert response.json['results'] == {'hero_id': [1], 'villain_id': [1],
+                                        'wins': [1], 'losses': [0]}
+    response = test_client.get('/api/stats/1')
+    assert response.json['phase_id'] == 1
+    assert test_client.get('/api/stats/2').status_code == 404
+
+def test_api_stats_not_modified(test_client, test_result):
+    """
+    GIVEN a client holding the current ETag for '/api/stats'
+    WHEN it revalidates before and after a new result is written
+    THEN check it gets a 304 first, then the new data
+    """
+    etag = test_client.get('/api/stats').headers['ETag']
+    response = test_client.get('/api/stats', headers={'If-None-Match': etag})
+    assert response.status_code == 304
+    assert response.data == b''
+
+    db.session.add(Result(hero_id=1, villain_id=1, result=ResultTypes.LOSS))
+    db.session.commit()
+    response = test_client.get('/api/stats', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.headers['ETag'] != etag
+    assert response.json['results']['losses'] == [1]
+
+def test_api_stats_outside_write(file_app, other_worker):
+    """
+    GIVEN a client holding the current ETag for '/api/stats'
+    WHEN another worker writes a result and the client revalidates
+    THEN check it gets the new data, not a 304
+    """
+    db.session.add_all([Phase(id=1, phasename='Test Phase 1'),
+                        Villain(id=1, phase_id=1, name='Big Bad Bob'),
+                        Hero(id=1, aspect_id=1, phase_id=1, name='Safety Queen')])
+    db.session.commit()
+    client = file_app.test_client()
+    etag = client.get('/api/stats').headers['ETag']
+    with other_worker.app_context():
+        db.session.add(Result(hero_id=1, villain_id=1, result=ResultTypes.WIN))
+        db.session.commit()
+    response = client.get('/api/stats', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.json['results']['wins'] == [1]
+
+def test_stats_caches_outside_write(file_app, file_result, other_worker):
+    """
+    GIVEN stats tabs and a matchup record cached by one worker
+    WHEN another worker adds a hero and a result
+    THEN check the first worker's pages show them
+    """
+    client = file_app.test_client()
+    assert b'Danger Lad' not in client.get('/stats').data
+    assert b'Record: 1 W / 0 L' in client.get('/hero/1').data
+    with other_worker.app_context():
+        db.session.add(Hero(id=2, aspect_id=1, phase_id=1, name='Danger Lad'))
+        db.session.add(Result(hero_id=1, villain_id=1, result=ResultTypes.LOSS))
+        db.session.commit()
+    assert b'Danger Lad' in client.get('/stats').data
+    assert b'Record: 1 W / 1 L' in client.get('/hero/1').data
+
+def test_stats_fragment_cache(test_client, test_result):
+    """
+    GIVEN two phases, each with a villain
+    WHEN '/stats' is requested repeatedly and a result is added in one phase
+    THEN check tabs are served from the cache and only that phase is re-rendered
+    """
+    db.session.add(Phase(id=2, phasename='Test Phase 2'))
+    db.session.add(Villain(id=2, phase_id=2, name='Awful Annie'))
+    db.session.commit()
+
+    test_client.get('/stats')
+    assert phase_fragments.stats()['misses'] == 2
+    response = test_client.get('/stats')
+    assert phase_fragments.stats()['hits'] == 2
+    assert b'<td bgcolor="#00ff00">W</td>' in response.data
+
+    db.session.add(Result(hero_id=1, villain_id=2, result=ResultTypes.LOSS))
+    db.session.commit()
+    assert len(phase_fragments) == 1
+    response = test_client.get('/stats')
+    assert phase_fragments.stats()['misses'] == 3
+    assert b'<td bgcolor="#ff0000">L</td>' in response.data
+
+def test_stats_service_scope(test_client, test_result, query_counter):
+    """
+    GIVEN results against villains in two phases
+    WHEN '/stats' and a single phase tab are requested (GET)
+    THEN check no Result rows are loaded, a single tab only counts its own
+        phase, and the memory held is reported in the metrics
+    """
+    db.session.add(Phase(id=2, phasename='Test Phase 2'))
+    db.session.add(Villain(id=2, phase_id=2, name='Awful Annie'))
+    db.session.add(Result(hero_id=1, villain_id=2, result=ResultTypes.LOSS))
+    db.session.commit()
+    registry.clear()
+    with query_counter:
+        assert test_client.get('/stats').status_code == 200
+    assert not any('FROM result' in s for s in query_counter.statements)
+    full = registry.summary('main.stats', 'stats_bytes')['max']
+    assert full > 0
+
+    phase_fragments.clear()
+    with test_client.application.test_request_context():
+        service = StatsService()
+        service.tabs([service.phase(2)])
+        assert len(service.matrix) == 1
+        assert 0 < service.nbytes() < full
+
+def test_stats_lazy_tabs(test_client, test_result):
+    """
+    GIVEN lazy stats tabs are enabled and there are two phases
+    WHEN '/stats' is requested (GET)
+    THEN check only the first tab is rendered and the second can be fetched
+    """
+    db.session.add(Phase(id=2, phasename='Test Phase 2'))
+    db.session.add(Villain(id=2, phase_id=2, name='Awful Annie'))
+    db.session.commit()
+    test_client.application.config['STATS_LAZY_TABS'] = True
+    try:
+        response = test_client.get('/stats')
+    finally:
+        test_client.application.config['STATS_LAZY_TABS'] = False
+    assert b'Big Bad Bob' in response.data
+    assert b'Awful Annie' not in response.data
+    assert b'data-src="/stats/phase/2"' in response.data
+
+    response = test_client.get('/stats/phase/2')
+    assert response.status_code == 200
+    assert b'Awful Annie' in response.data
+    assert b'<html' not in response.data
+    assert test_client.get('/stats/phase/3').status_code == 404
+
+def test_stats_engine_load(test_app, test_result):
+    """
+    GIVEN a hero who has beaten a villain
+    WHEN a StatsEngine is loaded from the database
+    THEN check the win is counted
+    """
+    engine = StatsEngine.load()
+    assert [(r.id, r.wins, r.plays) for r in engine.by_hero()] == [(1, 1, 1)]
+    assert [(r.id, r.wins, r.plays) for r in engine.by_phase()] == [(1, 1, 1)]
+
+def test_matchup_record(test_app, test_result):
+    """
+    GIVEN a hero with a long winning record against one villain and a
+        single loss against another
+    WHEN the hero's and a villain's MatchupRecords are loaded
+    THEN check the totals, win rate and best / worst matchups
+    """
+    db.session.add(Villain(id=2, phase_id=1, name='Awful Annie'))
+    db.session.add_all([Result(hero_id=1, villain_id=1, result=ResultTypes.WIN)
+                        for _ in range(9)])
+    db.session.add(Result(hero_id=1, villain_id=2, result=ResultTypes.LOSS))
+    db.session.commit()
+    record = MatchupRecord.for_hero(1)
+    assert [(m.name, m.wins, m.losses) for m in record.matchups] == [
+        ('Awful Annie', 0, 1), ('Big Bad Bob', 10, 0)]
+    assert (record.wins, record.losses, record.rate) == (10, 1, 10 / 11)
+    assert record.best().name == 'Big Bad Bob'
+    assert record.worst().name == 'Awful Annie'
+    record = MatchupRecord.for_villain(2)
+    assert [(m.name, m.wins, m.losses) for m in record.matchups] == [('Safety Queen', 1, 0)]
+    assert MatchupRecord.for_villain(3).rate is None
+
+def test_matchup_pages(test_client, test_result, query_counter):
+    """
+    GIVEN a hero who has beaten a villain
+    WHEN their detail pages are requested (GET) twice, and again after
+        another hero records a result
+    THEN check the matchups are shown, and served from the cache until the
+        hero's or villain's own results change
+    """
+    response = test_client.get('/hero/1')
+    assert b'Record: 1 W / 0 L (100%)' in response.data
+    assert b'Best matchup: Big Bad Bob (1-0)' in response.data
+    response = test_client.get('/villain/1')
+    assert b'Record: 0 W / 1 L (0%)' in response.data
+    with query_counter:
+        test_client.get('/hero/1')
+    # The hero and the two version lookups, but not the record
+    assert query_counter.count == 3
+
+    db.session.add(Villain(id=2, phase_id=1, name='Awful Annie'))
+    db.session.commit()
+    db.session.add(Hero(id=2, aspect_id=1, phase_id=1, name='Danger Lad'))
+    db.session.commit()
+    # Roster changes can rename opponents, so they refresh every record
+    assert len(matchup_records) == 0
+    test_client.get('/hero/1')
+    db.session.add(Result(hero_id=2, villain_id=2, result=ResultTypes.WIN))
+    db.session.commit()
+    with query_counter:
+        test_client.get('/hero/1')
+    assert query_counter.count == 3
+    db.session.add(Result(hero_id=1, villain_id=2, result=ResultTypes.WIN))
+    db.session.commit()
+    response = test_client.get('/hero/1')
+    assert b'Record: 2 W / 0 L (100%)' in response.data
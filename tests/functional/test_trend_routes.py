@@ -0,0 +1,143 @@
+"""
+Functional tests for the result rollups and trend pages
+"""
+
+from datetime import date, datetime
+import sqlalchemy as sa
+from app import db
+from app.models import Aspect, Hero, Result, ResultTypes, ResultRollup, RollupPeriod
+
+def _rollups():
+    return {(r.period, r.period_start, r.hero_id, r.villain_id, r.aspect_id): (r.wins, r.losses)
+            for r in db.session.scalars(sa.select(ResultRollup))}
+
+def test_rollups_maintained(test_app, test_result):
+    """
+    GIVEN a win on Friday 2 January 2026
+    WHEN results are added, moved to another day and deleted
+    THEN check the day and week rollups follow
+    """
+    friday, monday = date(2026, 1, 2), date(2025, 12, 29)
+    assert _rollups() == {(RollupPeriod.DAY, friday, 1, 1, 1): (1, 0),
+                          (RollupPeriod.WEEK, monday, 1, 1, 1): (1, 0)}
+    loss = Result(hero_id=1, villain_id=1, result=ResultTypes.LOSS,
+                  played_at=datetime(2026, 1, 3, 10, 0))
+    db.session.add(loss)
+    db.session.add(Result(hero_id=1, villain_id=1, result=ResultTypes.WIN))
+    db.session.commit()
+    assert _rollups()[(RollupPeriod.WEEK, monday, 1, 1, 1)] == (1, 1)
+    assert _rollups()[(RollupPeriod.DAY, date(2026, 1, 3), 1, 1, 1)] == (0, 1)
+
+    loss.played_at = datetime(2026, 1, 6, 10, 0)
+    db.session.commit()
+    rollups = _rollups()
+    assert rollups[(RollupPeriod.WEEK, monday, 1, 1, 1)] == (1, 0)
+    assert rollups[(RollupPeriod.WEEK, date(2026, 1, 5), 1, 1, 1)] == (0, 1)
+    assert (RollupPeriod.DAY, date(2026, 1, 3), 1, 1, 1) not in rollups
+
+    db.session.delete(loss)
+    db.session.commit()
+    assert len(_rollups()) == 2
+
+def test_rollups_counts_added(test_app, test_result):
+    """
+    GIVEN a week's rollup counting wins the result table doesn't show, as a
+          concurrent writer's would be
+    WHEN a result that week is added and then moved to the week after
+    THEN check its count is added to the row's, and then moved to the next week's
+    """
+    monday = date(2025, 12, 29)
+    db.session.execute(sa.update(ResultRollup).values(wins=5))
+    db.session.commit()
+    loss = Result(hero_id=1, villain_id=1, result=ResultTypes.LOSS,
+                  played_at=datetime(2026, 1, 3, 10, 0))
+    db.session.add(loss)
+    db.session.commit()
+    assert _rollups()[(RollupPeriod.WEEK, monday, 1, 1, 1)] == (5, 1)
+    loss.played_at = datetime(2026, 1, 6, 10, 0)
+    db.session.commit()
+    rollups = _rollups()
+    assert rollups[(RollupPeriod.WEEK, monday, 1, 1, 1)] == (5, 0)
+    assert rollups[(RollupPeriod.WEEK, date(2026, 1, 5), 1, 1, 1)] == (0, 1)
+
+def test_rollups_follow_hero_aspect(test_app, test_result):
+    """
+    GIVEN a win on Friday 2 January 2026 and a loss a week later, neither
+          with a recorded aspect
+    WHEN the hero's default aspect is changed
+    THEN check both weeks' rollups move to the new aspect
+    """
+    db.session.get(Result, 1).aspect_id = None
+    db.session.add(Result(hero_id=1, villain_id=1, result=ResultTypes.LOSS,
+                          played_at=datetime(2026, 1, 9, 10, 0)))
+    db.session.add(Aspect(id=2, name='Shiny New Aspect'))
+    db.session.commit()
+    db.session.get(Hero, 1).aspect_id = 2
+    db.session.commit()
+    rollups = _rollups()
+    assert {key[-1] for key in rollups} == {2}
+    assert rollups[(RollupPeriod.WEEK, date(2025, 12, 29), 1, 1, 2)] == (1, 0)
+    assert rollups[(RollupPeriod.WEEK, date(2026, 1, 5), 1, 1, 2)] == (0, 1)
+
+def test_rebuild_rollups(test_app, test_result):
+    """
+    GIVEN rollups that have been emptied
+    WHEN 'flask stats rebuild-rollups' is run
+    THEN check they are rebuilt from the results
+    """
+    db.session.execute(sa.delete(ResultRollup))
+    db.session.commit()
+    result = test_app.test_cli_runner().invoke(args=['stats', 'rebuild-rollups'])
+    assert 'Result rollups rebuilt.' in result.output
+    assert len(_rollups()) == 2
+
+def test_api_trends(test_client, test_result, query_counter):
+    """
+    GIVEN dated results in two weeks with a gap between them
+    WHEN '/api/stats/trends' is requested (GET)
+    THEN check weekly buckets and rolling rates come from the rollups alone
+    """
+    db.session.add(Result(hero_id=1, villain_id=1, result=ResultTypes.LOSS,
+                          played_at=datetime(2026, 1, 14, 10, 0)))
+    db.session.commit()
+    with query_counter:
+        response = test_client.get('/api/stats/trends?hero=1&window=2')
+    assert response.status_code == 200
+    assert not any('FROM result ' in s or s.endswith('FROM result') for s in query_counter.statements)
+    assert response.json['period'] == 'week'
+    assert response.json['subject'] == 'hero'
+    assert response.json['buckets'] == {
+        'start': ['2025-12-29', '2026-01-05', '2026-01-12'],
+        'wins': [1, 0, 0], 'losses': [0, 0, 1],
+        'rate': [1.0, None, 0.0], 'rolling_rate': [1.0, 1.0, 0.0]}
+    response = test_client.get('/api/stats/trends?period=day&villain=2')
+    assert response.json['buckets']['start'] == []
+    etag = response.headers['ETag']
+    assert test_client.get('/api/stats/trends', headers={'If-None-Match': etag}).status_code == 304
+    assert test_client.get('/api/stats/trends?period=year').status_code == 400
+
+def test_trends_page(test_client, test_result):
+    """
+    GIVEN a dated result
+    WHEN the '/stats/trends' page is requested (GET)
+    THEN check the chart data is embedded, and bad arguments are rejected
+    """
+    response = test_client.get('/stats/trends?aspect=1')
+    assert response.status_code == 200
+    assert b'trend-chart' in response.data
+    assert b'1 wins, 0 losses' in response.data
+    assert test_client.get('/stats/trends?window=100').status_code == 400
+    assert test_client.get('/stats/trends?hero=99999999999999999999999').status_code == 400
+
+def test_trends_page_lists_new_aspect(test_client, test_result):
+    """
+    GIVEN the ETag of the '/stats/trends' page
+    WHEN an aspect is added and the page is revalidated
+    THEN check it is re-rendered with the new aspect in its filter
+    """
+    etag = test_client.get('/stats/trends').headers['ETag']
+    db.session.add(Aspect(id=2, name='Shiny New Aspect'))
+    db.session.commit()
+    response = test_client.get('/stats/trends', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert b'Shiny New Aspect' in response.data
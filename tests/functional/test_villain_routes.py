@@ -15,7 +15,7 @@ def test_villain_create_noauth(test_client):
     with test_client.application.test_request_context():
         response = test_client.get('/villain/create')
         assert response.status_code == 302
-        assert url_for('login') in response.headers['Location'] 
+        assert url_for('main.login') in response.headers['Location'] 
 
 def test_villain_create_auth(test_client, test_auth):
     """
@@ -41,7 +41,7 @@ def test_villain_create_post_noauth(test_client):
     with test_client.application.test_request_context():
         response = test_client.post('/villain/create', data={'name': 'Bob', 'phase_id': 1})
         assert response.status_code == 302
-        assert url_for('login') in response.headers['Location'] 
+        assert url_for('main.login') in response.headers['Location'] 
 
 def test_villain_create_post_auth(test_client, test_auth, test_phase):
     """
@@ -56,7 +56,7 @@ def test_villain_create_post_auth(test_client, test_auth, test_phase):
         assert current_user.is_authenticated is True
         response = test_client.post('/villain/create', data={'name': 'Bob', 'phase': 1, 'submit': 'submit'})
         assert response.status_code == 302
-        assert url_for('villain') in response.headers['Location']
+        assert url_for('main.villain') in response.headers['Location']
 
         # Confirm that new villain has been created
 
@@ -95,7 +95,7 @@ def test_villain_update_noauth(test_client):
     with test_client.application.test_request_context():
         response = test_client.get('/villain/1/update')
         assert response.status_code == 302
-        assert url_for('login') in response.headers['Location'] 
+        assert url_for('main.login') in response.headers['Location'] 
 
 def test_villain_update_auth(test_client, test_auth, test_villain):
     """
@@ -128,7 +128,7 @@ def test_villain_update_auth_bad_id(test_client, test_auth, test_villain):
         assert current_user.is_authenticated is True
         response = test_client.get('/villain/2/update')
         assert response.status_code == 302
-        assert url_for('index') in response.headers['Location']
+        assert url_for('main.index') in response.headers['Location']
         with test_client.session_transaction() as session:
             assert session['_flashes'] is not None 
 
@@ -143,7 +143,7 @@ def test_villain_update_post_noauth(test_client, test_villain):
                                     data={'name': 'Bigger Badder Bob',
                                           'phase_id': 1})
         assert response.status_code == 302
-        assert url_for('login') in response.headers['Location'] 
+        assert url_for('main.login') in response.headers['Location'] 
 
 def test_villain_update_post_auth(test_client, test_auth, test_phase, test_villain):
     """
@@ -162,7 +162,7 @@ def test_villain_update_post_auth(test_client, test_auth, test_phase, test_villa
                                           'phase': 1,
                                           'submit': 'submit'})
         assert response.status_code == 302
-        assert url_for('villain') in response.headers['Location']
+        assert url_for('main.villain') in response.headers['Location']
 
         # Confirm that villain has been updated
 
@@ -188,7 +188,7 @@ def test_villain_update_post_auth_bad_id(test_client, test_auth, test_phase, tes
                                           'phase': 1,
                                           'submit': 'submit'})
         assert response.status_code == 302
-        assert url_for('index') in response.headers['Location']
+        assert url_for('main.index') in response.headers['Location']
         with test_client.session_transaction() as session:
             assert session['_flashes'] is not None 
 
@@ -201,7 +201,7 @@ def test_villain_delete_noauth(test_client):
     with test_client.application.test_request_context():
         response = test_client.get('/villain/1/delete')
         assert response.status_code == 302
-        assert url_for('login') in response.headers['Location'] 
+        assert url_for('main.login') in response.headers['Location'] 
 
 def test_villain_delete_auth(test_client, test_auth, test_villain):
     """
@@ -234,7 +234,7 @@ def test_villain_delete_auth_bad_id(test_client, test_auth, test_villain):
         assert current_user.is_authenticated is True
         response = test_client.get('/villain/2/delete')
         assert response.status_code == 302
-        assert url_for('index') in response.headers['Location']
+        assert url_for('main.index') in response.headers['Location']
         with test_client.session_transaction() as session:
             assert session['_flashes'] is not None
 
@@ -248,7 +248,7 @@ def test_villain_delete_post_noauth(test_client, test_villain):
         response = test_client.post('/villain/1/delete',
                                     data={'submit': 'submit'})
         assert response.status_code == 302
-        assert url_for('login') in response.headers['Location'] 
+        assert url_for('main.login') in response.headers['Location'] 
 
 def test_villain_delete_post_auth(test_client, test_auth, test_phase, test_villain):
     """
@@ -265,13 +265,13 @@ def test_villain_delete_post_auth(test_client, test_auth, test_phase, test_villa
         response = test_client.post('/villain/1/delete',
                                     data={'submit': 'submit'})
         assert response.status_code == 302
-        assert url_for('villain') in response.headers['Location']
+        assert url_for('main.villain') in response.headers['Location']
 
         # Confirm that villain has been deleted
 
         response = test_client.get('/villain/1')
         assert response.status_code == 302
-        assert url_for('index') in response.headers['Location']
+        assert url_for('main.index') in response.headers['Location']
         with test_client.session_transaction() as session:
             assert session['_flashes'] is not None
 
@@ -291,6 +291,6 @@ def test_villain_delete_post_auth_bad_id(test_client, test_auth, test_phase, tes
         response = test_client.post('/villain/2/delete',
                                     data={'submit': 'submit'})
         assert response.status_code == 302
-        assert url_for('index') in response.headers['Location']
+        assert url_for('main.index') in response.headers['Location']
         with test_client.session_transaction() as session:
             assert session['_flashes'] is not None 
@@ -0,0 +1,30 @@
+from app.cache import LRUCache
+
+def test_lru_cache():
+    """
+    GIVEN an LRUCache with room for two entries
+    WHEN a third entry is added
+    THEN check the least recently used entry is evicted and hits / misses counted
+    """
+    c = LRUCache(maxsize=2)
+    c.set('a', 1)
+    c.set('b', 2)
+    assert c.get('a') == 1
+    c.set('c', 3)
+    assert c.get('b') is None
+    assert c.get('c') == 3
+    assert c.stats() == {'hits': 2, 'misses': 1, 'size': 2, 'maxsize': 2}
+
+def test_lru_cache_evict():
+    """
+    GIVEN an LRUCache with several entries
+    WHEN entries are evicted by predicate
+    THEN check only matching entries are dropped
+    """
+    c = LRUCache()
+    for i in range(4):
+        c.set((i, 'x'), i)
+    c.evict(lambda key: key[0] % 2)
+    assert len(c) == 2
+    assert c.get((0, 'x')) == 0
+    assert c.get((1, 'x')) is None
@@ -0,0 +1,37 @@
+from config import config, engine_options
+from app import create_app
+
+def test_engine_options_sqlite():
+    """
+    GIVEN a SQLite database URL
+    WHEN the engine options are built
+    THEN check SQLAlchemy's pool defaults are kept
+    """
+    settings = {'SQLALCHEMY_DATABASE_URI': 'sqlite://'}
+    assert engine_options(settings) == {}
+
+def test_engine_options_mysql():
+    """
+    GIVEN the production profile and a MySQL database URL
+    WHEN the engine options are built
+    THEN check the pool is sized and connections get a statement timeout
+    """
+    profile = config['production']
+    settings = {name: getattr(profile, name) for name in dir(profile) if name.isupper()}
+    settings['SQLALCHEMY_DATABASE_URI'] = 'mysql://mcstats@localhost/mcstats'
+    options = engine_options(settings)
+    assert options['pool_size'] == profile.DB_POOL_SIZE
+    assert options['max_overflow'] == profile.DB_MAX_OVERFLOW
+    assert options['pool_pre_ping'] is True
+    assert 'max_execution_time=30000' in options['connect_args']['init_command']
+
+def test_benchmark_profile(tmp_path, monkeypatch):
+    """
+    GIVEN the benchmark profile
+    WHEN an app is built from it
+    THEN check no log files or log handler threads are set up
+    """
+    monkeypatch.chdir(tmp_path)
+    app = create_app('benchmark')
+    assert 'log_queue' not in app.extensions
+    assert not (tmp_path / 'logs').exists()
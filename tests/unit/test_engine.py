@@ -0,0 +1,66 @@
+import pytest
+import app.engine
+from app.engine import StatsEngine, wilson_interval
+
+@pytest.fixture(params=['numpy', 'array'])
+def backend(request, monkeypatch):
+    """
+    Run each test against NumPy (if installed) and the array.array fallback
+    """
+    if request.param == 'numpy':
+        pytest.importorskip('numpy')
+    else:
+        monkeypatch.setattr(app.engine, 'np', None)
+    return request.param
+
+@pytest.fixture
+def engine(backend):
+    """
+    Heroes 1 & 2 (aspects 10, 20) vs villains 5 & 6 (phases 1, 2)
+    Hero 1: 3-1 vs villain 5, 1-0 vs villain 6
+    Hero 2: 0-2 vs villain 5
+    """
+    return StatsEngine([1, 2], [10, 20], [5, 6], [1, 2],
+                       [(1, 5, 3, 1), (1, 6, 1, 0), (2, 5, 0, 2), (99, 5, 1, 1)])
+
+def test_wilson_interval(backend):
+    """
+    GIVEN some win / play counts
+    WHEN the Wilson interval is computed
+    THEN check it brackets the win rate and handles no plays
+    """
+    low, high = wilson_interval([5, 0], [10, 0])
+    assert float(low[0]) == pytest.approx(0.2366, abs=1e-4)
+    assert float(high[0]) == pytest.approx(0.7634, abs=1e-4)
+    assert (float(low[1]), float(high[1])) == (0.0, 1.0)
+
+def test_engine_totals(engine):
+    """
+    GIVEN a StatsEngine over a small set of results
+    WHEN totals are requested per hero, villain, aspect and phase
+    THEN check the wins and plays are summed along the right axis
+    """
+    assert [(r.id, r.wins, r.plays) for r in engine.by_hero()] == [(1, 4, 5), (2, 0, 2)]
+    assert [(r.id, r.wins, r.plays) for r in engine.by_villain()] == [(5, 3, 6), (6, 1, 1)]
+    assert [(r.id, r.wins, r.plays) for r in engine.by_aspect()] == [(10, 4, 5), (20, 0, 2)]
+    assert [(r.id, r.wins, r.plays) for r in engine.by_phase()] == [(1, 3, 6), (2, 1, 1)]
+    assert engine.by_hero()[0].rate == pytest.approx(0.8)
+
+def test_engine_rankings(engine):
+    """
+    GIVEN a StatsEngine over a small set of results
+    WHEN the leaderboard and hardest villains are requested
+    THEN check they are ranked on the Wilson bounds
+    """
+    assert [r.id for r in engine.leaderboard()] == [1, 2]
+    assert [r.id for r in engine.leaderboard(min_plays=3)] == [1]
+    assert [r.id for r in engine.hardest_villains(limit=1)] == [5]
+
+def test_engine_empty(backend):
+    """
+    GIVEN a StatsEngine with no heroes or villains
+    WHEN totals are requested
+    THEN check empty lists come back
+    """
+    e = StatsEngine([], [], [], [], [])
+    assert e.by_hero() == e.by_villain() == e.by_aspect() == e.by_phase() == []
@@ -0,0 +1,81 @@
+import logging
+from logging.handlers import QueueListener
+import queue
+import time
+from app.logs import DroppingQueueHandler, BatchingSMTPHandler, _shutdown
+
+class RecordingSMTPHandler(BatchingSMTPHandler):
+    """BatchingSMTPHandler that keeps its emails instead of sending them"""
+    def __init__(self, **kwargs):
+        super().__init__(mailhost='localhost', fromaddr='from@example.com',
+                         toaddrs=['to@example.com'], subject='Failure', **kwargs)
+        self.sent = []
+
+    def send(self, subject, body):
+        self.sent.append((subject, body))
+
+def _record(msg):
+    return logging.makeLogRecord({'msg': msg, 'levelno': logging.ERROR, 'levelname': 'ERROR'})
+
+def test_dropping_queue_handler():
+    """
+    GIVEN a DroppingQueueHandler on a queue with room for one record
+    WHEN two records are logged
+    THEN check the second is dropped and counted instead of blocking
+    """
+    h = DroppingQueueHandler(queue.Queue(1))
+    h.handle(_record('one'))
+    h.handle(_record('two'))
+    assert h.queue.qsize() == 1
+    assert h.dropped == 1
+
+def test_batching_smtp_handler():
+    """
+    GIVEN a BatchingSMTPHandler with a long interval, room for two records
+          and an email sent just now
+    WHEN three errors are logged and the handler flushed
+    THEN check one email carries the first two, and the third is counted as dropped
+    """
+    h = RecordingSMTPHandler(interval=3600, capacity=2)
+    # Otherwise the first error starts an immediate send that races the others
+    h._last_sent = time.monotonic()
+    for msg in ('one', 'two', 'three'):
+        h.handle(_record(msg))
+    h.flush()
+    assert h.sent == [('Failure (2 errors)', 'one\n\ntwo')]
+    assert h.dropped == 1
+    h.close()
+    assert len(h.sent) == 1
+
+def test_batching_smtp_handler_timer():
+    """
+    GIVEN a BatchingSMTPHandler with no interval
+    WHEN an error is logged
+    THEN check it's sent from the background timer without an explicit flush
+    """
+    h = RecordingSMTPHandler(interval=0)
+    h.acquire()
+    try:
+        h.emit(_record('boom'))
+        timer = h._timer
+    finally:
+        h.release()
+    timer.join(5)
+    assert h.sent == [('Failure', 'boom')]
+
+def test_shutdown_drains_queue_before_mail():
+    """
+    GIVEN errors still queued for a BatchingSMTPHandler with a long interval,
+          which sent an email just now
+    WHEN logging is shut down
+    THEN check the queue is drained into the handler before its mail is sent
+    """
+    q = DroppingQueueHandler(queue.Queue())
+    h = RecordingSMTPHandler(interval=3600)
+    h._last_sent = time.monotonic()
+    listener = QueueListener(q.queue, h)
+    listener.start()
+    for msg in ('one', 'two'):
+        q.handle(_record(msg))
+    _shutdown(listener, [h])
+    assert h.sent == [('Failure (2 errors)', 'one\n\ntwo')]
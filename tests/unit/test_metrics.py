@@ -0,0 +1,24 @@
+from app.metrics import MetricsRegistry, percentile
+
+def test_percentile():
+    """
+    GIVEN a sorted list of samples
+    WHEN percentiles are taken
+    THEN check the nearest-rank value is returned
+    """
+    samples = list(range(1, 101))
+    assert percentile(samples, 0.5) == 50
+    assert percentile(samples, 0.95) == 95
+    assert percentile([], 0.5) == 0
+
+def test_registry_summary():
+    """
+    GIVEN a MetricsRegistry with a small sample window
+    WHEN more requests are recorded than fit in the window
+    THEN check counts and maxima cover every request, percentiles the window
+    """
+    r = MetricsRegistry(sample_size=2)
+    for q in (10, 1, 2):
+        r.record('index', {'queries': q})
+    s = r.summary('index', 'queries')
+    assert (s['count'], s['sum'], s['max'], s[0.95]) == (3, 13, 10, 2)
@@ -0,0 +1,53 @@
+import sqlalchemy as sa
+from app import db
+from app.models import Hero, Result
+from app.pagination import KeysetPage, paginate
+from benchmarks.seed import seed
+import pytest
+
+ORDER = (Hero.phase_id, Hero.id)
+
+def test_paginate_walk(test_app):
+    """
+    GIVEN heroes spread over several phases
+    WHEN they are paged through forwards and then backwards by cursor
+    THEN check every hero is seen once, in (phase_id, id) order, both ways
+    """
+    seed(heroes=11, villains=1, results=0, phases=3)
+    expected = db.session.scalars(sa.select(Hero.id).order_by(*ORDER)).all()
+    pages = [paginate(sa.select(Hero), ORDER, 4)]
+    assert pages[0].prev_cursor is None
+    while pages[-1].next_cursor:
+        pages.append(paginate(sa.select(Hero), ORDER, 4, after=pages[-1].next_cursor))
+    assert [len(p) for p in pages] == [4, 4, 3]
+    assert [h.id for p in pages for h in p] == expected
+    back = [pages[-1]]
+    while back[-1].prev_cursor:
+        back.append(paginate(sa.select(Hero), ORDER, 4, before=back[-1].prev_cursor))
+    assert [[h.id for h in p] for p in back] == [[h.id for h in p] for p in reversed(pages)]
+
+def test_paginate_descending(test_app):
+    """
+    GIVEN some results
+    WHEN they are paged newest first
+    THEN check the pages run down the ids and link back up
+    """
+    seed(heroes=2, villains=2, results=5, phases=1)
+    first = paginate(sa.select(Result), (Result.id,), 2, descending=True)
+    assert [r.id for r in first] == [5, 4]
+    second = paginate(sa.select(Result), (Result.id,), 2, after=first.next_cursor,
+                      descending=True)
+    assert [r.id for r in second] == [3, 2]
+    assert [r.id for r in paginate(sa.select(Result), (Result.id,), 2,
+                                   before=second.prev_cursor, descending=True)] == [5, 4]
+
+@pytest.mark.parametrize('cursor', ['', '1', '1.x', '1.2.3', '1.9223372036854775808',
+                                    '-9223372036854775809.1'])
+def test_parse_cursor_rejects(cursor):
+    """
+    GIVEN a malformed cursor, or one past the range of a database integer
+    WHEN it is parsed for a two-column key
+    THEN check it is rejected
+    """
+    with pytest.raises(ValueError):
+        KeysetPage.parse_cursor(cursor, ORDER)
@@ -0,0 +1,49 @@
+from app import db
+from app.models import Hero, Villain
+from app.search import search_index, normalise
+from benchmarks.seed import seed
+
+def test_normalise():
+    """
+    GIVEN names typed with odd case and spacing
+    WHEN they are normalised
+    THEN check they compare equal
+    """
+    assert normalise('  Big  BAD\tbob ') == normalise('big bad bob') == 'big bad bob'
+
+def test_search_index(test_app, test_villain, test_aspect, test_hero):
+    """
+    GIVEN a hero and a villain
+    WHEN names are searched for by prefix, then renamed, added and deleted
+    THEN check matches on any word follow each commit without a reload
+    """
+    db.session.add(Villain(id=2, phase_id=1, name='Queen Bee'))
+    db.session.commit()
+    assert search_index.search('b') == [('villain', 1, 'Big Bad Bob'),
+                                        ('villain', 2, 'Queen Bee')]
+    assert search_index.search('QUEEN') == [('villain', 2, 'Queen Bee'),
+                                            ('hero', 1, 'Safety Queen')]
+    assert search_index.search('queen', kind='hero') == [('hero', 1, 'Safety Queen')]
+    assert search_index.search('queen', limit=1) == [('villain', 2, 'Queen Bee')]
+    assert search_index.search('  ') == []
+
+    entries = search_index.entries
+    db.session.get(Hero, 1).name = 'Danger Lad'
+    db.session.add(Hero(id=2, aspect_id=1, phase_id=1, name='Bobcat'))
+    db.session.delete(db.session.get(Villain, 2))
+    db.session.commit()
+    assert search_index.entries is entries
+    assert search_index.search('queen') == []
+    assert search_index.search('bob') == [('hero', 2, 'Bobcat'), ('villain', 1, 'Big Bad Bob')]
+    assert search_index.search('danger') == [('hero', 1, 'Danger Lad')]
+
+def test_search_index_bulk(test_app):
+    """
+    GIVEN a loaded search index
+    WHEN heroes are added with a bulk insert
+    THEN check the index is reloaded and finds them
+    """
+    assert search_index.search('bench') == []
+    seed(heroes=2, villains=0, results=0, phases=1)
+    assert [name for _, _, name in search_index.search('bench hero')] == \
+        ['Bench Hero 1', 'Bench Hero 2']
@@ -0,0 +1,34 @@
+from datetime import date
+from app.models import RollupPeriod
+from app.trends import Trend, trend_args
+import pytest
+
+def test_trend_fills_gaps():
+    """
+    GIVEN weekly buckets with a two week gap
+    WHEN a Trend is built from them
+    THEN check the empty weeks are filled in and rolling rates span time
+    """
+    trend = Trend(RollupPeriod.WEEK, [(date(2026, 1, 5), 3, 1),
+                                      (date(2026, 1, 26), 0, 2)])
+    assert trend.starts == [date(2026, 1, 5), date(2026, 1, 12), date(2026, 1, 19),
+                            date(2026, 1, 26)]
+    assert trend.wins == [3, 0, 0, 0]
+    assert trend.rates() == [0.75, None, None, 0.0]
+    assert trend.rolling_rates(2) == [0.75, 0.75, None, 0.0]
+    assert trend.rolling_rates(4) == [0.75, 0.75, 0.75, 0.5]
+
+def test_trend_args():
+    """
+    GIVEN query string arguments for a trend
+    WHEN they are parsed
+    THEN check good ones are converted and bad ones rejected
+    """
+    kwargs, window = trend_args({'period': 'day', 'hero': '3', 'since': '2026-01-01'})
+    assert kwargs == {'period': RollupPeriod.DAY, 'subject': 'hero', 'subject_id': 3,
+                      'since': date(2026, 1, 1)}
+    assert window == 4
+    for bad in ({'period': 'month'}, {'hero': '1', 'villain': '2'}, {'window': '0'},
+                {'aspect': 'x'}, {'until': 'soon'}, {'hero': str(2 ** 63)}):
+        with pytest.raises(ValueError):
+            trend_args(bad)
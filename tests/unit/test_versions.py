@@ -0,0 +1,29 @@
+from app import db
+from app.models import Hero, Villain
+from app.versions import data_versions
+
+def test_data_versions(test_app, test_phase, test_aspect):
+    """
+    GIVEN the data versions of a fresh database
+    WHEN heroes are committed
+    THEN check only versions covering those tables change
+    """
+    before = data_versions.etag('hero', 'villain')
+    assert data_versions.version('hero') == 0
+    db.session.add(Hero(name='Danger Lad', aspect_id=1, phase_id=1))
+    db.session.commit()
+    assert data_versions.versions('hero', 'villain') == {'hero': 1, 'villain': 0}
+    assert data_versions.etag('hero', 'villain') != before
+    assert data_versions.etag('villain') == '0-0'
+
+def test_data_versions_shared(file_app, other_worker):
+    """
+    GIVEN two apps on one database, as in two worker processes
+    WHEN one of them commits a change
+    THEN check the other sees the new version
+    """
+    assert data_versions.version('villain') == 0
+    with other_worker.app_context():
+        db.session.add(Villain(name='Big Bad Bob', phase_id=1))
+        db.session.commit()
+    assert data_versions.version('villain') == 1